@@ -1,20 +1,34 @@
 """AI 服务 API"""
 
+import asyncio
+import contextlib
+import json
 import re
-from typing import Optional
+from typing import AsyncGenerator, Optional
 from urllib.parse import urlparse
 
-import httpx
 from bs4 import BeautifulSoup
 from fastapi import APIRouter, Depends
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.core import get_db, get_current_user, success, invalid_params, server_error, settings
-from app.models import User, Attachment
+from sse_starlette.sse import EventSourceResponse
+
+from app.core import (
+    get_db,
+    get_current_user,
+    success,
+    invalid_params,
+    not_found,
+    server_error,
+    settings,
+)
+from app.core.database import AsyncSessionLocal
+from app.models import User, Attachment, AsrTask
 from app.schemas import OCRRequest, ASRRequest, SummaryRequest, LinkPreviewRequest
-from app.services.tencent import call_ocr, call_asr
+from app.services.asr import asr_poller, enqueue_asr_task
+from app.services.tencent import call_ocr
 from app.services.deepseek import call_summary
+from app.services.http_client import get_http_client, request_timeout
 
 router = APIRouter(prefix="/ai", tags=["AI服务"])
 
@@ -41,8 +55,9 @@ async def asr(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """ASR 语音识别"""
+    """ASR 语音识别：创建识别任务，结果通过 GET /ai/asr/{id} 或 SSE 获取，完成后写入附件"""
     audio_url = data.audio_url
+    attachment = None
 
     # 如果提供了附件ID，获取URL
     if data.attachment_id:
@@ -50,7 +65,7 @@ async def asr(
             select(Attachment).where(Attachment.id == data.attachment_id)
         )
         attachment = result.scalar_one_or_none()
-        if not attachment:
+        if not attachment or attachment.user_id != current_user.id:
             return invalid_params("附件不存在")
         audio_url = attachment.url
 
@@ -58,21 +73,67 @@ async def asr(
         return invalid_params("请提供音频URL或附件ID")
 
     try:
-        text = await call_asr(audio_url)
-
-        # 更新附件的 ASR 文本
-        if data.attachment_id:
-            result = await db.execute(
-                select(Attachment).where(Attachment.id == data.attachment_id)
-            )
-            attachment = result.scalar_one_or_none()
-            if attachment:
-                attachment.asr_text = text
-                await db.commit()
-
-        return success({"text": text})
+        task = await enqueue_asr_task(db, current_user.id, audio_url, attachment)
+        return success(task.to_dict())
     except Exception as e:
-        return server_error(f"语音识别失败: {str(e)}")
+        return server_error(f"创建识别任务失败: {str(e)}")
+
+
+async def _get_asr_task(db: AsyncSession, task_id: str, current_user: User):
+    """读取识别任务，返回 (任务, 错误响应)"""
+    task = await db.get(AsrTask, task_id)
+    if not task or task.user_id != current_user.id:
+        return None, not_found("识别任务不存在")
+    return task, None
+
+
+@router.get("/asr/{task_id}")
+async def get_asr_task(
+    task_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """查询识别任务"""
+    task, error = await _get_asr_task(db, task_id, current_user)
+    if error:
+        return error
+    return success(task.to_dict())
+
+
+@router.get("/asr/{task_id}/events")
+async def asr_task_events(
+    task_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """识别任务状态推送（SSE）：状态变化时推送 status 事件，任务结束后推送 done 并关闭"""
+    task, error = await _get_asr_task(db, task_id, current_user)
+    if error:
+        return error
+    # 推送期间不占用请求的数据库连接
+    await db.close()
+
+    async def generate() -> AsyncGenerator[str, None]:
+        last_status = None
+        with asr_poller.listen(task_id) as changed:
+            while True:
+                changed.clear()
+                async with AsyncSessionLocal() as session:
+                    task = await session.get(AsrTask, task_id)
+                if task is None:
+                    yield json.dumps({"type": "error", "data": "识别任务不存在"})
+                    return
+                if task.status != last_status:
+                    last_status = task.status
+                    yield json.dumps({"type": "status", "data": task.to_dict()})
+                if task.finished:
+                    yield json.dumps({"type": "done", "data": None})
+                    return
+                # 本进程的轮询器会立即通知；轮询器在其他实例时定期重新读取
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(changed.wait(), settings.ASR_SSE_CHECK_SECONDS)
+
+    return EventSourceResponse(generate())
 
 
 @router.post("/summary")
@@ -109,11 +170,14 @@ async def link_preview(
 
 async def fetch_link_preview(url: str) -> dict:
     """获取链接预览信息"""
-    async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-        response = await client.get(url, headers={
-            "User-Agent": "Mozilla/5.0 (compatible; GetNotesBot/1.0)"
-        })
-        response.raise_for_status()
+    client = get_http_client()
+    response = await client.get(
+        url,
+        headers={"User-Agent": "Mozilla/5.0 (compatible; GetNotesBot/1.0)"},
+        follow_redirects=True,
+        timeout=request_timeout(10.0),
+    )
+    response.raise_for_status()
 
     soup = BeautifulSoup(response.text, "html.parser")
     parsed_url = urlparse(url)
@@ -4,16 +4,15 @@ import json
 from typing import List, AsyncGenerator
 
 from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
-from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sse_starlette.sse import EventSourceResponse
 
-from app.core import get_db, get_current_user, success, invalid_params, server_error, settings
-from app.models import User, Note, NoteEmbedding
+from app.core import get_db, get_current_user, success, invalid_params, server_error
+from app.models import User
 from app.schemas import RAGChatRequest, ChatMessage
 from app.services import get_embedding, call_chat
 from app.services.deepseek import call_chat_stream
+from app.services.vector_search import search_similar_chunks
 
 
 router = APIRouter(prefix="/chat", tags=["AI聊天"])
@@ -35,30 +34,13 @@ async def retrieve_context(
         return []
     
     # 向量搜索
-    search_query = text("""
-        SELECT 
-            ne.chunk_text,
-            n.title as note_title,
-            1 - (ne.embedding <=> :query_embedding::vector) as similarity
-        FROM note_embeddings ne
-        JOIN notes n ON ne.note_id = n.id
-        WHERE n.user_id = :user_id
-            AND ne.embedding IS NOT NULL
-        ORDER BY ne.embedding <=> :query_embedding::vector
-        LIMIT :top_k
-    """)
-    
-    result = await db.execute(
-        search_query,
-        {
-            "query_embedding": str(query_embedding),
-            "user_id": user_id,
-            "top_k": top_k,
-        }
+    rows = await search_similar_chunks(
+        db,
+        user_id=user_id,
+        query_embedding=query_embedding,
+        top_k=top_k,
     )
     
-    rows = result.fetchall()
-    
     contexts = []
     for row in rows:
         if row.similarity and row.similarity > 0.5:  # 相似度阈值
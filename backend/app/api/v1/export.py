@@ -1,125 +1,34 @@
 """导出相关 API"""
 
+import asyncio
 import json
 import re
+import textwrap
 from datetime import datetime
+from typing import AsyncIterator, List, Optional
 
 from fastapi import APIRouter, Depends, Query, Response
-from sqlalchemy import select
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.core import get_db, get_current_user, success, not_found, forbidden, invalid_params
+from app.core import (
+    get_db, get_current_user, success, not_found, forbidden, invalid_params, too_many_requests,
+    server_error, settings,
+)
+from app.core.database import AsyncSessionLocal
 from app.models import User, Note, Tag, NoteTag
+from app.services.archive import ArchiveWriter
+from app.services.pdf import PdfQueueFull, pdf_renderer
+from app.services.tiptap import render_document, render_note
 
 router = APIRouter(prefix="/export", tags=["导出"])
 
 
 def json_content_to_markdown(json_content: str) -> str:
     """将 Tiptap JSON 转换为 Markdown"""
-    try:
-        doc = json.loads(json_content) if isinstance(json_content, str) else json_content
-    except json.JSONDecodeError:
-        return ""
-    
-    if not doc or not isinstance(doc, dict):
-        return ""
-    
-    content = doc.get("content", [])
-    return _nodes_to_markdown(content)
-
-
-def _nodes_to_markdown(nodes: list, depth: int = 0) -> str:
-    """递归转换节点为 Markdown"""
-    result = []
-    
-    for node in nodes:
-        node_type = node.get("type", "")
-        
-        if node_type == "paragraph":
-            text = _inline_to_markdown(node.get("content", []))
-            result.append(text + "\n")
-            
-        elif node_type == "heading":
-            level = node.get("attrs", {}).get("level", 1)
-            text = _inline_to_markdown(node.get("content", []))
-            result.append("#" * level + " " + text + "\n")
-            
-        elif node_type == "bulletList":
-            items = node.get("content", [])
-            for item in items:
-                item_text = _nodes_to_markdown(item.get("content", []), depth + 1)
-                result.append("  " * depth + "- " + item_text.strip() + "\n")
-                
-        elif node_type == "orderedList":
-            items = node.get("content", [])
-            for i, item in enumerate(items, 1):
-                item_text = _nodes_to_markdown(item.get("content", []), depth + 1)
-                result.append("  " * depth + f"{i}. " + item_text.strip() + "\n")
-                
-        elif node_type == "listItem":
-            text = _nodes_to_markdown(node.get("content", []), depth)
-            result.append(text)
-            
-        elif node_type == "blockquote":
-            text = _nodes_to_markdown(node.get("content", []))
-            lines = text.strip().split("\n")
-            for line in lines:
-                result.append("> " + line + "\n")
-                
-        elif node_type == "codeBlock":
-            language = node.get("attrs", {}).get("language", "")
-            text = _inline_to_markdown(node.get("content", []))
-            result.append(f"```{language}\n{text}\n```\n")
-            
-        elif node_type == "image":
-            attrs = node.get("attrs", {})
-            src = attrs.get("src", "")
-            alt = attrs.get("alt", "")
-            result.append(f"![{alt}]({src})\n")
-            
-        elif node_type == "horizontalRule":
-            result.append("---\n")
-            
-        elif node_type == "hardBreak":
-            result.append("  \n")
-            
-    return "".join(result)
-
-
-def _inline_to_markdown(nodes: list) -> str:
-    """转换行内元素为 Markdown"""
-    result = []
-    
-    for node in nodes:
-        node_type = node.get("type", "")
-        
-        if node_type == "text":
-            text = node.get("text", "")
-            marks = node.get("marks", [])
-            
-            for mark in marks:
-                mark_type = mark.get("type", "")
-                if mark_type == "bold":
-                    text = f"**{text}**"
-                elif mark_type == "italic":
-                    text = f"*{text}*"
-                elif mark_type == "code":
-                    text = f"`{text}`"
-                elif mark_type == "strike":
-                    text = f"~~{text}~~"
-                elif mark_type == "link":
-                    href = mark.get("attrs", {}).get("href", "")
-                    text = f"[{text}]({href})"
-                elif mark_type == "highlight":
-                    text = f"=={text}=="
-                    
-            result.append(text)
-            
-        elif node_type == "hardBreak":
-            result.append("  \n")
-            
-    return "".join(result)
+    return render_document(json_content, html_output=False).markdown
 
 
 def format_note_markdown(note: Note, include_metadata: bool = True) -> str:
@@ -149,14 +58,20 @@ def format_note_markdown(note: Note, include_metadata: bool = True) -> str:
     
     # 内容
     if note.json_content:
-        content = json_content_to_markdown(note.json_content)
-        parts.append(content)
+        parts.append(render_note(note).markdown)
     elif note.content:
         parts.append(note.content)
     
     return "".join(parts)
 
 
+def safe_filename(name: Optional[str], fallback: str) -> str:
+    """生成安全的文件名（不含扩展名）"""
+    # 移除不安全字符与控制字符
+    filename = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '', name or "").strip().strip(".")[:50]
+    return filename or fallback
+
+
 @router.get("/note/{note_id}/markdown")
 async def export_note_markdown(
     note_id: str,
@@ -181,9 +96,7 @@ async def export_note_markdown(
     markdown = format_note_markdown(note, include_metadata)
     
     # 生成文件名
-    filename = note.title or note.id
-    # 移除不安全字符
-    filename = re.sub(r'[<>:"/\\|?*]', '', filename)[:50]
+    filename = safe_filename(note.title, note.id)
     
     return Response(
         content=markdown.encode('utf-8'),
@@ -194,6 +107,49 @@ async def export_note_markdown(
     )
 
 
+def _export_query(user_id: str, note_ids: Optional[List[str]], tag_id: Optional[str]):
+    """批量导出的笔记查询（标签过滤用子查询，避免 JOIN 产生重复行）"""
+    query = select(Note).where(Note.user_id == user_id)
+    if note_ids:
+        query = query.where(Note.id.in_(note_ids))
+    elif tag_id:
+        query = query.where(
+            Note.id.in_(select(NoteTag.note_id).where(NoteTag.tag_id == tag_id))
+        )
+    return query
+
+
+def _parse_note_ids(note_ids: Optional[str]) -> Optional[List[str]]:
+    if note_ids is None:
+        return None
+    return [id.strip() for id in note_ids.split(",") if id.strip()]
+
+
+async def _count_export_notes(db: AsyncSession, query) -> int:
+    result = await db.execute(select(func.count()).select_from(query.subquery()))
+    return result.scalar() or 0
+
+
+async def iter_export_notes(query) -> AsyncIterator[List[Note]]:
+    """以服务端游标分批读取待导出的笔记
+
+    使用独立会话（响应流式发送时请求会话可能已关闭）。会话的 identity map
+    是弱引用，已发送的批次不再被引用后即可回收，内存占用与笔记总数无关。
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.stream_scalars(
+            query.options(selectinload(Note.tags))
+            .order_by(Note.created_at.desc(), Note.id.desc())
+            .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for batch in result.partitions():
+            yield batch
+
+
+def _download_headers(filename: str) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
 @router.get("/notes/markdown")
 async def export_notes_markdown(
     note_ids: str = Query(None, description="笔记 ID，逗号分隔"),
@@ -202,48 +158,37 @@ async def export_notes_markdown(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """批量导出笔记为 Markdown（打包为单个文件）"""
-    query = select(Note).options(selectinload(Note.tags)).where(Note.user_id == current_user.id)
-    
-    if note_ids:
-        ids = [id.strip() for id in note_ids.split(",") if id.strip()]
-        if not ids:
-            return invalid_params("请提供笔记 ID")
-        query = query.where(Note.id.in_(ids))
-    elif tag_id:
-        query = query.join(NoteTag, Note.id == NoteTag.note_id).where(NoteTag.tag_id == tag_id)
-    else:
-        # 默认导出所有笔记
-        pass
-    
-    query = query.order_by(Note.created_at.desc())
-    result = await db.execute(query)
-    notes = result.scalars().unique().all()
-    
-    if not notes:
+    """批量导出笔记为 Markdown（打包为单个文件，流式输出）"""
+    ids = _parse_note_ids(note_ids)
+    if ids is not None and not ids:
+        return invalid_params("请提供笔记 ID")
+    
+    query = _export_query(current_user.id, ids, tag_id)
+    total = await _count_export_notes(db, query)
+    if not total:
         return not_found("没有可导出的笔记")
     
-    # 生成合并的 Markdown
-    parts = []
-    parts.append(f"# 笔记导出\n\n")
-    parts.append(f"导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-    parts.append(f"共 {len(notes)} 篇笔记\n\n")
-    parts.append("---\n\n")
-    
-    for note in notes:
-        parts.append(format_note_markdown(note, include_metadata))
-        parts.append("\n\n---\n\n")
-    
-    content = "".join(parts)
+    async def generate():
+        header = (
+            "# 笔记导出\n\n"
+            f"导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"共 {total} 篇笔记\n\n"
+            "---\n\n"
+        )
+        yield header.encode("utf-8")
+        async for batch in iter_export_notes(query):
+            parts = []
+            for note in batch:
+                parts.append(format_note_markdown(note, include_metadata))
+                parts.append("\n\n---\n\n")
+            yield "".join(parts).encode("utf-8")
     
     filename = f"notes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
-    return Response(
-        content=content.encode('utf-8'),
+    return StreamingResponse(
+        generate(),
         media_type="text/markdown; charset=utf-8",
-        headers={
-            "Content-Disposition": f'attachment; filename="{filename}.md"'
-        }
+        headers=_download_headers(f"{filename}.md"),
     )
 
 
@@ -270,8 +215,7 @@ async def export_note_json(
     data = note.to_dict(include_tags=True)
     content = json.dumps(data, ensure_ascii=False, indent=2)
     
-    filename = note.title or note.id
-    filename = re.sub(r'[<>:"/\\|?*]', '', filename)[:50]
+    filename = safe_filename(note.title, note.id)
     
     return Response(
         content=content.encode('utf-8'),
@@ -289,37 +233,256 @@ async def export_notes_json(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """批量导出笔记为 JSON"""
-    query = select(Note).options(selectinload(Note.tags)).where(Note.user_id == current_user.id)
+    """批量导出笔记为 JSON（逐条编码，流式输出）"""
+    ids = _parse_note_ids(note_ids)
+    if ids is not None and not ids:
+        return invalid_params("请提供笔记 ID")
+    
+    query = _export_query(current_user.id, ids, tag_id)
+    total = await _count_export_notes(db, query)
+    if not total:
+        return not_found("没有可导出的笔记")
     
-    if note_ids:
-        ids = [id.strip() for id in note_ids.split(",") if id.strip()]
-        if not ids:
-            return invalid_params("请提供笔记 ID")
-        query = query.where(Note.id.in_(ids))
-    elif tag_id:
-        query = query.join(NoteTag, Note.id == NoteTag.note_id).where(NoteTag.tag_id == tag_id)
+    async def generate():
+        # 输出与 json.dumps(data, indent=2) 相同的结构，但每次只编码一篇笔记
+        yield (
+            "{\n"
+            f'  "export_time": {json.dumps(datetime.now().isoformat())},\n'
+            f'  "count": {total},\n'
+            '  "notes": ['
+        ).encode("utf-8")
+        first = True
+        async for batch in iter_export_notes(query):
+            parts = []
+            for note in batch:
+                encoded = json.dumps(note.to_dict(include_tags=True), ensure_ascii=False, indent=2)
+                parts.append(("\n" if first else ",\n") + textwrap.indent(encoded, "    "))
+                first = False
+            yield "".join(parts).encode("utf-8")
+        yield "\n  ]\n}".encode("utf-8")
+    
+    filename = f"notes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/json; charset=utf-8",
+        headers=_download_headers(f"{filename}.json"),
+    )
+
+
+def unique_filename(used_names: set, note: Note) -> str:
+    """归档内不重复的文件名（不区分大小写，重名时追加序号）"""
+    base = safe_filename(note.title, note.id)
+    name = base
+    suffix = 2
+    while name.lower() in used_names:
+        name = f"{base} ({suffix})"
+        suffix += 1
+    used_names.add(name.lower())
+    return name
+
+
+class _NoteArchive:
+    """把笔记逐篇写入归档，并收集索引与附件清单"""
+
+    def __init__(self, writer: ArchiveWriter, include_metadata: bool):
+        self.writer = writer
+        self.include_metadata = include_metadata
+        self.used_names: set = set()
+        self.index: List[dict] = []
+        self.attachments: List[dict] = []
+
+    def add_notes(self, notes: List[Note]) -> bytes:
+        """写入一批笔记，返回本批产生的归档字节"""
+        for note in notes:
+            path = f"notes/{unique_filename(self.used_names, note)}.md"
+            markdown = format_note_markdown(note, self.include_metadata)
+            self.writer.add(path, markdown.encode("utf-8"), note.updated_at)
+            self.index.append({
+                "id": note.id,
+                "title": note.title,
+                "file": path,
+                "is_pinned": note.is_pinned,
+                "tags": [tag.name for tag in note.tags],
+                "created_at": note.created_at.isoformat() if note.created_at else None,
+                "updated_at": note.updated_at.isoformat() if note.updated_at else None,
+                "attachment_ids": [att.id for att in note.attachments],
+            })
+            for att in note.attachments:
+                self.attachments.append({
+                    "id": att.id,
+                    "note_id": note.id,
+                    "note_file": path,
+                    "type": att.type,
+                    "file_name": att.file_name,
+                    "file_size": att.file_size,
+                    "mime_type": att.mime_type,
+                    "url": att.url,
+                    "thumbnail_url": att.thumbnail_url,
+                    "created_at": att.created_at.isoformat() if att.created_at else None,
+                })
+        return self.writer.drain()
+
+    def finish(self) -> bytes:
+        """写入索引与附件清单并结束归档"""
+        now = datetime.now()
+        index = {"export_time": now.isoformat(), "count": len(self.index), "notes": self.index}
+        manifest = {"count": len(self.attachments), "attachments": self.attachments}
+        self.writer.add(
+            "index.json",
+            json.dumps(index, ensure_ascii=False, indent=2).encode("utf-8"),
+            now,
+        )
+        self.writer.add(
+            "attachments.json",
+            json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"),
+            now,
+        )
+        return self.writer.close()
+
+
+@router.get("/notes/archive")
+async def export_notes_archive(
+    archive_format: str = Query(
+        "zip", alias="format", pattern="^(zip|tar\\.gz)$", description="归档格式：zip 或 tar.gz"
+    ),
+    note_ids: str = Query(None, description="笔记 ID，逗号分隔"),
+    tag_id: str = Query(None, description="按标签导出"),
+    include_metadata: bool = Query(True, description="是否包含元数据"),
+    parallel: bool = Query(True, description="在工作线程中渲染压缩，与读取下一批重叠进行"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """批量导出为归档（每篇笔记一个 Markdown 文件 + index.json + attachments.json）
     
-    query = query.order_by(Note.created_at.desc())
-    result = await db.execute(query)
-    notes = result.scalars().unique().all()
+    归档条目边生成边发送，内存占用只与单批笔记相关
+    """
+    ids = _parse_note_ids(note_ids)
+    if ids is not None and not ids:
+        return invalid_params("请提供笔记 ID")
     
-    if not notes:
+    query = _export_query(current_user.id, ids, tag_id)
+    total = await _count_export_notes(db, query)
+    if not total:
         return not_found("没有可导出的笔记")
     
-    data = {
-        "export_time": datetime.now().isoformat(),
-        "count": len(notes),
-        "notes": [note.to_dict(include_tags=True) for note in notes]
-    }
+    writer = ArchiveWriter(archive_format)
+    archive = _NoteArchive(writer, include_metadata)
     
-    content = json.dumps(data, ensure_ascii=False, indent=2)
-    filename = f"notes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    async def generate():
+        if not parallel:
+            async for batch in iter_export_notes(query):
+                yield archive.add_notes(batch)
+            yield archive.finish()
+            return
+        
+        # 上一批在线程中渲染压缩的同时读取下一批；归档写入仍按批次顺序进行
+        pending = None
+        async for batch in iter_export_notes(query):
+            if pending is not None:
+                yield await pending
+            pending = asyncio.ensure_future(asyncio.to_thread(archive.add_notes, batch))
+        if pending is not None:
+            yield await pending
+        yield await asyncio.to_thread(archive.finish)
+    
+    filename = f"notes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}{writer.extension}"
+    
+    return StreamingResponse(
+        generate(),
+        media_type=writer.media_type,
+        headers=_download_headers(filename),
+    )
+
+
+@router.get("/note/{note_id}/pdf")
+async def export_note_pdf(
+    note_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """导出单个笔记为 PDF（在渲染进程池中排版，结果按笔记版本缓存）"""
+    result = await db.execute(select(Note).where(Note.id == note_id))
+    note = result.scalar_one_or_none()
+    
+    if not note:
+        return not_found("笔记不存在")
+    
+    if note.user_id != current_user.id:
+        return forbidden("无权限访问")
+    
+    try:
+        pdf = await pdf_renderer.render_note(note)
+    except PdfQueueFull:
+        return too_many_requests("PDF 导出任务过多，请稍后重试")
+    except Exception as e:
+        print(f"[PDF Export Error] 笔记 {note.id} 渲染失败: {str(e)}")
+        return server_error("PDF 渲染失败")
+    
+    filename = safe_filename(note.title, note.id)
     
     return Response(
-        content=content.encode('utf-8'),
-        media_type="application/json; charset=utf-8",
-        headers={
-            "Content-Disposition": f'attachment; filename="{filename}.json"'
-        }
+        content=pdf,
+        media_type="application/pdf",
+        headers=_download_headers(f"{filename}.pdf"),
+    )
+
+
+@router.get("/notes/pdf")
+async def export_notes_pdf(
+    note_ids: str = Query(None, description="笔记 ID，逗号分隔"),
+    tag_id: str = Query(None, description="按标签导出"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """批量导出为 PDF（每篇笔记一个 PDF，打包为 zip 流式输出）
+    
+    每次最多提交与渲染进程数相同的任务，一个批量导出不会占满等待队列；
+    单篇渲染失败时跳过该笔记并记录在 errors.json 中。
+    """
+    ids = _parse_note_ids(note_ids)
+    if ids is not None and not ids:
+        return invalid_params("请提供笔记 ID")
+    
+    if pdf_renderer.saturated:
+        return too_many_requests("PDF 导出任务过多，请稍后重试")
+    
+    query = _export_query(current_user.id, ids, tag_id)
+    total = await _count_export_notes(db, query)
+    if not total:
+        return not_found("没有可导出的笔记")
+    
+    writer = ArchiveWriter("zip")
+    
+    async def generate():
+        used_names: set = set()
+        errors = []
+        async for batch in iter_export_notes(query):
+            for start in range(0, len(batch), pdf_renderer.workers):
+                window = batch[start:start + pdf_renderer.workers]
+                outcomes = await asyncio.gather(
+                    *(pdf_renderer.render_note(note, wait=True) for note in window),
+                    return_exceptions=True,
+                )
+                for note, outcome in zip(window, outcomes):
+                    if isinstance(outcome, BaseException):
+                        print(f"[PDF Export Error] 笔记 {note.id} 渲染失败: {str(outcome)}")
+                        errors.append({"id": note.id, "title": note.title, "error": str(outcome)})
+                        continue
+                    writer.add(f"{unique_filename(used_names, note)}.pdf", outcome, note.updated_at)
+                yield writer.drain()
+        if errors:
+            report = {"count": len(errors), "notes": errors}
+            writer.add(
+                "errors.json",
+                json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8"),
+            )
+        yield writer.close()
+    
+    filename = f"notes_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    
+    return StreamingResponse(
+        generate(),
+        media_type=writer.media_type,
+        headers=_download_headers(filename),
     )
@@ -1,8 +1,10 @@
 """笔记相关 API"""
 
 from datetime import datetime
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, func, or_
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Query
+from sqlalchemy import select, func, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -16,17 +18,38 @@ from app.core import (
     forbidden,
     version_conflict,
     server_error,
+    settings,
+)
+from app.core.pagination import (
+    Keyset, InvalidCursor, encode_cursor, decode_cursor, paginate_keyset, count_cache,
+)
+from app.models import User, Note, Tag, NoteTag
+from app.schemas import (
+    NoteCreate, NoteUpdate, BulkNoteAction, BulkNotePin, BulkNoteTags, BulkNoteUpdate,
+)
+from app.services.bulk_notes import (
+    BulkResult, bulk_pin, bulk_set_deleted, bulk_tag, bulk_update, duplicate_ids,
+    note_content_changed, owned_tag_ids,
 )
-from app.models import User, Note, Tag, NoteTag, NoteVersion
-from app.schemas import NoteCreate, NoteUpdate
+from app.services.indexing import reembed_note_task, reembed_notes_task, mark_embeddings_deleted
+from app.services.text_search import (
+    build_tsquery, tsquery_expression, highlight_terms, highlight, note_body_text,
+)
+from app.services.version_store import build_version_snapshot, snapshot_before_update
 
 router = APIRouter(prefix="/notes", tags=["笔记"])
 
 
+# 列表排序：置顶优先、最近更新优先，id 保证顺序稳定
+NOTE_LIST_KEYSET = Keyset((Note.is_pinned, True), (Note.updated_at, True), (Note.id, True))
+
+
 @router.get("")
 async def list_notes(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，优先于 page"),
+    include_total: bool = Query(True, description="是否返回总数（短期缓存）"),
     tag_id: str = Query(None),
     is_pinned: str = Query(None),
     current_user: User = Depends(get_current_user),
@@ -48,33 +71,38 @@ async def list_notes(
         query = query.where(Note.is_pinned == True)
 
     # 总数
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar() or 0
+    total = None
+    if include_total:
+        total = await count_cache.get_or_count(
+            db, current_user.id, f"notes:{tag_id}:{is_pinned}", query
+        )
 
     # 分页
-    offset = (page - 1) * page_size
-    query = (
-        query.options(selectinload(Note.tags))
-        .order_by(Note.is_pinned.desc(), Note.updated_at.desc())
-        .offset(offset)
-        .limit(page_size)
-    )
-
-    result = await db.execute(query)
-    notes = result.scalars().unique().all()
+    try:
+        notes, next_cursor = await paginate_keyset(
+            db,
+            query.options(selectinload(Note.tags)),
+            NOTE_LIST_KEYSET,
+            page,
+            page_size,
+            cursor,
+        )
+    except InvalidCursor as e:
+        return invalid_params(str(e))
 
     return success_with_pagination(
         [note.to_dict() for note in notes],
         total,
         page,
         page_size,
+        next_cursor=next_cursor,
     )
 
 
 @router.post("")
 async def create_note(
     data: NoteCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -90,15 +118,7 @@ async def create_note(
     await db.flush()
     
     # 保存初始版本
-    initial_version = NoteVersion(
-        note_id=note.id,
-        version=1,
-        title=data.title,
-        content=data.content,
-        json_content=data.json_content,
-        change_type="create",
-        change_summary="创建笔记",
-    )
+    initial_version = await build_version_snapshot(db, note, "create", "创建笔记")
     db.add(initial_version)
 
     # 添加标签
@@ -114,6 +134,11 @@ async def create_note(
 
     await db.commit()
     await db.refresh(note)
+    count_cache.invalidate(current_user.id)
+
+    # 有内容时在后台建立嵌入（带上 user_id，检索可直接按用户过滤）
+    if data.content or data.json_content:
+        background_tasks.add_task(reembed_note_task, note.id)
 
     return success({
         "id": note.id,
@@ -127,38 +152,192 @@ async def search_notes(
     q: str = Query(..., min_length=1),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，优先于 page"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """搜索笔记"""
-    search_pattern = f"%{q}%"
-    query = select(Note).where(
+    """搜索笔记（全文索引，按相关度排序，返回高亮摘要）"""
+    try:
+        after = decode_cursor(cursor)
+    except InvalidCursor as e:
+        return invalid_params(str(e))
+
+    tsquery = build_tsquery(q)
+    if not tsquery:
+        return success_with_pagination([], 0, page, page_size)
+
+    ts_query = tsquery_expression(tsquery)
+    rank = func.ts_rank_cd(Note.search_vector, ts_query)
+    query = select(Note, rank.label("rank")).where(
         Note.user_id == current_user.id,
         Note.deleted_at.is_(None),
-        or_(
-            Note.title.ilike(search_pattern),
-            Note.content.ilike(search_pattern),
-        ),
+        Note.search_vector.op("@@")(ts_query),
     )
 
-    # 总数
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar() or 0
+    # 总数只在没有游标时统计（走 GIN 索引），按游标翻页时不再重复统计
+    total = None
+    if after is None:
+        total = await count_cache.get_or_count(
+            db, current_user.id, f"search:{tsquery}", query.with_only_columns(Note.id)
+        )
+    else:
+        try:
+            after_rank, after_id = float(after["rank"]), str(after["id"])
+        except (KeyError, TypeError, ValueError):
+            return invalid_params("无效的分页游标")
+        query = query.where(
+            or_(rank < after_rank, and_(rank == after_rank, Note.id > after_id))
+        )
+    if after is None and page > 1:
+        # 没有游标时按 page 回退到 OFFSET 分页（兼容旧客户端，与笔记列表一致）
+        query = query.offset((page - 1) * page_size)
 
-    # 分页
-    offset = (page - 1) * page_size
-    query = query.order_by(Note.updated_at.desc()).offset(offset).limit(page_size)
+    # 多取一条判断是否还有下一页
+    result = await db.execute(
+        query.order_by(rank.desc(), Note.id).limit(page_size + 1)
+    )
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_note, last_rank = rows[-1]
+        next_cursor = encode_cursor({"rank": last_rank, "id": last_note.id})
+
+    terms = highlight_terms(q)
+    items = []
+    for note, note_rank in rows:
+        item = note.to_dict(include_tags=False)
+        item["rank"] = note_rank
+        item["highlight"] = {
+            "title": highlight(note.title, terms),
+            "snippet": highlight(
+                note_body_text(note), terms, max_len=settings.SEARCH_SNIPPET_LENGTH
+            ),
+        }
+        items.append(item)
+
+    return success_with_pagination(items, total, page, page_size, next_cursor=next_cursor)
+
+
+# ---------- 批量操作（单事务，逐条返回结果） ----------
+
+def _check_bulk_items(items) -> Optional[dict]:
+    """批量请求的数量与重复 id 校验，不通过时返回错误响应"""
+    if len(items) > settings.NOTES_BULK_MAX_ITEMS:
+        return invalid_params(f"单次最多操作 {settings.NOTES_BULK_MAX_ITEMS} 个笔记")
+    duplicates = duplicate_ids(items)
+    if duplicates:
+        return invalid_params(f"笔记 ID 重复: {', '.join(duplicates[:10])}")
+    return None
+
+
+async def _commit_bulk(db: AsyncSession, current_user: User, outcome: BulkResult) -> Optional[dict]:
+    """提交批量操作，失败时返回错误响应"""
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        return server_error(f"批量操作失败: {str(e)}")
+    if outcome.succeeded:
+        count_cache.invalidate(current_user.id)
+    return None
 
-    result = await db.execute(query)
-    notes = result.scalars().all()
 
-    return success_with_pagination(
-        [note.to_dict(include_tags=False) for note in notes],
-        total,
-        page,
-        page_size,
+@router.post("/bulk/update")
+async def bulk_update_notes(
+    data: BulkNoteUpdate,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """批量更新笔记（每条笔记独立校验乐观锁）"""
+    error = _check_bulk_items(data.items)
+    if error:
+        return error
+
+    outcome = await bulk_update(db, current_user.id, data.items)
+    error = await _commit_bulk(db, current_user, outcome)
+    if error:
+        return error
+    # 内容变化的笔记在后台分批增量重嵌入
+    if outcome.changed_ids:
+        background_tasks.add_task(reembed_notes_task, outcome.changed_ids)
+    return success(outcome.to_dict())
+
+
+@router.post("/bulk/delete")
+async def bulk_delete_notes(
+    data: BulkNoteAction,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """批量删除笔记（软删除，移入回收站）"""
+    error = _check_bulk_items(data.items)
+    if error:
+        return error
+
+    outcome = await bulk_set_deleted(db, current_user.id, data.items, deleted=True)
+    return await _commit_bulk(db, current_user, outcome) or success(outcome.to_dict())
+
+
+@router.post("/bulk/restore")
+async def bulk_restore_notes(
+    data: BulkNoteAction,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """批量恢复回收站中的笔记"""
+    error = _check_bulk_items(data.items)
+    if error:
+        return error
+
+    outcome = await bulk_set_deleted(db, current_user.id, data.items, deleted=False)
+    return await _commit_bulk(db, current_user, outcome) or success(outcome.to_dict())
+
+
+@router.post("/bulk/pin")
+async def bulk_pin_notes(
+    data: BulkNotePin,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """批量置顶 / 取消置顶"""
+    error = _check_bulk_items(data.items)
+    if error:
+        return error
+
+    outcome = await bulk_pin(db, current_user.id, data.items, data.is_pinned)
+    return await _commit_bulk(db, current_user, outcome) or success(outcome.to_dict())
+
+
+@router.post("/bulk/tags")
+async def bulk_tag_notes(
+    data: BulkNoteTags,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """批量添加 / 移除标签"""
+    error = _check_bulk_items(data.items)
+    if error:
+        return error
+    if not data.add_tag_ids and not data.remove_tag_ids:
+        return invalid_params("请指定要添加或移除的标签")
+    if set(data.add_tag_ids) & set(data.remove_tag_ids):
+        return invalid_params("同一标签不能同时添加和移除")
+
+    tag_ids = list(dict.fromkeys(data.add_tag_ids + data.remove_tag_ids))
+    missing = set(tag_ids) - await owned_tag_ids(db, current_user.id, tag_ids)
+    if missing:
+        return not_found(f"标签不存在: {', '.join(sorted(missing))}")
+
+    outcome = await bulk_tag(
+        db,
+        current_user.id,
+        data.items,
+        list(dict.fromkeys(data.add_tag_ids)),
+        list(dict.fromkeys(data.remove_tag_ids)),
     )
+    return await _commit_bulk(db, current_user, outcome) or success(outcome.to_dict())
 
 
 @router.get("/{note_id}")
@@ -188,6 +367,7 @@ async def get_note(
 async def update_note(
     note_id: str,
     data: NoteUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -208,23 +388,14 @@ async def update_note(
         return version_conflict(note.to_dict(), "版本冲突，请刷新后重试")
 
     # 检查内容是否有变化，有变化才保存版本
-    content_changed = (
-        (data.title is not None and data.title != note.title) or
-        (data.content is not None and data.content != note.content) or
-        (data.json_content is not None and data.json_content != str(note.json_content))
-    )
+    content_changed = note_content_changed(data, note)
     
     # 保存当前版本到历史（在修改之前）
     if content_changed:
-        version_snapshot = NoteVersion(
-            note_id=note.id,
-            version=note.version,
-            title=note.title,
-            content=note.content,
-            json_content=note.json_content,
-            change_type="update",
-        )
-        db.add(version_snapshot)
+        # 自动保存的连续修改合并为一个版本
+        version_snapshot = await snapshot_before_update(db, note, data.session_id)
+        if version_snapshot is not None:
+            db.add(version_snapshot)
 
     # 更新字段
     if data.title is not None:
@@ -242,6 +413,10 @@ async def update_note(
     try:
         await db.commit()
         await db.refresh(note)
+        count_cache.invalidate(current_user.id)
+        # 内容变化后增量重嵌入（只嵌入新增或变化的文本块）
+        if content_changed:
+            background_tasks.add_task(reembed_note_task, note.id)
         return success({
             "id": note.id,
             "version": note.version,
@@ -270,6 +445,8 @@ async def delete_note(
 
     # 软删除：设置 deleted_at
     note.deleted_at = datetime.utcnow()
+    await mark_embeddings_deleted(db, [note_id], True)
     await db.commit()
+    count_cache.invalidate(current_user.id)
 
     return success({"message": "笔记已移入回收站", "id": note_id})
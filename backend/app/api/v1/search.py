@@ -3,17 +3,23 @@
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, BackgroundTasks
-from sqlalchemy import select, text, delete
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from pgvector.sqlalchemy import Vector
 
-from app.core import get_db, get_current_user, success, invalid_params, server_error, settings
-from app.models import User, Note, NoteEmbedding
+from app.core import (
+    get_db, get_current_user, success, invalid_params, not_found, server_error, settings,
+)
+from app.models import User, Note, NoteEmbedding, EmbeddingJob
 from app.schemas import (
-    SemanticSearchRequest, SemanticSearchResult,
+    SemanticSearchRequest, SemanticSearchResult, HybridSearchRequest,
     EmbedNoteRequest, EmbedAllNotesRequest,
 )
-from app.services import get_embedding, get_embeddings_batch, chunk_text, extract_plain_text
+from app.services import get_embedding
+from app.services.indexing import note_plain_text, sync_note_embeddings
+from app.services.embed_jobs import enqueue_embedding_job
+from app.services.vector_search import search_similar_chunks
+from app.services.hybrid_search import hybrid_search
 
 
 router = APIRouter(prefix="/search", tags=["搜索"])
@@ -38,35 +44,16 @@ async def semantic_search(
         if query_embedding is None:
             return server_error("无法生成查询向量")
         
-        # 使用 pgvector 进行向量搜索
-        # 1 - cosine_distance = cosine_similarity
-        query = text("""
-            SELECT 
-                ne.id,
-                ne.note_id,
-                ne.chunk_text,
-                1 - (ne.embedding <=> :query_embedding::vector) as similarity,
-                n.title as note_title,
-                LEFT(n.content, 200) as note_preview
-            FROM note_embeddings ne
-            JOIN notes n ON ne.note_id = n.id
-            WHERE n.user_id = :user_id
-                AND ne.embedding IS NOT NULL
-            ORDER BY ne.embedding <=> :query_embedding::vector
-            LIMIT :top_k
-        """)
-        
-        result = await db.execute(
-            query,
-            {
-                "query_embedding": str(query_embedding),
-                "user_id": current_user.id,
-                "top_k": data.top_k or settings.RAG_TOP_K,
-            }
+        # 使用 pgvector 进行向量搜索（可按请求调整 ANN 召回参数）
+        rows = await search_similar_chunks(
+            db,
+            user_id=current_user.id,
+            query_embedding=query_embedding,
+            top_k=data.top_k or settings.RAG_TOP_K,
+            ef_search=data.ef_search,
+            probes=data.probes,
         )
         
-        rows = result.fetchall()
-        
         results = []
         for row in rows:
             results.append({
@@ -87,6 +74,38 @@ async def semantic_search(
         return server_error(f"语义搜索失败: {str(e)}")
 
 
+@router.post("/hybrid")
+async def hybrid_search_notes(
+    data: HybridSearchRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """混合检索 - 全文检索与语义检索并行召回，RRF 融合排序
+    
+    返回分页后的笔记列表及各阶段耗时；某一路召回失败时降级为另一路
+    """
+    if not data.query or not data.query.strip():
+        return invalid_params("搜索词不能为空")
+    
+    try:
+        result = await hybrid_search(
+            current_user.id,
+            data.query.strip(),
+            page=data.page,
+            page_size=data.page_size,
+            ef_search=data.ef_search,
+            probes=data.probes,
+        )
+    except Exception as e:
+        return server_error(f"混合检索失败: {str(e)}")
+    
+    return success({
+        "query": data.query,
+        "page": data.page,
+        "page_size": data.page_size,
+        **result,
+    })
+
+
 @router.post("/embed-note")
 async def embed_note(
     data: EmbedNoteRequest,
@@ -100,7 +119,8 @@ async def embed_note(
     result = await db.execute(
         select(Note).where(
             Note.id == data.note_id,
-            Note.user_id == current_user.id
+            Note.user_id == current_user.id,
+            Note.deleted_at.is_(None),
         )
     )
     note = result.scalar_one_or_none()
@@ -109,13 +129,7 @@ async def embed_note(
         return invalid_params("笔记不存在")
     
     try:
-        # 如果强制重新嵌入，先删除旧的
-        if data.force:
-            await db.execute(
-                delete(NoteEmbedding).where(NoteEmbedding.note_id == note.id)
-            )
-            await db.commit()
-        else:
+        if not data.force:
             # 检查是否已有嵌入
             existing = await db.execute(
                 select(NoteEmbedding).where(NoteEmbedding.note_id == note.id).limit(1)
@@ -128,49 +142,30 @@ async def embed_note(
                 })
         
         # 获取文本内容
-        text_content = note.content
-        if not text_content and note.json_content:
-            text_content = extract_plain_text(note.json_content)
-        
-        if not text_content or not text_content.strip():
+        text_content = note_plain_text(note)
+        if not text_content.strip():
             return success({
                 "message": "笔记内容为空，跳过嵌入",
                 "note_id": note.id,
                 "status": "empty"
             })
         
-        # 分块
-        chunks = chunk_text(text_content)
-        if not chunks:
+        # 分块、比对并只嵌入变化的块
+        stats = await sync_note_embeddings(db, note, force=data.force)
+        if not stats["chunks_count"]:
+            await db.rollback()
             return success({
                 "message": "分块结果为空",
                 "note_id": note.id,
                 "status": "empty"
             })
         
-        # 批量获取嵌入
-        embeddings = await get_embeddings_batch(chunks)
-        
-        # 保存嵌入
-        created_count = 0
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            if embedding is not None:
-                note_embedding = NoteEmbedding(
-                    note_id=note.id,
-                    chunk_index=i,
-                    chunk_text=chunk,
-                    embedding=embedding,
-                )
-                db.add(note_embedding)
-                created_count += 1
-        
         await db.commit()
         
         return success({
             "message": "嵌入创建成功",
             "note_id": note.id,
-            "chunks_count": len(chunks),
-            "embedded_count": created_count,
+            **stats,
             "status": "success"
         })
     
@@ -182,79 +177,51 @@ async def embed_note(
 @router.post("/embed-all")
 async def embed_all_notes(
     data: EmbedAllNotesRequest,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """为所有笔记创建向量嵌入（异步任务）"""
+    """为所有笔记创建向量嵌入（后台任务）
     
-    # 获取用户所有笔记
-    result = await db.execute(
-        select(Note).where(Note.user_id == current_user.id)
-    )
-    notes = result.scalars().all()
+    任务持久化后由 worker 池执行，可通过 /search/embed-jobs/{id} 查询进度
+    """
+    job = await enqueue_embedding_job(db, current_user.id, force=data.force)
     
-    if not notes:
+    if job.total_notes == 0 and job.status == "pending":
         return success({
             "message": "没有笔记需要嵌入",
+            "job_id": job.id,
             "total": 0,
         })
     
-    # 启动后台任务
-    async def embed_notes_task():
-        async with db.begin():
-            for note in notes:
-                try:
-                    # 检查是否需要嵌入
-                    if not data.force:
-                        existing = await db.execute(
-                            select(NoteEmbedding).where(NoteEmbedding.note_id == note.id).limit(1)
-                        )
-                        if existing.scalar_one_or_none():
-                            continue
-                    else:
-                        await db.execute(
-                            delete(NoteEmbedding).where(NoteEmbedding.note_id == note.id)
-                        )
-                    
-                    # 获取文本
-                    text_content = note.content
-                    if not text_content and note.json_content:
-                        text_content = extract_plain_text(note.json_content)
-                    
-                    if not text_content or not text_content.strip():
-                        continue
-                    
-                    # 分块和嵌入
-                    chunks = chunk_text(text_content)
-                    if not chunks:
-                        continue
-                    
-                    embeddings = await get_embeddings_batch(chunks)
-                    
-                    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                        if embedding is not None:
-                            note_embedding = NoteEmbedding(
-                                note_id=note.id,
-                                chunk_index=i,
-                                chunk_text=chunk,
-                                embedding=embedding,
-                            )
-                            db.add(note_embedding)
-                    
-                except Exception as e:
-                    print(f"[Embed Error] Note {note.id}: {str(e)}")
-                    continue
-    
-    background_tasks.add_task(embed_notes_task)
-    
     return success({
         "message": "嵌入任务已启动",
-        "total_notes": len(notes),
-        "status": "processing"
+        "job_id": job.id,
+        "total_notes": job.total_notes,
+        "status": job.status,
     })
 
 
+@router.get("/embed-jobs/{job_id}")
+async def get_embed_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """查询批量嵌入任务进度"""
+    result = await db.execute(
+        select(EmbeddingJob).where(
+            EmbeddingJob.id == job_id,
+            EmbeddingJob.user_id == current_user.id,
+        )
+    )
+    job = result.scalar_one_or_none()
+    
+    if not job:
+        return not_found("任务不存在")
+    
+    return success(job.to_dict())
+
+
 @router.get("/embedding-stats")
 async def get_embedding_stats(
     current_user: User = Depends(get_current_user),
@@ -266,8 +233,7 @@ async def get_embedding_stats(
     embedded_notes_query = text("""
         SELECT COUNT(DISTINCT note_id) as embedded_notes
         FROM note_embeddings ne
-        JOIN notes n ON ne.note_id = n.id
-        WHERE n.user_id = :user_id
+        WHERE ne.user_id = :user_id
     """)
     
     result = await db.execute(embedded_notes_query, {"user_id": current_user.id})
@@ -283,8 +249,7 @@ async def get_embedding_stats(
     chunks_query = text("""
         SELECT COUNT(*) as total_chunks
         FROM note_embeddings ne
-        JOIN notes n ON ne.note_id = n.id
-        WHERE n.user_id = :user_id
+        WHERE ne.user_id = :user_id
     """)
     
     result = await db.execute(chunks_query, {"user_id": current_user.id})
@@ -1,22 +1,39 @@
 """回收站相关 API"""
 
-from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, func
+from fastapi import APIRouter, BackgroundTasks, Depends, Query
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.core import get_db, get_current_user, success, success_with_pagination, not_found, forbidden
-from app.models import User, Note, NoteTag
+from app.core import (
+    get_db,
+    get_current_user,
+    success,
+    success_with_pagination,
+    invalid_params,
+    not_found,
+    forbidden,
+)
+from app.core.pagination import Keyset, InvalidCursor, paginate_keyset, count_cache
+from app.models import User, Note
+from app.services.indexing import mark_embeddings_deleted
+from app.services.trash_purge import delete_attachments, purge_notes
 
 router = APIRouter(prefix="/trash", tags=["回收站"])
 
 
+# 按删除时间倒序，id 保证顺序稳定
+TRASH_LIST_KEYSET = Keyset((Note.deleted_at, True), (Note.id, True))
+
+
 @router.get("")
 async def list_trash(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，优先于 page"),
+    include_total: bool = Query(True, description="是否返回总数（短期缓存）"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -27,26 +44,29 @@ async def list_trash(
     )
     
     # 总数
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar() or 0
+    total = None
+    if include_total:
+        total = await count_cache.get_or_count(db, current_user.id, "trash", query)
     
     # 分页，按删除时间倒序
-    query = (
-        query.options(selectinload(Note.tags))
-        .order_by(Note.deleted_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-    )
-    
-    result = await db.execute(query)
-    notes = result.scalars().unique().all()
+    try:
+        notes, next_cursor = await paginate_keyset(
+            db,
+            query.options(selectinload(Note.tags)),
+            TRASH_LIST_KEYSET,
+            page,
+            page_size,
+            cursor,
+        )
+    except InvalidCursor as e:
+        return invalid_params(str(e))
     
     return success_with_pagination(
         [note.to_dict() for note in notes],
         total,
         page,
         page_size,
+        next_cursor=next_cursor,
     )
 
 
@@ -72,7 +92,9 @@ async def restore_note(
         return forbidden("无权限操作")
     
     note.deleted_at = None
+    await mark_embeddings_deleted(db, [note_id], False)
     await db.commit()
+    count_cache.invalidate(current_user.id)
     
     return success({"message": "笔记已恢复", "id": note_id})
 
@@ -80,6 +102,7 @@ async def restore_note(
 @router.delete("/{note_id}")
 async def permanently_delete_note(
     note_id: str,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -98,37 +121,27 @@ async def permanently_delete_note(
     if note.user_id != current_user.id:
         return forbidden("无权限操作")
     
-    # 删除关联
-    await db.execute(
-        select(NoteTag).where(NoteTag.note_id == note_id)
-    )
-    
-    # 永久删除
-    await db.delete(note)
-    await db.commit()
-    
+    purged = await purge_notes(db, note_ids=[note_id])
+    if purged.attachment_ids:
+        background_tasks.add_task(delete_attachments, purged.attachment_ids)
+
     return success({"message": "笔记已永久删除", "id": note_id})
 
 
 @router.delete("")
 async def empty_trash(
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """清空回收站"""
-    result = await db.execute(
-        select(Note).where(
-            Note.user_id == current_user.id,
-            Note.deleted_at.isnot(None)
-        )
-    )
-    notes = result.scalars().all()
-    
-    count = len(notes)
-    
-    for note in notes:
-        await db.delete(note)
-    
-    await db.commit()
-    
-    return success({"message": f"已清空回收站，删除 {count} 篇笔记", "count": count})
+    """清空回收站（分批删除，附件对象在后台删除）"""
+    result = await purge_notes(db, user_id=current_user.id)
+    if result.attachment_ids:
+        background_tasks.add_task(delete_attachments, result.attachment_ids)
+
+    count = result.notes
+    return success({
+        "message": f"已清空回收站，删除 {count} 篇笔记",
+        "count": count,
+        "stats": result.to_dict(),
+    })
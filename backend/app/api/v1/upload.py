@@ -1,15 +1,43 @@
-"""文件上传 API"""
+"""文件上传 API
 
+- /image、/audio、/video：表单上传，按块读取并流式写入对象存储，按内容哈希去重
+- /stream：请求体即文件内容，边接收边上传，超过大小上限时立即中止
+- /instant：秒传，用户已有同内容（SHA-256）的附件时直接创建附件
+- /sessions：可续传的分片上传，客户端中断后可查询已上传的分片继续
+- /presign、/complete：客户端按预签名 URL 直接上传到对象存储，文件不经过 API；
+  完成时服务端校验对象（分片、大小、类型）后才创建附件
+附件创建后由媒体任务在后台生成缩略图并提取尺寸 / 时长。
+"""
+
+import asyncio
+import hashlib
 import uuid
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, Request
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core import get_db, get_current_user, success, invalid_params, server_error, settings
-from app.models import User, Attachment
-from app.services.storage import upload_to_cos
+from app.core import (
+    get_db,
+    get_current_user,
+    success,
+    invalid_params,
+    not_found,
+    forbidden,
+    server_error,
+    settings,
+)
+from app.models import User, Attachment, UploadSession
+from app.schemas import UploadSessionCreate, UploadComplete, UploadInstant
+from app.services.blobs import register_blob, reuse_blob
+from app.services.media import enqueue_media_job, media_job_worker
+from app.services.storage import get_storage, object_url
+from app.services.uploads import (
+    UploadTooLarge, composite_sha256, iter_upload_file, read_limited, release_session_storage,
+    stream_to_storage,
+)
 
 router = APIRouter(prefix="/upload", tags=["上传"])
 
@@ -18,56 +46,128 @@ ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
 ALLOWED_AUDIO_TYPES = {"audio/mpeg", "audio/wav", "audio/ogg", "audio/webm", "audio/mp4", "audio/x-m4a"}
 ALLOWED_VIDEO_TYPES = {"video/mp4", "video/webm", "video/ogg"}
 
+# 各类附件的格式、大小上限、默认扩展名与存储目录
+UPLOAD_TYPES = {
+    "image": {
+        "label": "图片", "mime_types": ALLOWED_IMAGE_TYPES, "max_size": 10 * 1024 * 1024,
+        "max_label": "10MB", "ext": "jpg", "prefix": "images",
+    },
+    "audio": {
+        "label": "音频", "mime_types": ALLOWED_AUDIO_TYPES, "max_size": 50 * 1024 * 1024,
+        "max_label": "50MB", "ext": "mp3", "prefix": "audio",
+    },
+    "video": {
+        "label": "视频", "mime_types": ALLOWED_VIDEO_TYPES, "max_size": 200 * 1024 * 1024,
+        "max_label": "200MB", "ext": "mp4", "prefix": "video",
+    },
+}
 
-@router.post("/image")
-async def upload_image(
-    file: UploadFile = File(...),
-    note_id: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
-):
-    """上传图片"""
-    # 验证文件类型
-    if file.content_type not in ALLOWED_IMAGE_TYPES:
-        return invalid_params("不支持的图片格式")
+# COS 分片上传最多 10000 个分片
+MAX_PARTS = 10000
+MAX_UPLOAD_SIZE = max(rule["max_size"] for rule in UPLOAD_TYPES.values())
 
-    # 验证文件大小（10MB）
-    content = await file.read()
-    if len(content) > 10 * 1024 * 1024:
-        return invalid_params("图片大小不能超过10MB")
 
-    # 生成文件名
-    ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    file_name = f"images/{datetime.now().strftime('%Y/%m/%d')}/{uuid.uuid4()}.{ext}"
+def _check_type(kind: str, content_type: Optional[str]) -> Optional[dict]:
+    """校验附件类型与格式，不通过时返回错误响应"""
+    rule = UPLOAD_TYPES.get(kind)
+    if rule is None:
+        return invalid_params("不支持的附件类型")
+    if content_type not in rule["mime_types"]:
+        return invalid_params(f"不支持的{rule['label']}格式")
+    return None
 
-    # 上传到 COS
+
+def _too_large(kind: str) -> dict:
+    rule = UPLOAD_TYPES[kind]
+    return invalid_params(f"{rule['label']}大小不能超过{rule['max_label']}")
+
+
+def _object_key(kind: str, file_name: Optional[str]) -> str:
+    """生成存储路径：{目录}/{日期}/{uuid}.{扩展名}"""
+    rule = UPLOAD_TYPES[kind]
+    ext = file_name.split(".")[-1] if file_name and "." in file_name else rule["ext"]
+    return f"{rule['prefix']}/{datetime.now().strftime('%Y/%m/%d')}/{uuid.uuid4()}.{ext}"
+
+
+async def _store_upload(
+    db: AsyncSession,
+    current_user: User,
+    kind: str,
+    chunks: AsyncIterator[bytes],
+    file_name: Optional[str],
+    content_type: str,
+    note_id: Optional[str],
+) -> dict:
+    """流式写入对象存储并创建附件记录"""
+    # 上传期间不占用数据库事务
+    await db.commit()
     try:
-        url = await upload_to_cos(content, file_name, file.content_type)
+        stored = await stream_to_storage(
+            chunks, _object_key(kind, file_name), content_type, UPLOAD_TYPES[kind]["max_size"]
+        )
+    except UploadTooLarge:
+        return _too_large(kind)
     except Exception as e:
         return server_error(f"上传失败: {str(e)}")
 
-    # 创建附件记录
-    attachment = Attachment(
-        note_id=note_id,
-        user_id=current_user.id,
-        type="image",
-        file_name=file.filename,
-        file_size=len(content),
-        mime_type=file.content_type,
-        url=url,
-    )
-    db.add(attachment)
-    await db.commit()
+    try:
+        # 按内容登记 blob，内容已存在时引用已有对象
+        key = await register_blob(db, stored.sha256, stored.key, stored.size, content_type)
+        attachment = Attachment(
+            note_id=note_id,
+            user_id=current_user.id,
+            type=kind,
+            file_name=file_name,
+            file_size=stored.size,
+            mime_type=content_type,
+            url=object_url(key),
+            blob_sha256=stored.sha256,
+        )
+        db.add(attachment)
+        await enqueue_media_job(db, attachment)
+        await db.commit()
+    except Exception as e:
+        # 登记未提交，刚写入的对象不会被任何记录引用
+        await db.rollback()
+        try:
+            await get_storage().delete(stored.key)
+        except Exception as cleanup_error:
+            print(f"[Upload Error] 清理对象失败 {stored.key}: {str(cleanup_error)}")
+        return server_error(f"上传失败: {str(e)}")
     await db.refresh(attachment)
+    media_job_worker.notify()
+
+    deduplicated = key != stored.key
+    if deduplicated:
+        # 删除刚写入的重复对象
+        await get_storage().delete(stored.key)
 
     return success({
         "id": attachment.id,
-        "url": url,
-        "file_name": file.filename,
-        "file_size": len(content),
+        "url": attachment.url,
+        "file_name": file_name,
+        "file_size": stored.size,
+        "sha256": stored.sha256,
+        "deduplicated": deduplicated,
     })
 
 
+@router.post("/image")
+async def upload_image(
+    file: UploadFile = File(...),
+    note_id: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """上传图片"""
+    error = _check_type("image", file.content_type)
+    if error:
+        return error
+    return await _store_upload(
+        db, current_user, "image", iter_upload_file(file), file.filename, file.content_type, note_id
+    )
+
+
 @router.post("/audio")
 async def upload_audio(
     file: UploadFile = File(...),
@@ -76,81 +176,465 @@ async def upload_audio(
     db: AsyncSession = Depends(get_db),
 ):
     """上传音频"""
-    if file.content_type not in ALLOWED_AUDIO_TYPES:
-        return invalid_params("不支持的音频格式")
+    error = _check_type("audio", file.content_type)
+    if error:
+        return error
+    return await _store_upload(
+        db, current_user, "audio", iter_upload_file(file), file.filename, file.content_type, note_id
+    )
+
 
-    content = await file.read()
-    if len(content) > 50 * 1024 * 1024:  # 50MB
-        return invalid_params("音频大小不能超过50MB")
+@router.post("/video")
+async def upload_video(
+    file: UploadFile = File(...),
+    note_id: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """上传视频"""
+    error = _check_type("video", file.content_type)
+    if error:
+        return error
+    return await _store_upload(
+        db, current_user, "video", iter_upload_file(file), file.filename, file.content_type, note_id
+    )
 
-    ext = file.filename.split(".")[-1] if "." in file.filename else "mp3"
-    file_name = f"audio/{datetime.now().strftime('%Y/%m/%d')}/{uuid.uuid4()}.{ext}"
 
+def _content_length(request: Request) -> Optional[int]:
     try:
-        url = await upload_to_cos(content, file_name, file.content_type)
-    except Exception as e:
-        return server_error(f"上传失败: {str(e)}")
+        return int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+
+@router.post("/stream")
+async def upload_stream(
+    request: Request,
+    type: str = Query(..., description="image, audio, video"),
+    file_name: str = Query(..., min_length=1, max_length=255),
+    note_id: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """流式上传：请求体为文件原始内容，Content-Type 为文件的 MIME 类型"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    error = _check_type(type, content_type)
+    if error:
+        return error
+    # 声明的长度已超限时不读取请求体
+    length = _content_length(request)
+    if length is not None and length > UPLOAD_TYPES[type]["max_size"]:
+        return _too_large(type)
+    return await _store_upload(
+        db, current_user, type, request.stream(), file_name, content_type, note_id
+    )
+
+
+@router.post("/instant")
+async def instant_upload(
+    data: UploadInstant,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """秒传：上传前先提交文件的 SHA-256，命中时直接返回附件，未命中（hit=false）再正常上传"""
+    error = _check_type(data.type, data.mime_type)
+    if error:
+        return error
+    key = await reuse_blob(db, current_user.id, data.sha256, data.file_size, data.mime_type)
+    if key is None:
+        return success({"hit": False})
 
     attachment = Attachment(
-        note_id=note_id,
+        note_id=data.note_id,
         user_id=current_user.id,
-        type="audio",
-        file_name=file.filename,
-        file_size=len(content),
-        mime_type=file.content_type,
-        url=url,
+        type=data.type,
+        file_name=data.file_name,
+        file_size=data.file_size,
+        mime_type=data.mime_type,
+        url=object_url(key),
+        blob_sha256=data.sha256,
     )
     db.add(attachment)
+    await enqueue_media_job(db, attachment)
     await db.commit()
     await db.refresh(attachment)
+    media_job_worker.notify()
 
     return success({
+        "hit": True,
         "id": attachment.id,
-        "url": url,
-        "file_name": file.filename,
-        "file_size": len(content),
+        "url": attachment.url,
+        "file_name": data.file_name,
+        "file_size": data.file_size,
+        "sha256": data.sha256,
     })
 
 
-@router.post("/video")
-async def upload_video(
-    file: UploadFile = File(...),
-    note_id: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+# ---------- 可续传的分片上传 ----------
+
+async def _get_session(
+    db: AsyncSession, session_id: str, current_user: User, for_update: bool = False
 ):
-    """上传视频"""
-    if file.content_type not in ALLOWED_VIDEO_TYPES:
-        return invalid_params("不支持的视频格式")
+    """读取上传会话，返回 (会话, 错误响应)"""
+    query = select(UploadSession).where(UploadSession.id == session_id)
+    if for_update:
+        query = query.with_for_update()
+    result = await db.execute(query)
+    upload = result.scalar_one_or_none()
+    if not upload:
+        return None, not_found("上传会话不存在")
+    if upload.user_id != current_user.id:
+        return None, forbidden("无权限操作")
+    return upload, None
+
 
-    content = await file.read()
-    if len(content) > 200 * 1024 * 1024:  # 200MB
-        return invalid_params("视频大小不能超过200MB")
+async def _create_session(
+    db: AsyncSession, data: UploadSessionCreate, current_user: User, direct: bool = False
+):
+    """校验并创建上传会话，返回 (会话, 错误响应)
 
-    ext = file.filename.split(".")[-1] if "." in file.filename else "mp4"
-    file_name = f"video/{datetime.now().strftime('%Y/%m/%d')}/{uuid.uuid4()}.{ext}"
+    直传且不超过一个分片的文件使用单次 PUT，不创建分片上传。
+    """
+    error = _check_type(data.type, data.mime_type)
+    if error:
+        return None, error
+    if data.file_size > UPLOAD_TYPES[data.type]["max_size"]:
+        return None, _too_large(data.type)
+
+    part_size = max(settings.UPLOAD_PART_SIZE, -(-data.file_size // MAX_PARTS))
+    key = _object_key(data.type, data.file_name)
+    upload_id = None
+    if direct and data.file_size <= part_size:
+        part_size = data.file_size
+    else:
+        try:
+            upload_id = await get_storage().create_multipart(key, data.mime_type)
+        except Exception as e:
+            return None, server_error(f"创建上传失败: {str(e)}")
+
+    upload = UploadSession(
+        user_id=current_user.id,
+        note_id=data.note_id,
+        type=data.type,
+        file_name=data.file_name,
+        mime_type=data.mime_type,
+        file_size=data.file_size,
+        part_size=part_size,
+        object_key=key,
+        upload_id=upload_id,
+        direct=direct,
+        parts={},
+        expires_at=datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS),
+    )
+    db.add(upload)
+    await db.commit()
+    await db.refresh(upload)
+    return upload, None
 
-    try:
-        url = await upload_to_cos(content, file_name, file.content_type)
-    except Exception as e:
-        return server_error(f"上传失败: {str(e)}")
 
+async def _finish_session(db: AsyncSession, upload: UploadSession, current_user: User) -> dict:
+    """合并分片、校验对象并创建附件（调用方已锁定会话）"""
+    storage = get_storage()
+    parts = upload.parts or {}
+    if upload.status == "completed":
+        # 重复提交时返回已创建的附件
+        return success({
+            "id": upload.attachment_id,
+            "url": object_url(upload.object_key),
+            "file_name": upload.file_name,
+            "file_size": upload.file_size,
+            "sha256": composite_sha256(parts) if parts else None,
+        })
+    if upload.status != "uploading":
+        return invalid_params("上传会话已结束")
+
+    if upload.direct and upload.upload_id:
+        # 分片由客户端直接上传，以对象存储中的记录为准
+        try:
+            listed = await storage.list_parts(upload.object_key, upload.upload_id)
+        except Exception as e:
+            return server_error(f"查询分片失败: {str(e)}")
+        uploaded = {number: (etag, size) for number, etag, size in listed}
+        missing = [n for n in range(1, upload.part_count + 1) if n not in uploaded]
+        if missing:
+            return invalid_params(f"还有 {len(missing)} 个分片未上传: {missing[:20]}")
+        wrong = [n for n in range(1, upload.part_count + 1)
+                 if uploaded[n][1] != upload.expected_part_size(n)]
+        if wrong:
+            return invalid_params(f"分片大小不正确，请重新上传: {wrong[:20]}")
+        etags = [(n, uploaded[n][0]) for n in range(1, upload.part_count + 1)]
+    elif upload.upload_id:
+        missing = [n for n in range(1, upload.part_count + 1) if str(n) not in parts]
+        if missing:
+            return invalid_params(f"还有 {len(missing)} 个分片未上传: {missing[:20]}")
+        etags = [(n, parts[str(n)]["etag"]) for n in range(1, upload.part_count + 1)]
+
+    if upload.upload_id:
+        try:
+            await storage.complete_multipart(upload.object_key, upload.upload_id, etags)
+        except Exception as e:
+            return server_error(f"合并分片失败: {str(e)}")
+
+    if upload.direct:
+        try:
+            head = await storage.head(upload.object_key)
+        except Exception as e:
+            return server_error(f"查询文件失败: {str(e)}")
+        if head is None:
+            return invalid_params("文件尚未上传")
+        content_type = (head["content_type"] or upload.mime_type).split(";")[0].strip()
+        if head["size"] != upload.file_size or content_type != upload.mime_type:
+            # 与创建会话时声明的不一致（可能绕过了大小 / 类型限制），删除对象
+            await storage.delete(upload.object_key)
+            upload.status = "aborted"
+            await db.commit()
+            return invalid_params("上传的文件与声明的大小或类型不一致")
+
+    url = object_url(upload.object_key)
     attachment = Attachment(
-        note_id=note_id,
+        note_id=upload.note_id,
         user_id=current_user.id,
-        type="video",
-        file_name=file.filename,
-        file_size=len(content),
-        mime_type=file.content_type,
+        type=upload.type,
+        file_name=upload.file_name,
+        file_size=upload.file_size,
+        mime_type=upload.mime_type,
         url=url,
     )
     db.add(attachment)
+    await enqueue_media_job(db, attachment)
+    upload.status = "completed"
+    upload.attachment_id = attachment.id
     await db.commit()
-    await db.refresh(attachment)
+    media_job_worker.notify()
 
     return success({
         "id": attachment.id,
         "url": url,
-        "file_name": file.filename,
-        "file_size": len(content),
+        "file_name": upload.file_name,
+        "file_size": upload.file_size,
+        "sha256": composite_sha256(parts) if parts else None,
     })
+
+
+@router.post("/sessions")
+async def create_upload_session(
+    data: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """创建可续传上传会话，返回分片大小与分片数"""
+    upload, error = await _create_session(db, data, current_user)
+    if error:
+        return error
+    return success(upload.to_dict())
+
+
+@router.get("/sessions/{session_id}")
+async def get_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """查询上传会话（续传时据此跳过已上传的分片）"""
+    upload, error = await _get_session(db, session_id, current_user)
+    if error:
+        return error
+    return success(upload.to_dict())
+
+
+@router.put("/sessions/{session_id}/parts/{part_number}")
+async def upload_session_part(
+    session_id: str,
+    part_number: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """上传一个分片（请求体为分片原始内容，可重传；可用 X-Content-SHA256 头校验）"""
+    upload, error = await _get_session(db, session_id, current_user)
+    if error:
+        return error
+    if upload.status != "uploading" or upload.expires_at < datetime.utcnow():
+        return invalid_params("上传会话已结束或已过期")
+    if upload.direct:
+        return invalid_params("直传会话请使用预签名 URL 上传")
+    if not 1 <= part_number <= upload.part_count:
+        return invalid_params(f"分片号应在 1 到 {upload.part_count} 之间")
+
+    expected = upload.expected_part_size(part_number)
+    length = _content_length(request)
+    if length is not None and length != expected:
+        return invalid_params(f"分片 {part_number} 应为 {expected} 字节")
+    # 读取与上传分片期间不占用数据库事务
+    await db.commit()
+
+    try:
+        data = await read_limited(request.stream(), expected)
+    except UploadTooLarge:
+        return invalid_params(f"分片 {part_number} 应为 {expected} 字节")
+    if len(data) != expected:
+        return invalid_params(f"分片 {part_number} 应为 {expected} 字节")
+    digest = await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+    claimed = request.headers.get("x-content-sha256")
+    if claimed and claimed.lower() != digest:
+        return invalid_params("分片校验和不一致")
+
+    try:
+        etag = await get_storage().upload_part(
+            upload.object_key, upload.upload_id, part_number, data
+        )
+    except Exception as e:
+        return server_error(f"分片上传失败: {str(e)}")
+
+    # 并行上传的分片各自加锁合并，避免互相覆盖
+    upload, error = await _get_session(db, session_id, current_user, for_update=True)
+    if error:
+        return error
+    parts = dict(upload.parts or {})
+    parts[str(part_number)] = {"etag": etag, "size": len(data), "sha256": digest}
+    upload.parts = parts
+    await db.commit()
+
+    return success({"part_number": part_number, "size": len(data), "sha256": digest})
+
+
+@router.post("/sessions/{session_id}/complete")
+async def complete_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """所有分片上传完成后合并为文件并创建附件"""
+    upload, error = await _get_session(db, session_id, current_user, for_update=True)
+    if error:
+        return error
+    return await _finish_session(db, upload, current_user)
+
+
+@router.delete("/sessions/{session_id}")
+async def abort_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """放弃上传，释放已上传的分片"""
+    upload, error = await _get_session(db, session_id, current_user, for_update=True)
+    if error:
+        return error
+    if upload.status != "uploading":
+        return invalid_params("上传会话已结束")
+    await release_session_storage(upload)
+    upload.status = "aborted"
+    await db.commit()
+    return success({"message": "已取消上传", "id": session_id})
+
+
+# ---------- 直传对象存储 ----------
+
+def _presign(upload: UploadSession, skip: frozenset = frozenset()) -> dict:
+    """生成会话的预签名上传信息（跳过 skip 中已上传的分片）"""
+    storage = get_storage()
+    expires = settings.UPLOAD_PRESIGN_EXPIRES
+    info = {**upload.to_dict(), "method": "PUT", "expires_in": expires}
+    if upload.upload_id is None:
+        info["url"] = storage.presign_put(upload.object_key, expires, content_type=upload.mime_type)
+        info["headers"] = {"Content-Type": upload.mime_type}
+        return info
+    info["uploaded_parts"] = sorted(skip)
+    info["parts"] = [
+        {
+            "part_number": n,
+            "size": upload.expected_part_size(n),
+            "url": storage.presign_put(
+                upload.object_key, expires, upload_id=upload.upload_id, part_number=n
+            ),
+        }
+        for n in range(1, upload.part_count + 1)
+        if n not in skip
+    ]
+    return info
+
+
+@router.post("/presign")
+async def presign_upload(
+    data: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """申请直传：返回预签名 PUT URL（大文件为各分片的 URL），上传后调用 /upload/complete"""
+    if not get_storage().enabled:
+        return server_error("对象存储未配置，无法直传")
+    upload, error = await _create_session(db, data, current_user, direct=True)
+    if error:
+        return error
+    return success(_presign(upload))
+
+
+@router.post("/presign/{session_id}")
+async def renew_presigned_upload(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """重新签发直传 URL（URL 过期或续传时使用，已上传的分片不再返回）"""
+    upload, error = await _get_session(db, session_id, current_user)
+    if error:
+        return error
+    if not upload.direct:
+        return invalid_params("不是直传会话")
+    if upload.status != "uploading" or upload.expires_at < datetime.utcnow():
+        return invalid_params("上传会话已结束或已过期")
+    uploaded = frozenset()
+    if upload.upload_id:
+        try:
+            listed = await get_storage().list_parts(upload.object_key, upload.upload_id)
+        except Exception as e:
+            return server_error(f"查询分片失败: {str(e)}")
+        uploaded = frozenset(n for n, _, size in listed if size == upload.expected_part_size(n))
+    return success(_presign(upload, uploaded))
+
+
+@router.post("/complete")
+async def complete_direct_upload(
+    data: UploadComplete,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """直传完成：校验对象存储中的文件后创建附件"""
+    upload, error = await _get_session(db, data.session_id, current_user, for_update=True)
+    if error:
+        return error
+    if not upload.direct:
+        return invalid_params("不是直传会话")
+    return await _finish_session(db, upload, current_user)
+
+
+@router.put("/local/{key:path}")
+async def local_presigned_put(
+    key: str,
+    request: Request,
+    expires: int = Query(...),
+    signature: str = Query(...),
+    upload_id: Optional[str] = Query(None),
+    part_number: Optional[int] = Query(None),
+):
+    """local 存储后端接收预签名上传（对象存储直传的替身，仅开发 / 测试）"""
+    storage = get_storage()
+    if storage.name != "local":
+        return not_found("接口不存在")
+    # 与对象存储一致：整体上传时 Content-Type 参与签名，分片上传时不参与
+    content_type = None if upload_id else request.headers.get("content-type", "")
+    if not storage.verify_presigned(key, expires, signature, content_type, upload_id, part_number):
+        return forbidden("签名无效或已过期")
+    try:
+        data = await read_limited(request.stream(), MAX_UPLOAD_SIZE)
+        if upload_id:
+            etag = await storage.upload_part(key, upload_id, part_number, data)
+        else:
+            await storage.put(key, data, content_type)
+            etag = hashlib.md5(data).hexdigest()
+    except UploadTooLarge:
+        return invalid_params("文件过大")
+    except ValueError as e:
+        return invalid_params(str(e))
+    return success({"etag": etag, "size": len(data)})
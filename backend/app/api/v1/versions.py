@@ -1,22 +1,41 @@
 """版本历史相关 API"""
 
-import difflib
+import asyncio
+from typing import Optional
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core import get_db, get_current_user, success, success_with_pagination, not_found, forbidden, invalid_params
+from app.core import (
+    get_db,
+    get_current_user,
+    success,
+    success_with_pagination,
+    not_found,
+    forbidden,
+    invalid_params,
+    settings,
+)
+from app.core.pagination import Keyset, InvalidCursor, paginate_keyset, count_cache
 from app.models import User, Note, NoteVersion
+from app.services.diff import compact_changes, diff_snapshots
+from app.services.version_store import build_version_snapshot, with_keyframe
 
 router = APIRouter(prefix="/notes", tags=["版本历史"])
 
 
+# 按版本号倒序，id 保证顺序稳定
+VERSION_LIST_KEYSET = Keyset((NoteVersion.version, True), (NoteVersion.id, True))
+
+
 @router.get("/{note_id}/versions")
 async def list_note_versions(
     note_id: str,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，优先于 page"),
+    include_total: bool = Query(True, description="是否返回总数（短期缓存）"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -34,33 +53,62 @@ async def list_note_versions(
     query = select(NoteVersion).where(NoteVersion.note_id == note_id)
     
     # 总数
-    count_query = select(func.count()).select_from(query.subquery())
-    total_result = await db.execute(count_query)
-    total = total_result.scalar() or 0
+    total = None
+    if include_total:
+        total = await count_cache.get_or_count(
+            db, current_user.id, f"versions:{note_id}", query
+        )
     
     # 分页
-    query = query.order_by(NoteVersion.version.desc())
-    query = query.offset((page - 1) * page_size).limit(page_size)
-    
-    result = await db.execute(query)
-    versions = result.scalars().all()
+    try:
+        versions, next_cursor = await paginate_keyset(
+            db, query, VERSION_LIST_KEYSET, page, page_size, cursor
+        )
+    except InvalidCursor as e:
+        return invalid_params(str(e))
     
     return success_with_pagination(
         data=[v.to_dict() for v in versions],
         total=total,
         page=page,
         page_size=page_size,
+        next_cursor=next_cursor,
     )
 
 
-@router.get("/{note_id}/versions/{version_id}")
-async def get_note_version(
+def _version_body(version: NoteVersion, include_bodies: bool) -> dict:
+    return version.to_dict_full() if include_bodies else version.to_dict()
+
+
+def _shape_diff(result: dict, include_bodies: bool) -> dict:
+    """不返回正文时折叠较长的相同片段"""
+    if include_bodies:
+        return dict(result)
+    context = settings.DIFF_CONTEXT_CHARS
+    shaped = dict(result)
+    shaped["changes"] = compact_changes(result["changes"], context)
+    shaped["blocks"] = [
+        {**block, "changes": compact_changes(block["changes"], context)}
+        if "changes" in block else block
+        for block in result["blocks"]
+    ]
+    return shaped
+
+
+# 注意：需在 /{note_id}/versions/{version_id} 之前注册，否则 compare 会被当作版本 ID
+@router.get("/{note_id}/versions/compare")
+async def compare_versions(
     note_id: str,
-    version_id: str,
+    version1_id: str = Query(..., description="版本1 ID"),
+    version2_id: str = Query(..., description="版本2 ID"),
+    granularity: str = Query(
+        "word", pattern="^(word|char|line)$", description="差异粒度：word / char / line"
+    ),
+    include_bodies: bool = Query(True, description="是否返回两个版本的完整内容"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """获取某个版本的详细内容"""
+    """比较两个版本的差异"""
     # 验证笔记权限
     result = await db.execute(select(Note).where(Note.id == note_id))
     note = result.scalar_one_or_none()
@@ -70,99 +118,101 @@ async def get_note_version(
     if note.user_id != current_user.id:
         return forbidden("无权限访问")
     
-    # 获取版本
+    # 获取两个版本
     result = await db.execute(
-        select(NoteVersion).where(
-            NoteVersion.id == version_id,
+        with_keyframe(select(NoteVersion)).where(
+            NoteVersion.id.in_([version1_id, version2_id]),
             NoteVersion.note_id == note_id
         )
     )
-    version = result.scalar_one_or_none()
+    versions = {v.id: v for v in result.scalars().all()}
+    v1 = versions.get(version1_id)
+    v2 = versions.get(version2_id)
     
-    if not version:
+    if not v1 or not v2:
         return not_found("版本不存在")
     
-    return success(version.to_dict_full())
+    # 差异计算较耗 CPU，放到线程中执行；版本内容不可变，按版本 ID 缓存
+    diff = await asyncio.to_thread(
+        diff_snapshots,
+        (v1.id, v2.id),
+        v1.snapshot(),
+        v2.snapshot(),
+        f"v{v1.version}",
+        f"v{v2.version}",
+        granularity,
+    )
+    
+    differences = _shape_diff(diff, include_bodies)
+    differences["version1"] = _version_body(v1, include_bodies)
+    differences["version2"] = _version_body(v2, include_bodies)
+    
+    return success(differences)
 
 
-@router.post("/{note_id}/versions/{version_id}/restore")
-async def restore_note_version(
+@router.get("/{note_id}/versions/{version_id}/diff")
+async def diff_with_current(
     note_id: str,
     version_id: str,
+    granularity: str = Query(
+        "word", pattern="^(word|char|line)$", description="差异粒度：word / char / line"
+    ),
+    include_bodies: bool = Query(True, description="是否返回历史版本的完整内容"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """恢复到某个历史版本"""
-    # 验证笔记权限
+    """对比某个历史版本与当前版本的差异"""
+    # 验证笔记
     result = await db.execute(select(Note).where(Note.id == note_id))
     note = result.scalar_one_or_none()
-    
+
     if not note:
         return not_found("笔记不存在")
     if note.user_id != current_user.id:
         return forbidden("无权限访问")
-    
+
     # 获取目标版本
     result = await db.execute(
-        select(NoteVersion).where(
+        with_keyframe(select(NoteVersion)).where(
             NoteVersion.id == version_id,
             NoteVersion.note_id == note_id
         )
     )
-    target_version = result.scalar_one_or_none()
-    
-    if not target_version:
+    target = result.scalar_one_or_none()
+
+    if not target:
         return not_found("版本不存在")
-    
-    # 先保存当前版本到历史
-    current_snapshot = NoteVersion(
-        note_id=note.id,
-        version=note.version,
-        title=note.title,
-        content=note.content,
-        json_content=note.json_content,
-        change_type="update",
-        change_summary="恢复前的版本",
-    )
-    db.add(current_snapshot)
-    
-    # 恢复笔记内容
-    note.title = target_version.title
-    note.content = target_version.content
-    note.json_content = target_version.json_content
-    # version 会自动递增（通过触发器）
-    
-    await db.commit()
-    await db.refresh(note)
-    
-    # 保存恢复操作记录
-    restore_record = NoteVersion(
-        note_id=note.id,
-        version=note.version,
-        title=note.title,
-        content=note.content,
-        json_content=note.json_content,
-        change_type="restore",
-        change_summary=f"从版本 {target_version.version} 恢复",
+
+    current = {
+        "title": note.title,
+        "content": note.content,
+        "json_content": note.json_content,
+    }
+    # 当前内容随版本号变化，缓存键带上笔记的版本号
+    diff = await asyncio.to_thread(
+        diff_snapshots,
+        (target.id, f"{note.id}@{note.version}"),
+        target.snapshot(),
+        current,
+        f"v{target.version}",
+        f"current(v{note.version})",
+        granularity,
     )
-    db.add(restore_record)
-    await db.commit()
-    
-    return success({
-        "message": f"已恢复到版本 {target_version.version}",
-        "note": note.to_dict(),
-    })
 
+    data = _shape_diff(diff, include_bodies)
+    data["version"] = _version_body(target, include_bodies)
+    data["current_version"] = note.version
+    return success(data)
 
-@router.get("/{note_id}/versions/compare")
-async def compare_versions(
+
+@router.get("/{note_id}/versions/{version_id}")
+async def get_note_version(
     note_id: str,
-    version1_id: str = Query(..., description="版本1 ID"),
-    version2_id: str = Query(..., description="版本2 ID"),
+    version_id: str,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """比较两个版本的差异"""
+    """获取某个版本的详细内容"""
     # 验证笔记权限
     result = await db.execute(select(Note).where(Note.id == note_id))
     note = result.scalar_one_or_none()
@@ -172,94 +222,76 @@ async def compare_versions(
     if note.user_id != current_user.id:
         return forbidden("无权限访问")
     
-    # 获取版本1
-    result = await db.execute(
-        select(NoteVersion).where(
-            NoteVersion.id == version1_id,
-            NoteVersion.note_id == note_id
-        )
-    )
-    v1 = result.scalar_one_or_none()
-    
-    # 获取版本2
+    # 获取版本
     result = await db.execute(
-        select(NoteVersion).where(
-            NoteVersion.id == version2_id,
+        with_keyframe(select(NoteVersion)).where(
+            NoteVersion.id == version_id,
             NoteVersion.note_id == note_id
         )
     )
-    v2 = result.scalar_one_or_none()
+    version = result.scalar_one_or_none()
     
-    if not v1 or not v2:
+    if not version:
         return not_found("版本不存在")
     
-    content1 = v1.content or ""
-    content2 = v2.content or ""
-    diff_lines = list(
-        difflib.unified_diff(
-            content1.splitlines(),
-            content2.splitlines(),
-            fromfile=f"v{v1.version}",
-            tofile=f"v{v2.version}",
-            lineterm="",
-        )
-    )
-
-    differences = {
-        "title_changed": v1.title != v2.title,
-        "content_changed": v1.content != v2.content,
-        "version1": v1.to_dict_full(),
-        "version2": v2.to_dict_full(),
-        "diff": diff_lines,
-    }
-    
-    return success(differences)
+    return success(version.to_dict_full())
 
 
-@router.get("/{note_id}/versions/{version_id}/diff")
-async def diff_with_current(
+@router.post("/{note_id}/versions/{version_id}/restore")
+async def restore_note_version(
     note_id: str,
     version_id: str,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """对比某个历史版本与当前版本的差异"""
-    # 验证笔记
+    """恢复到某个历史版本"""
+    # 验证笔记权限
     result = await db.execute(select(Note).where(Note.id == note_id))
     note = result.scalar_one_or_none()
-
+    
     if not note:
         return not_found("笔记不存在")
     if note.user_id != current_user.id:
         return forbidden("无权限访问")
-
+    
     # 获取目标版本
     result = await db.execute(
-        select(NoteVersion).where(
+        with_keyframe(select(NoteVersion)).where(
             NoteVersion.id == version_id,
             NoteVersion.note_id == note_id
         )
     )
-    target = result.scalar_one_or_none()
-
-    if not target:
+    target_version = result.scalar_one_or_none()
+    
+    if not target_version:
         return not_found("版本不存在")
-
-    content_old = target.content or ""
-    content_new = note.content or ""
-
-    diff_lines = list(
-        difflib.unified_diff(
-            content_old.splitlines(),
-            content_new.splitlines(),
-            fromfile=f"v{target.version}",
-            tofile=f"current(v{note.version})",
-            lineterm="",
-        )
+    
+    # 先保存当前版本到历史
+    current_snapshot = await build_version_snapshot(
+        db, note, "update", "恢复前的版本", restore_point=True
     )
-
+    db.add(current_snapshot)
+    
+    # 恢复笔记内容
+    target = target_version.snapshot()
+    note.title = target["title"]
+    note.content = target["content"]
+    note.json_content = target["json_content"]
+    # 与更新接口一致手动递增版本号：客户端乐观锁与 diff 缓存键都依赖它
+    note.version += 1
+    
+    await db.commit()
+    await db.refresh(note)
+    
+    # 保存恢复操作记录
+    restore_record = await build_version_snapshot(
+        db, note, "restore", f"从版本 {target_version.version} 恢复", restore_point=True
+    )
+    db.add(restore_record)
+    await db.commit()
+    count_cache.invalidate(current_user.id)
+    
     return success({
-        "version": target.to_dict_full(),
-        "current_version": note.version,
-        "diff": diff_lines,
+        "message": f"已恢复到版本 {target_version.version}",
+        "note": note.to_dict(),
     })
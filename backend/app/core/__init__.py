@@ -11,6 +11,7 @@ from app.core.response import (
     forbidden,
     not_found,
     version_conflict,
+    too_many_requests,
     server_error,
 )
 from app.core.security import (
@@ -33,6 +34,7 @@ __all__ = [
     "forbidden",
     "not_found",
     "version_conflict",
+    "too_many_requests",
     "server_error",
     "verify_password",
     "hash_password",
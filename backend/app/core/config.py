@@ -21,6 +21,7 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_SOCKET_TIMEOUT: float = 0.5  # Redis 连接/读写超时（秒），超时即降级
 
     # JWT
     JWT_SECRET: str = "your-jwt-secret-change-in-production"
@@ -38,6 +39,50 @@ class Settings(BaseSettings):
     COS_BUCKET: Optional[str] = None
     COS_REGION: str = "ap-guangzhou"
 
+    # 对象存储
+    STORAGE_BACKEND: str = "cos"                             # cos, local（本地目录，开发 / 测试用）
+    STORAGE_LOCAL_ROOT: str = "./storage"                    # local 后端的存储目录
+    # local 后端的访问 URL 前缀（应用挂载在 /media）
+    STORAGE_LOCAL_URL: str = "http://localhost:8000/media/"
+    # local 后端接收预签名上传的 URL 前缀（即 /upload/local 接口）
+    STORAGE_LOCAL_UPLOAD_URL: str = "http://localhost:8000/api/v1/upload/local/"
+    STORAGE_DELETE_CONCURRENCY: int = 8                      # 批量删除对象时同时进行的请求数
+    STORAGE_GC_INTERVAL_HOURS: int = 24                      # 孤立附件清理任务的执行间隔
+    # 未关联笔记的附件保留多久后才视为孤立（给新建笔记留出关联时间）
+    STORAGE_GC_GRACE_HOURS: int = 24
+    STORAGE_GC_BATCH_SIZE: int = 200                         # 每批检查的附件数
+
+    # 上传
+    UPLOAD_READ_CHUNK_SIZE: int = 1024 * 1024      # 流式读取请求体的块大小
+    UPLOAD_PART_SIZE: int = 8 * 1024 * 1024        # 分片大小（超过一个分片的文件使用分片上传）
+    # 单个上传同时进行的分片数（内存约为 (该值 + 1) 个分片）
+    UPLOAD_PART_CONCURRENCY: int = 3
+    UPLOAD_SESSION_TTL_HOURS: int = 24             # 可续传上传会话的有效期
+    UPLOAD_PRESIGN_EXPIRES: int = 3600             # 直传预签名 URL 的有效期（秒）
+
+    # 媒体后处理（缩略图与元数据）
+    MEDIA_WORKERS: int = 2                                # 处理进程数（同时处理的附件数）
+    MEDIA_WORKER_MAX_TASKS: int = 50                      # 处理进程处理多少个附件后重启，0 为不重启
+    MEDIA_THUMBNAIL_SIZES: list[int] = [256, 1024, 2048]  # 生成的 WebP 缩略图最长边（像素），不放大
+    MEDIA_WEBP_QUALITY: int = 80                          # WebP 压缩质量
+    MEDIA_PROBE_TIMEOUT: int = 120                        # ffprobe / ffmpeg 的超时（秒）
+    MEDIA_JOB_MAX_ATTEMPTS: int = 3                       # 连续失败多少次后放弃
+    MEDIA_JOB_RETRY_BASE_SECONDS: int = 30                # 重试退避基数（指数增长）
+    MEDIA_JOB_LEASE_SECONDS: int = 600                    # 任务租约，超时未完成视为 worker 已崩溃
+    MEDIA_JOB_POLL_SECONDS: int = 30                      # 空闲时轮询间隔
+
+    # 语音识别任务（腾讯云录音文件识别）
+    ASR_ENGINE_MODEL: str = "16k_zh"         # 识别引擎
+    ASR_POLL_BATCH_SIZE: int = 100           # 每轮最多提交 / 查询的任务数
+    ASR_POLL_CONCURRENCY: int = 5            # 同时进行的腾讯云请求数（受接口 QPS 限制）
+    ASR_POLL_MIN_SECONDS: float = 2          # 查询间隔下限
+    ASR_POLL_MAX_SECONDS: float = 60         # 查询间隔上限（未完成的任务间隔逐次翻倍直到上限）
+    ASR_DURATION_FACTOR: float = 0.2         # 识别耗时约为音频时长的倍数，用于估计首次查询时间
+    ASR_IDLE_SECONDS: float = 30             # 没有待查询任务时的检查间隔
+    ASR_MAX_ATTEMPTS: int = 5                # 调用连续失败多少次后放弃
+    ASR_TASK_TIMEOUT_HOURS: int = 6          # 超过该时长仍未完成的任务标记为失败
+    ASR_SSE_CHECK_SECONDS: float = 5         # SSE 连接重新读取任务状态的间隔（轮询器在其他实例时）
+
     # DeepSeek AI
     DEEPSEEK_API_KEY: Optional[str] = None
     DEEPSEEK_BASE_URL: str = "https://api.deepseek.com/v1"
@@ -48,20 +93,101 @@ class Settings(BaseSettings):
     OPENAI_BASE_URL: str = "https://api.openai.com/v1"
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
     OPENAI_EMBEDDING_DIMENSIONS: int = 1536
+
+    # 出站 HTTP 连接池（AI 服务调用共享）
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100           # 每个上游最大连接数
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20  # 每个上游保持的空闲连接数
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0       # 空闲连接保持时间（秒）
+    HTTP_CONNECT_TIMEOUT: float = 5.0         # 建立连接超时（秒）
+    HTTP_TIMEOUT: float = 60.0                # 默认读写超时（秒）
+    HTTP_CONNECT_RETRIES: int = 1             # 连接失败重试次数
     
     # ADP 工作流配置
     ADP_BOT_APP_KEY: str = "xQMrffLKSowUZBGLRFWAikQaNTZmxzuaYjCRqnyQsmCGrnGvhGwUsmvttBFXwOdtqVRJVNrsgItdsMnRuHFILGlnGgPlMRAqiddmxCWaUdCVEYejOWJBZwVXRbEYdTmN"
     ADP_BASE_URL: str = "https://wss.lke.cloud.tencent.com/v1/qbot/chat/sse"
     ADP_DEFAULT_MODEL: str = "lke-deepseek-v3"
 
+    # Embedding 微批处理（跨调用方合并请求，受服务商单次请求上限约束）
+    EMBEDDING_BATCH_WINDOW_MS: int = 20       # 收集窗口（毫秒）
+    EMBEDDING_BATCH_MAX_INPUTS: int = 512     # 单次请求最大输入条数
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000  # 单次请求 token 预算
+    EMBEDDING_BATCH_MAX_CONCURRENCY: int = 4  # 同时进行的请求数
+
+    # 后台嵌入任务
+    EMBED_JOB_WORKERS: int = 2               # 并发 worker 数
+    EMBED_JOB_PAGE_SIZE: int = 50            # 每批处理的笔记数（每批提交一次检查点）
+    EMBED_JOB_MAX_ATTEMPTS: int = 5          # 连续失败多少次后放弃
+    EMBED_JOB_RETRY_BASE_SECONDS: int = 5    # 重试退避基数（指数增长）
+    EMBED_JOB_LEASE_SECONDS: int = 300       # 任务租约，超时未续约视为 worker 已崩溃
+    EMBED_JOB_POLL_SECONDS: int = 10         # 空闲时轮询间隔
+
+    # 向量索引（pgvector）
+    VECTOR_INDEX_TYPE: str = "hnsw"        # hnsw, ivfflat, none
+    VECTOR_HNSW_M: int = 16                # HNSW 每层最大连接数
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 64  # HNSW 建索引时的候选集大小
+    VECTOR_HNSW_EF_SEARCH: int = 40        # HNSW 查询默认候选集大小（越大召回越高、越慢）
+    VECTOR_IVFFLAT_LISTS: int = 100        # IVFFlat 聚类中心数（建议约为 行数/1000）
+    VECTOR_IVFFLAT_PROBES: int = 10        # IVFFlat 查询默认探测的聚类数
+    VECTOR_ITERATIVE_SCAN: str = "relaxed_order"  # 过滤查询的迭代扫描（需 pgvector>=0.8），off 关闭
+
+    # 查询向量缓存
+    EMBEDDING_CACHE_SIZE: int = 2048                # 进程内 LRU 最大条目数
+    EMBEDDING_CACHE_TTL_SECONDS: int = 3600         # 进程内缓存过期时间（秒）
+    EMBEDDING_CACHE_REDIS_ENABLED: bool = True      # 是否启用 Redis 二级缓存
+    EMBEDDING_CACHE_REDIS_TTL_SECONDS: int = 86400  # Redis 缓存过期时间（秒）
+
     # RAG 配置
     RAG_CHUNK_SIZE: int = 500      # 文本分块大小
     RAG_CHUNK_OVERLAP: int = 50    # 分块重叠字符数
     RAG_TOP_K: int = 5             # 语义搜索返回数量
 
+    # 全文检索 / 混合检索
+    SEARCH_MAX_INDEX_CHARS: int = 100000  # 单篇笔记参与全文索引的最大字符数
+    SEARCH_SNIPPET_LENGTH: int = 120      # 搜索结果摘要长度（字符）
+    HYBRID_CANDIDATES: int = 50           # 全文、向量两路各自召回的候选数
+    HYBRID_MAX_CANDIDATES: int = 500      # 翻页时每路召回候选数的上限（超出的页返回空结果）
+    HYBRID_RRF_K: int = 60                # RRF 融合常数（越大排名差异影响越小）
+
+    # 列表分页
+    PAGINATION_COUNT_CACHE_SECONDS: int = 30  # 列表总数缓存时间（秒），0 表示不缓存
+
+    # 批量操作
+    NOTES_BULK_MAX_ITEMS: int = 1000  # 单次批量操作的最大笔记数
+
+    # 导出
+    EXPORT_BATCH_SIZE: int = 200  # 批量导出时每批从数据库读取的笔记数
+    TIPTAP_RENDER_CACHE_SIZE: int = 1024  # 笔记渲染结果（文本 / Markdown / HTML）缓存条数
+
+    # PDF 导出
+    PDF_WORKERS: int = 2                  # PDF 渲染进程数（同时渲染的上限）
+    PDF_QUEUE_SIZE: int = 16              # 排队等待渲染的上限，超出时拒绝新的导出请求
+    PDF_WORKER_MAX_TASKS: int = 50        # 渲染进程处理多少个任务后重启，0 表示不重启
+    PDF_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 已渲染 PDF 的缓存总字节数
+    PDF_FETCH_TIMEOUT: int = 10           # 加载笔记中远程图片的超时（秒）
+    # 除对象存储外允许加载图片的 URL 前缀（如 CDN 域名 "https://cdn.example.com/"），其他地址一律拒绝
+    PDF_FETCH_ALLOWED_PREFIXES: list[str] = []
+
+    # 版本历史
+    VERSION_KEYFRAME_INTERVAL: int = 20   # 两个完整快照（关键帧）之间最多保存的增量版本数
+    VERSION_DELTA_MAX_RATIO: float = 0.5  # 增量超过完整内容的该比例时改存关键帧
+    # 距上次保存不超过该时长的修改合并为一个版本，0 表示只按会话合并
+    VERSION_COALESCE_WINDOW_SECONDS: int = 120
+    VERSION_COALESCE_MAX_SPAN_SECONDS: int = 1800  # 连续编辑最多合并该时长，超过后保存新版本
+    VERSION_COMPACTION_INTERVAL_HOURS: int = 6     # 旧版本压缩任务的执行间隔
+    VERSION_COMPACTION_HOURLY_AFTER_DAYS: int = 1  # 超过该天数的历史每小时保留一个
+    VERSION_COMPACTION_DAILY_AFTER_DAYS: int = 30  # 超过该天数的历史每天保留一个
+    VERSION_COMPACTION_BATCH_SIZE: int = 200       # 压缩任务每批处理的笔记数
+
+    # 版本差异
+    DIFF_MAX_EDITS: int = 2000            # 差异算法的编辑距离上限，超过时整体替换（限制最坏耗时）
+    DIFF_CACHE_SIZE: int = 256            # 差异结果缓存条数
+    DIFF_CONTEXT_CHARS: int = 40          # 不返回正文时，相同片段保留的首尾字符数
+
     # 回收站
     TRASH_RETENTION_DAYS: int = 30
     TRASH_CLEANUP_INTERVAL_HOURS: int = 24
+    TRASH_PURGE_BATCH_SIZE: int = 200  # 永久删除时每批（每个事务）处理的笔记数
     
     # CodeBuddy Agent SDK
     CODEBUDDY_CODE_PATH: str = "/Users/huyunfei/.nvm/versions/node/v20.19.4/bin/codebuddy"
@@ -1,5 +1,9 @@
 """数据库配置"""
 
+import hashlib
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
@@ -39,7 +43,102 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+@asynccontextmanager
+async def advisory_lock(name: str):
+    """PostgreSQL 会话级咨询锁（非阻塞），用于多副本间只允许一个实例执行的后台任务
+
+    在独立连接上持有锁直到退出上下文，yield 是否获得了锁。
+    """
+    key = int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "big", signed=True)
+    async with engine.connect() as conn:
+        # 自动提交：持锁期间不保持打开的事务
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = bool(await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+
+
+# 已有数据库的增量结构升级（create_all 不会修改已存在的表）
+# 每条语句必须幂等，按顺序在建表后执行
+SCHEMA_UPGRADES = [
+    "ALTER TABLE note_embeddings ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    # note_embeddings 冗余 user_id / note_deleted，并回填旧数据
+    "ALTER TABLE note_embeddings ADD COLUMN IF NOT EXISTS user_id VARCHAR(36) REFERENCES users(id)",
+    "ALTER TABLE note_embeddings ADD COLUMN IF NOT EXISTS note_deleted "
+    "BOOLEAN NOT NULL DEFAULT false",
+    "CREATE INDEX IF NOT EXISTS ix_note_embeddings_user_deleted "
+    "ON note_embeddings (user_id, note_deleted)",
+    "UPDATE note_embeddings ne SET user_id = n.user_id, note_deleted = (n.deleted_at IS NOT NULL) "
+    "FROM notes n WHERE ne.note_id = n.id AND ne.user_id IS NULL",
+    # notes 全文检索向量（旧数据由启动后的后台任务回填）
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector TSVECTOR",
+    "CREATE INDEX IF NOT EXISTS ix_notes_search_vector ON notes USING gin (search_vector)",
+    # keyset 分页的复合索引
+    "CREATE INDEX IF NOT EXISTS ix_notes_user_list "
+    "ON notes (user_id, is_pinned, updated_at, id) WHERE deleted_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_notes_user_trash "
+    "ON notes (user_id, deleted_at, id) WHERE deleted_at IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS ix_note_versions_note_version "
+    "ON note_versions (note_id, version, id)",
+    # 版本增量存储（旧版本均为完整快照，即关键帧）
+    "ALTER TABLE note_versions ADD COLUMN IF NOT EXISTS is_keyframe BOOLEAN NOT NULL DEFAULT true",
+    "ALTER TABLE note_versions ADD COLUMN IF NOT EXISTS keyframe_id VARCHAR(36) "
+    "REFERENCES note_versions(id)",
+    "ALTER TABLE note_versions ADD COLUMN IF NOT EXISTS delta JSONB",
+    "ALTER TABLE note_versions ADD COLUMN IF NOT EXISTS preview VARCHAR(210)",
+    "CREATE INDEX IF NOT EXISTS ix_note_versions_keyframe_id ON note_versions (keyframe_id)",
+    "CREATE INDEX IF NOT EXISTS ix_note_versions_note_keyframes "
+    "ON note_versions (note_id, version) WHERE is_keyframe",
+    # 版本合并与压缩
+    "ALTER TABLE note_versions ADD COLUMN IF NOT EXISTS session_id VARCHAR(64)",
+    "ALTER TABLE note_versions ADD COLUMN IF NOT EXISTS is_restore_point "
+    "BOOLEAN NOT NULL DEFAULT false",
+    "CREATE INDEX IF NOT EXISTS ix_note_versions_created_at ON note_versions (created_at)",
+    # 对象存储直传会话
+    "ALTER TABLE upload_sessions ADD COLUMN IF NOT EXISTS direct BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE upload_sessions ALTER COLUMN upload_id DROP NOT NULL",
+    # 附件按内容去重（blobs 表由 create_all 创建）
+    "ALTER TABLE attachments ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_attachments_blob_sha256 ON attachments (blob_sha256)",
+    # 任务租约令牌
+    "ALTER TABLE embedding_jobs ADD COLUMN IF NOT EXISTS locked_by VARCHAR(36)",
+    "ALTER TABLE media_jobs ADD COLUMN IF NOT EXISTS locked_by VARCHAR(36)",
+]
+
+
+def vector_index_statements() -> list[str]:
+    """note_embeddings 向量索引的 DDL（按 VECTOR_INDEX_TYPE 创建，并移除另一种索引）
+
+    注意：首次在大表上建索引会阻塞启动，数据量大时建议先离线建好同名索引。
+    """
+    hnsw = (
+        "CREATE INDEX IF NOT EXISTS ix_note_embeddings_embedding_hnsw "
+        "ON note_embeddings USING hnsw (embedding vector_cosine_ops) "
+        f"WITH (m = {int(settings.VECTOR_HNSW_M)}, "
+        f"ef_construction = {int(settings.VECTOR_HNSW_EF_CONSTRUCTION)})"
+    )
+    ivfflat = (
+        "CREATE INDEX IF NOT EXISTS ix_note_embeddings_embedding_ivfflat "
+        "ON note_embeddings USING ivfflat (embedding vector_cosine_ops) "
+        f"WITH (lists = {int(settings.VECTOR_IVFFLAT_LISTS)})"
+    )
+    drop_hnsw = "DROP INDEX IF EXISTS ix_note_embeddings_embedding_hnsw"
+    drop_ivfflat = "DROP INDEX IF EXISTS ix_note_embeddings_embedding_ivfflat"
+
+    if settings.VECTOR_INDEX_TYPE == "hnsw":
+        return [drop_ivfflat, hnsw]
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        return [drop_hnsw, ivfflat]
+    return [drop_hnsw, drop_ivfflat]
+
+
 async def init_db():
-    """初始化数据库（创建表）"""
+    """初始化数据库（创建表、执行结构升级并维护向量索引）"""
     async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES + vector_index_statements():
+            await conn.execute(text(statement))
@@ -0,0 +1,108 @@
+"""文本 / JSON 增量编解码
+
+文本按换行和中英文句末标点切分为片段，在片段序列上做差异比较；
+JSON 先序列化为紧凑文本，按对象 / 数组结束位置和句末标点切分后比较，应用增量后重新解析。
+
+增量操作列表中：
+- [start, end] 表示复制基准文本的 base[start:end]（字符偏移）
+- 字符串表示插入的新文本
+"""
+
+import json
+import re
+from difflib import SequenceMatcher
+from itertools import accumulate
+from typing import Any, List, Optional
+
+_TEXT_SEGMENT_RE = re.compile(r"[^\n。！？!?]*(?:[\n。！？!?]+|$)")
+_JSON_SEGMENT_RE = re.compile(r"[^}\]。！？!?]*(?:[}\]。！？!?]+,?|$)")
+
+
+def _segments(text: str, pattern: re.Pattern) -> List[str]:
+    return [s for s in pattern.findall(text) if s]
+
+
+def diff_text(base: str, target: str, pattern: re.Pattern = _TEXT_SEGMENT_RE) -> list:
+    """生成把 base 变为 target 的增量操作"""
+    base_segments = _segments(base, pattern)
+    target_segments = _segments(target, pattern)
+    offsets = [0, *accumulate(len(s) for s in base_segments)]
+
+    # 先去掉相同的首尾片段，只在中间改动区域上做比较
+    prefix = 0
+    limit = min(len(base_segments), len(target_segments))
+    while prefix < limit and base_segments[prefix] == target_segments[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and base_segments[-1 - suffix] == target_segments[-1 - suffix]:
+        suffix += 1
+    base_end = len(base_segments) - suffix
+    target_end = len(target_segments) - suffix
+
+    ops: list = []
+
+    def copy(start: int, end: int):
+        # 相邻的复制操作合并为一个
+        if ops and not isinstance(ops[-1], str) and ops[-1][1] == start:
+            ops[-1][1] = end
+        elif end > start:
+            ops.append([start, end])
+
+    copy(0, offsets[prefix])
+    matcher = SequenceMatcher(
+        None, base_segments[prefix:base_end], target_segments[prefix:target_end]
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            copy(offsets[prefix + i1], offsets[prefix + i2])
+        elif j2 > j1:
+            ops.append("".join(target_segments[prefix + j1:prefix + j2]))
+    copy(offsets[base_end], offsets[-1])
+    return ops
+
+
+def patch_text(base: str, ops: list) -> str:
+    """对 base 应用增量操作"""
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.append(base[op[0]:op[1]])
+    return "".join(parts)
+
+
+def dump_json(value: Any) -> str:
+    """JSON 的比较用文本
+
+    键排序后输出：JSONB 存储会改变键顺序，编码与解码两侧必须得到相同的文本。
+    不使用 indent（带缩进时 json 模块会退回纯 Python 编码器，慢一个数量级）。
+    """
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+def encode_field(base: Any, target: Any, is_json: bool) -> Optional[dict]:
+    """单个字段的增量，未变化时返回 None
+
+    Returns:
+        {"ops": [...]}，或无法比较时（一方为空）{"value": 新值}
+    """
+    if base == target:
+        return None
+    if base is None or target is None:
+        return {"value": target}
+    if is_json:
+        return {"ops": diff_text(dump_json(base), dump_json(target), _JSON_SEGMENT_RE)}
+    return {"ops": diff_text(base, target)}
+
+
+def decode_field(base: Any, delta: Optional[dict], is_json: bool) -> Any:
+    """对基准值应用单个字段的增量"""
+    if delta is None:
+        return base
+    if "value" in delta:
+        return delta["value"]
+    if is_json:
+        return json.loads(patch_text(dump_json(base), delta["ops"]))
+    return patch_text(base, delta["ops"])
@@ -0,0 +1,161 @@
+"""游标分页（keyset pagination）
+
+游标是排序键的 JSON 经 URL 安全 base64 编码后的字符串，对客户端不透明。
+下一页查询使用 WHERE (排序键) 在游标之后 + LIMIT，避免 OFFSET 扫描并丢弃前面的行。
+列表总数代价较高，通过 CountCache 短期缓存，或由调用方关闭统计。
+"""
+
+import base64
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import DateTime, and_, func, literal, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+
+class InvalidCursor(ValueError):
+    """游标格式错误"""
+
+
+def encode_cursor(values: dict) -> str:
+    """编码游标"""
+    raw = json.dumps(values, separators=(",", ":"), ensure_ascii=False, default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    """解码游标，空游标返回 None，格式错误抛出 InvalidCursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor("无效的分页游标") from e
+    if not isinstance(values, dict):
+        raise InvalidCursor("无效的分页游标")
+    return values
+
+
+class Keyset:
+    """按多列排序的 keyset 分页
+
+    Args:
+        keys: (列, 是否降序) 列表，最后一列必须唯一（通常是主键），保证顺序稳定
+    """
+
+    def __init__(self, *keys):
+        self.keys = keys
+
+    def order_by(self) -> list:
+        return [column.desc() if descending else column.asc() for column, descending in self.keys]
+
+    def after(self, values: list):
+        """位于游标之后的行：(c1, c2, ...) > (v1, v2, ...)，方向混合时展开为 OR 条件"""
+        # 统一绑定为参数（布尔列不能直接与 True/False 比较大小）
+        bound = [literal(value, column.type) for (column, _), value in zip(self.keys, values)]
+        directions = {descending for _, descending in self.keys}
+        if len(directions) == 1:
+            # 方向一致时用行比较，可直接作为复合索引的范围条件
+            columns = tuple_(*[column for column, _ in self.keys])
+            return columns < tuple_(*bound) if directions.pop() else columns > tuple_(*bound)
+
+        clauses = []
+        for i, (column, descending) in enumerate(self.keys):
+            compare = column < bound[i] if descending else column > bound[i]
+            equals = [self.keys[j][0] == bound[j] for j in range(i)]
+            clauses.append(and_(*equals, compare))
+        return or_(*clauses)
+
+    def encode(self, row) -> str:
+        """用当前页最后一行生成下一页游标"""
+        return encode_cursor({"k": [getattr(row, column.key) for column, _ in self.keys]})
+
+    def decode(self, cursor: Optional[str]) -> Optional[list]:
+        """解析游标中的排序键，并按列类型还原时间"""
+        values = decode_cursor(cursor)
+        if values is None:
+            return None
+        keys = values.get("k")
+        if not isinstance(keys, list) or len(keys) != len(self.keys):
+            raise InvalidCursor("无效的分页游标")
+        try:
+            return [
+                datetime.fromisoformat(value)
+                if isinstance(column.type, DateTime) and isinstance(value, str)
+                else value
+                for (column, _), value in zip(self.keys, keys)
+            ]
+        except ValueError as e:
+            raise InvalidCursor("无效的分页游标") from e
+
+
+async def paginate_keyset(
+    db: AsyncSession,
+    query,
+    keyset: Keyset,
+    page: int,
+    page_size: int,
+    cursor: Optional[str] = None,
+) -> Tuple[list, Optional[str]]:
+    """执行 keyset 分页查询，返回 (当前页对象, 下一页游标)
+
+    没有游标时按 page 回退到 OFFSET 分页（兼容旧客户端，第一页没有额外开销）。
+    """
+    after = keyset.decode(cursor)
+    if after is not None:
+        query = query.where(keyset.after(after))
+    elif page > 1:
+        query = query.offset((page - 1) * page_size)
+
+    # 多取一条判断是否还有下一页
+    result = await db.execute(query.order_by(*keyset.order_by()).limit(page_size + 1))
+    items = result.scalars().unique().all()
+    if len(items) <= page_size:
+        return list(items), None
+    items = list(items[:page_size])
+    return items, keyset.encode(items[-1])
+
+
+class CountCache:
+    """列表总数的短期缓存
+
+    总数只用于展示页数，允许短时间不精确；按用户分组，用户写操作后整体失效。
+    """
+
+    def __init__(self, ttl: float, max_users: int = 10000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: "OrderedDict[str, Dict[str, Tuple[float, int]]]" = OrderedDict()
+
+    async def get_or_count(self, db: AsyncSession, user_id: str, key: str, query) -> int:
+        """读取缓存的总数，未命中时对 query 执行 COUNT"""
+        now = time.monotonic()
+        entries = self._entries.get(user_id)
+        if entries is not None:
+            self._entries.move_to_end(user_id)
+            cached = entries.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        result = await db.execute(select(func.count()).select_from(query.order_by(None).subquery()))
+        total = result.scalar() or 0
+        if self.ttl > 0:
+            entries = self._entries.setdefault(user_id, {})
+            entries[key] = (now + self.ttl, total)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return total
+
+    def invalidate(self, user_id: str):
+        """用户的笔记发生增删后调用"""
+        self._entries.pop(user_id, None)
+
+
+count_cache = CountCache(ttl=settings.PAGINATION_COUNT_CACHE_SECONDS)
@@ -0,0 +1,31 @@
+"""Redis 连接"""
+
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+
+_redis: Optional[Redis] = None
+
+
+def get_redis() -> Optional[Redis]:
+    """获取共享 Redis 客户端（未配置 REDIS_URL 时返回 None）"""
+    global _redis
+    if not settings.REDIS_URL:
+        return None
+    if _redis is None:
+        _redis = Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _redis
+
+
+async def close_redis():
+    """关闭 Redis 连接（应用关闭时调用）"""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
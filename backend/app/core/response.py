@@ -28,6 +28,7 @@ class ResponseCode:
     FORBIDDEN = 403
     NOT_FOUND = 404
     VERSION_CONFLICT = 409
+    TOO_MANY_REQUESTS = 429
     SERVER_ERROR = 500
 
 
@@ -45,6 +46,7 @@ def make_response(
         ResponseCode.FORBIDDEN: "forbidden",
         ResponseCode.NOT_FOUND: "not_found",
         ResponseCode.VERSION_CONFLICT: "version_conflict",
+        ResponseCode.TOO_MANY_REQUESTS: "too_many_requests",
         ResponseCode.SERVER_ERROR: "server_error",
     }
 
@@ -70,14 +72,25 @@ def success(data: Any = None, pagination: Optional[dict] = None) -> dict:
 
 
 def success_with_pagination(
-    data: Any, total: int, page: int, page_size: int
+    data: Any,
+    total: Optional[int],
+    page: int,
+    page_size: int,
+    next_cursor: Optional[str] = None,
 ) -> dict:
-    """带分页的成功响应"""
+    """带分页的成功响应
+
+    游标分页时传入 next_cursor（没有下一页时为 None）；
+    total 未知时为 None（游标分页的后续页不重复统计总数）。
+    """
     pagination = {
         "total": total,
         "page": page,
         "page_size": page_size,
-        "total_pages": (total + page_size - 1) // page_size if page_size > 0 else 0,
+        "total_pages": (
+            (total + page_size - 1) // page_size if total is not None and page_size > 0 else None
+        ),
+        "next_cursor": next_cursor,
     }
     return make_response(ResponseCode.SUCCESS, "", data, pagination)
 
@@ -112,6 +125,11 @@ def version_conflict(data: Any = None, message: str = "版本冲突") -> dict:
     return make_response(ResponseCode.VERSION_CONFLICT, message, data)
 
 
+def too_many_requests(message: str = "请求过于频繁") -> dict:
+    """请求过多 / 服务繁忙"""
+    return error(ResponseCode.TOO_MANY_REQUESTS, message)
+
+
 def server_error(message: str = "服务器错误") -> dict:
     """服务器错误"""
     return error(ResponseCode.SERVER_ERROR, message)
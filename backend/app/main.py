@@ -3,36 +3,31 @@
 import contextlib
 from contextlib import asynccontextmanager
 import asyncio
-from datetime import datetime, timedelta
+import os
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 
 from app.core.config import settings
-from app.core.database import init_db, AsyncSessionLocal
+from app.core.database import init_db
+from app.core.redis import close_redis
 from app.core.response import success
 from app.api.v1 import api_router
+from app.services.http_client import http_clients
+from app.services.embedding import embedding_cache, embedding_batcher
+from app.services.embed_jobs import embedding_job_worker
+from app.services.text_search import backfill_search_vectors
+from app.services.tiptap import render_cache
+from app.services.pdf import pdf_renderer
+from app.services.diff import diff_cache
+from app.services.version_store import version_compaction_worker
+from app.services.trash_purge import trash_purge_worker
+from app.services.storage_gc import storage_gc_worker
+from app.services.media import media_job_worker
+from app.services.asr import asr_poller
 # 导入模型以注册到 metadata
-from app.models import User, Note, Tag, NoteTag, Attachment  # noqa: F401
-
-
-async def cleanup_trash_worker():
-    """周期性清理回收站中过期笔记"""
-    while True:
-        try:
-            async with AsyncSessionLocal() as session:
-                threshold = datetime.utcnow() - timedelta(days=settings.TRASH_RETENTION_DAYS)
-                await session.execute(
-                    Note.__table__.delete().where(
-                        Note.deleted_at.is_not(None),
-                        Note.deleted_at < threshold,
-                    )
-                )
-                await session.commit()
-        except Exception:
-            # 静默错误，防止中断循环
-            pass
-        await asyncio.sleep(settings.TRASH_CLEANUP_INTERVAL_HOURS * 3600)
+from app.models import User, Note, Tag, NoteTag, Attachment, EmbeddingJob  # noqa: F401
 
 
 @asynccontextmanager
@@ -42,14 +37,40 @@ async def lifespan(app: FastAPI):
     await init_db()
 
     # 启动回收站清理后台任务
-    cleanup_task = asyncio.create_task(cleanup_trash_worker())
+    cleanup_task = asyncio.create_task(trash_purge_worker())
+
+    # 启动嵌入任务 worker 池
+    embedding_job_worker.start()
+
+    # 启动附件媒体后处理 worker
+    media_job_worker.start()
+
+    # 启动语音识别任务轮询
+    asr_poller.start()
+
+    # 后台回填旧笔记的全文检索向量
+    backfill_task = asyncio.create_task(backfill_search_vectors())
+
+    # 启动旧版本历史压缩后台任务
+    compaction_task = asyncio.create_task(version_compaction_worker())
+
+    # 启动孤立附件清理后台任务
+    storage_gc_task = asyncio.create_task(storage_gc_worker())
 
     yield
 
     # 关闭时清理资源
-    cleanup_task.cancel()
-    with contextlib.suppress(asyncio.CancelledError):
-        await cleanup_task
+    await embedding_job_worker.stop()
+    await media_job_worker.stop()
+    await asr_poller.stop()
+    for task in (cleanup_task, backfill_task, compaction_task, storage_gc_task):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    pdf_renderer.shutdown()
+    await embedding_batcher.aclose()
+    await http_clients.aclose()
+    await close_redis()
 
 
 app = FastAPI(
@@ -71,6 +92,11 @@ app.add_middleware(
 # 注册 API 路由
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
+# 本地存储后端：直接提供文件访问（仅开发 / 测试）
+if settings.STORAGE_BACKEND == "local":
+    os.makedirs(settings.STORAGE_LOCAL_ROOT, exist_ok=True)
+    app.mount("/media", StaticFiles(directory=settings.STORAGE_LOCAL_ROOT), name="media")
+
 
 @app.get("/")
 async def root():
@@ -87,3 +113,16 @@ async def health():
     return success({
         "status": "ok",
     })
+
+
+@app.get("/metrics")
+async def metrics():
+    """运行时指标"""
+    return success({
+        "http": http_clients.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_batcher": embedding_batcher.stats(),
+        "tiptap_render_cache": render_cache.stats(),
+        "pdf": pdf_renderer.stats(),
+        "version_diff_cache": diff_cache.stats(),
+    })
@@ -4,5 +4,21 @@ from app.models.user import User
 from app.models.note import Note, Tag, NoteTag, Attachment
 from app.models.embedding import NoteEmbedding
 from app.models.version import NoteVersion
+from app.models.job import EmbeddingJob, MediaJob, AsrTask
+from app.models.upload import UploadSession
+from app.models.blob import Blob
 
-__all__ = ["User", "Note", "Tag", "NoteTag", "Attachment", "NoteEmbedding", "NoteVersion"]
+__all__ = [
+    "User",
+    "Note",
+    "Tag",
+    "NoteTag",
+    "Attachment",
+    "NoteEmbedding",
+    "NoteVersion",
+    "EmbeddingJob",
+    "MediaJob",
+    "AsrTask",
+    "UploadSession",
+    "Blob",
+]
@@ -0,0 +1,33 @@
+"""内容寻址存储模型"""
+
+from datetime import datetime
+
+from sqlalchemy import String, Integer, BigInteger, DateTime, Index, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class Blob(Base):
+    """按 SHA-256 去重的存储对象
+
+    多个附件（可属于不同用户）通过 blob_sha256 共享同一个对象，ref_count 为引用它的附件数；
+    引用计数归零超过宽限期后由存储清理任务删除对象。
+    """
+
+    __tablename__ = "blobs"
+    __table_args__ = (
+        # 存储清理只扫描无引用的 blob
+        Index("ix_blobs_unreferenced", "updated_at", postgresql_where=text("ref_count <= 0")),
+    )
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    object_key: Mapped[str] = mapped_column(String(500), nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    mime_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # 引用计数最近一次变化的时间（归零后据此计算宽限期）
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
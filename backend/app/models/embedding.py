@@ -5,7 +5,7 @@ from datetime import datetime
 from typing import Optional, List
 
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import String, Text, Integer, DateTime, ForeignKey
+from sqlalchemy import String, Text, Integer, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -16,6 +16,10 @@ class NoteEmbedding(Base):
     """笔记向量嵌入表"""
 
     __tablename__ = "note_embeddings"
+    __table_args__ = (
+        # 向量检索按用户预过滤
+        Index("ix_note_embeddings_user_deleted", "user_id", "note_deleted"),
+    )
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, default=lambda: str(uuid.uuid4())
@@ -23,8 +27,16 @@ class NoteEmbedding(Base):
     note_id: Mapped[str] = mapped_column(
         String(36), ForeignKey("notes.id", ondelete="CASCADE"), nullable=False, index=True
     )
+    # 冗余笔记的归属与删除状态，向量检索无需再关联 notes 表过滤
+    user_id: Mapped[Optional[str]] = mapped_column(
+        String(36), ForeignKey("users.id"), nullable=True
+    )
+    note_deleted: Mapped[bool] = mapped_column(Boolean, default=False)  # 笔记是否在回收站
     chunk_index: Mapped[int] = mapped_column(Integer, default=0)  # 文档分块索引
     chunk_text: Mapped[str] = mapped_column(Text, nullable=False)  # 原始文本块
+    content_hash: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True
+    )  # 文本块 SHA-256，用于增量重嵌入
     embedding: Mapped[Optional[List[float]]] = mapped_column(
         Vector(settings.OPENAI_EMBEDDING_DIMENSIONS), nullable=True
     )  # 向量嵌入
@@ -0,0 +1,163 @@
+"""后台任务模型"""
+
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, Text, Boolean, Integer, Float, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class EmbeddingJob(Base):
+    """批量嵌入任务表
+
+    由 worker 池认领执行，按笔记 ID 顺序分批处理，每批提交后记录检查点，
+    崩溃或重启后从检查点继续。
+    """
+
+    __tablename__ = "embedding_jobs"
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    user_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("users.id"), nullable=False, index=True
+    )
+    status: Mapped[str] = mapped_column(
+        String(20), default="pending", index=True
+    )  # pending, running, completed, failed
+    force: Mapped[bool] = mapped_column(Boolean, default=False)  # 是否强制全部重建
+
+    # 进度
+    total_notes: Mapped[int] = mapped_column(Integer, default=0)
+    processed_notes: Mapped[int] = mapped_column(Integer, default=0)
+    embedded_chunks: Mapped[int] = mapped_column(Integer, default=0)
+    reused_chunks: Mapped[int] = mapped_column(Integer, default=0)
+    checkpoint_note_id: Mapped[Optional[str]] = mapped_column(
+        String(36), nullable=True
+    )  # 已完成的最后一个笔记 ID（按 ID 升序处理）
+
+    # 调度
+    attempts: Mapped[int] = mapped_column(Integer, default=0)  # 连续失败次数
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    locked_by: Mapped[Optional[str]] = mapped_column(
+        String(36), nullable=True
+    )  # 当前租约的认领令牌，租约被其他 worker 接手后旧 worker 不再写入
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        progress = self.processed_notes / self.total_notes if self.total_notes else 1.0
+        return {
+            "id": self.id,
+            "status": self.status,
+            "force": self.force,
+            "total_notes": self.total_notes,
+            "processed_notes": self.processed_notes,
+            "embedded_chunks": self.embedded_chunks,
+            "reused_chunks": self.reused_chunks,
+            "progress": round(min(progress, 1.0), 4),
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class MediaJob(Base):
+    """附件媒体后处理任务表
+
+    上传完成后创建，由媒体 worker 认领：提取尺寸 / 时长、生成 WebP 缩略图并上传。
+    """
+
+    __tablename__ = "media_jobs"
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    attachment_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("attachments.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    status: Mapped[str] = mapped_column(
+        String(20), default="pending", index=True
+    )  # pending, running, completed, failed
+
+    # 调度
+    attempts: Mapped[int] = mapped_column(Integer, default=0)  # 连续失败次数
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # 当前租约的认领令牌
+    locked_by: Mapped[Optional[str]] = mapped_column(String(36), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class AsrTask(Base):
+    """录音文件识别任务表
+
+    创建后由识别轮询器提交到腾讯云（CreateRecTask），之后按自适应间隔批量查询状态
+    （DescribeTaskStatus），完成后把结果写回附件的 asr_text。
+    """
+
+    __tablename__ = "asr_tasks"
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    user_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("users.id"), nullable=False, index=True
+    )
+    attachment_id: Mapped[Optional[str]] = mapped_column(
+        String(36), ForeignKey("attachments.id", ondelete="SET NULL"), nullable=True, index=True
+    )
+    audio_url: Mapped[str] = mapped_column(Text, nullable=False)
+    engine_model: Mapped[str] = mapped_column(String(50), nullable=False)
+    # 腾讯云 TaskId
+    provider_task_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    status: Mapped[str] = mapped_column(
+        String(20), default="pending", index=True
+    )  # pending（待提交）, running, completed, failed
+    result_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    audio_duration: Mapped[float] = mapped_column(Float, default=0)
+
+    # 调度
+    attempts: Mapped[int] = mapped_column(Integer, default=0)  # 连续调用失败次数
+    polls: Mapped[int] = mapped_column(Integer, default=0)  # 已查询次数（决定下次查询间隔）
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    next_poll_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            "id": self.id,
+            "attachment_id": self.attachment_id,
+            "status": self.status,
+            "text": self.result_text,
+            "audio_duration": self.audio_duration,
+            "error": self.last_error if self.status == "failed" else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
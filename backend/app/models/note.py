@@ -4,7 +4,8 @@ import uuid
 from datetime import datetime
 from typing import Optional, List, TYPE_CHECKING
 
-from sqlalchemy import String, Text, Boolean, Integer, DateTime, ForeignKey, JSON
+from sqlalchemy import String, Text, Boolean, Integer, DateTime, ForeignKey, JSON, Index, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -17,6 +18,18 @@ class Note(Base):
     """笔记表"""
 
     __tablename__ = "notes"
+    __table_args__ = (
+        Index("ix_notes_search_vector", "search_vector", postgresql_using="gin"),
+        # 列表 / 回收站的 keyset 分页（与排序键一致，支持反向扫描）
+        Index(
+            "ix_notes_user_list", "user_id", "is_pinned", "updated_at", "id",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_notes_user_trash", "user_id", "deleted_at", "id",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[str] = mapped_column(
         String(36), primary_key=True, default=lambda: str(uuid.uuid4())
@@ -34,6 +47,8 @@ class Note(Base):
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
     deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
+    # 全文检索向量（应用侧中文分词，由 app.services.text_search 维护），默认不加载
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, nullable=True, deferred=True)
 
     # 关系
     tags: Mapped[List["Tag"]] = relationship(
@@ -140,6 +155,8 @@ class Attachment(Base):
     file_size: Mapped[int] = mapped_column(Integer, default=0)
     mime_type: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
     url: Mapped[str] = mapped_column(Text, nullable=False)
+    # 共享的内容寻址对象（为空表示独占对象，删除附件时直接删除对象）
+    blob_sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
     thumbnail_url: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     width: Mapped[int] = mapped_column(Integer, default=0)
     height: Mapped[int] = mapped_column(Integer, default=0)
@@ -168,5 +185,7 @@ class Attachment(Base):
             "width": self.width,
             "height": self.height,
             "duration": self.duration,
+            # 各尺寸的 WebP 缩略图（媒体后处理完成后才有）
+            "variants": (self.extra_info or {}).get("variants", []),
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
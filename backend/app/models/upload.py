@@ -0,0 +1,79 @@
+"""上传会话模型"""
+
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, Integer, BigInteger, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class UploadSession(Base):
+    """可续传的分片上传会话
+
+    客户端按固定分片大小上传各分片（可并行、可重传），中断后查询已上传的分片继续；
+    每个分片直接转存到对象存储的分片上传中，全部完成后合并为对象并创建附件。
+    直传会话（direct）由客户端按预签名 URL 直接上传到对象存储，服务端只在完成时校验对象。
+    """
+
+    __tablename__ = "upload_sessions"
+
+    id: Mapped[str] = mapped_column(
+        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    user_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("users.id"), nullable=False, index=True
+    )
+    note_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True)
+    type: Mapped[str] = mapped_column(String(20), nullable=False)  # image, audio, video
+    file_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    mime_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    file_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    part_size: Mapped[int] = mapped_column(Integer, nullable=False)
+    object_key: Mapped[str] = mapped_column(String(500), nullable=False)
+    # 对象存储的分片上传 ID（直传且不分片时为空）
+    upload_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    direct: Mapped[bool] = mapped_column(Boolean, default=False)
+    # 已上传的分片：{"分片号": {"etag": ..., "size": ..., "sha256": ...}}
+    parts: Mapped[dict] = mapped_column(JSON, default=dict)
+    status: Mapped[str] = mapped_column(
+        String(20), default="uploading", index=True
+    )  # uploading, completed, aborted
+    attachment_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    @property
+    def part_count(self) -> int:
+        return max(1, -(-self.file_size // self.part_size))
+
+    def expected_part_size(self, part_number: int) -> int:
+        """指定分片应有的字节数（最后一个分片可以更小）"""
+        if part_number < self.part_count:
+            return self.part_size
+        return self.file_size - self.part_size * (self.part_count - 1)
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        parts = self.parts or {}
+        return {
+            "id": self.id,
+            "type": self.type,
+            "file_name": self.file_name,
+            "mime_type": self.mime_type,
+            "file_size": self.file_size,
+            "part_size": self.part_size,
+            "part_count": self.part_count,
+            "uploaded_parts": sorted(int(n) for n in parts),
+            "uploaded_bytes": sum(part["size"] for part in parts.values()),
+            "direct": bool(self.direct),
+            "status": self.status,
+            "attachment_id": self.attachment_id,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
@@ -3,19 +3,29 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, String, Integer, Text, DateTime, ForeignKey, Boolean, Index, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from app.core import Base
+from app.core.delta import decode_field
 
 
 class NoteVersion(Base):
     """笔记版本历史
     
-    每次笔记更新时自动保存历史版本
+    每次笔记更新时自动保存历史版本。
+    关键帧保存完整内容；其余版本只保存相对所属关键帧的增量（delta），
+    读取完整内容前需要加载 keyframe 关系（见 app.services.version_store）。
     """
     __tablename__ = "note_versions"
+    __table_args__ = (
+        Index("ix_note_versions_note_version", "note_id", "version", "id"),
+        Index(
+            "ix_note_versions_note_keyframes", "note_id", "version",
+            postgresql_where=text("is_keyframe"),
+        ),
+    )
     
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     note_id = Column(String(36), ForeignKey("notes.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -26,39 +36,85 @@ class NoteVersion(Base):
     content = Column(Text, nullable=True)
     json_content = Column(JSONB, nullable=True)
     
+    # 增量存储：非关键帧的 content / json_content 为空，由关键帧 + delta 还原
+    is_keyframe = Column(Boolean, nullable=False, default=True, server_default=text("true"))
+    keyframe_id = Column(String(36), ForeignKey("note_versions.id"), nullable=True, index=True)
+    delta = Column(JSONB, nullable=True)
+    preview = Column(String(210), nullable=True)  # 增量版本的内容预览（列表展示用）
+    
+    # 连续修改合并：编辑会话 ID；显式恢复点不参与合并与压缩
+    session_id = Column(String(64), nullable=True)
+    is_restore_point = Column(Boolean, nullable=False, default=False, server_default=text("false"))
+    
     # 变更信息
     change_type = Column(String(50), default="update")  # create, update, restore
     change_summary = Column(String(500), nullable=True)  # 变更摘要
     
     # 时间戳
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     # 关系
     note = relationship("Note", back_populates="versions")
+    keyframe = relationship("NoteVersion", remote_side=[id], lazy="raise")
+    
+    def snapshot(self) -> dict:
+        """完整内容 {title, content, json_content}，增量版本由关键帧还原"""
+        cached = getattr(self, "_snapshot", None)
+        if cached is not None:
+            return cached
+        if self.is_keyframe is not False:
+            snapshot = {
+                "title": self.title,
+                "content": self.content,
+                "json_content": self.json_content,
+            }
+        else:
+            if self.keyframe is None:
+                raise RuntimeError(f"版本 {self.id} 的关键帧未加载")
+            base = self.keyframe.snapshot()
+            delta = self.delta or {}
+            snapshot = {
+                "title": self.title,
+                "content": decode_field(base["content"], delta.get("content"), is_json=False),
+                "json_content": decode_field(
+                    base["json_content"], delta.get("json_content"), is_json=True
+                ),
+            }
+        self._snapshot = snapshot
+        return snapshot
     
     def to_dict(self):
+        if self.is_keyframe is False:
+            preview = self.preview
+        else:
+            preview = self.content
+            if preview and len(preview) > 200:
+                preview = preview[:200] + "..."
         return {
             "id": self.id,
             "note_id": self.note_id,
             "version": self.version,
             "title": self.title,
-            "content": self.content[:200] + "..." if self.content and len(self.content) > 200 else self.content,
+            "content": preview,
             "json_content": None,  # 不返回完整 JSON，节省带宽
             "change_type": self.change_type,
             "change_summary": self.change_summary,
+            "is_restore_point": bool(self.is_restore_point),
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
     
     def to_dict_full(self):
         """包含完整内容的字典"""
+        snapshot = self.snapshot()
         return {
             "id": self.id,
             "note_id": self.note_id,
             "version": self.version,
-            "title": self.title,
-            "content": self.content,
-            "json_content": self.json_content,
+            "title": snapshot["title"],
+            "content": snapshot["content"],
+            "json_content": snapshot["json_content"],
             "change_type": self.change_type,
             "change_summary": self.change_summary,
+            "is_restore_point": bool(self.is_restore_point),
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
@@ -1,10 +1,14 @@
 """Pydantic Schemas"""
 
 from app.schemas.user import UserLogin, UserRegister, UserUpdate, UserResponse
-from app.schemas.note import NoteCreate, NoteUpdate, TagCreate, TagUpdate, AddNoteTags, NoteListParams
+from app.schemas.note import (
+    NoteCreate, NoteUpdate, TagCreate, TagUpdate, AddNoteTags, NoteListParams,
+    BulkNoteTarget, BulkNoteAction, BulkNotePin, BulkNoteTags, BulkNoteUpdateItem, BulkNoteUpdate,
+)
+from app.schemas.upload import UploadSessionCreate, UploadComplete, UploadInstant
 from app.schemas.ai import (
     OCRRequest, ASRRequest, SummaryRequest, LinkPreviewRequest,
-    SemanticSearchRequest, SemanticSearchResult, ChatMessage,
+    SemanticSearchRequest, HybridSearchRequest, SemanticSearchResult, ChatMessage,
     RAGChatRequest, EmbedNoteRequest, EmbedAllNotesRequest,
 )
 
@@ -19,11 +23,21 @@ __all__ = [
     "TagUpdate",
     "AddNoteTags",
     "NoteListParams",
+    "BulkNoteTarget",
+    "BulkNoteAction",
+    "BulkNotePin",
+    "BulkNoteTags",
+    "BulkNoteUpdateItem",
+    "BulkNoteUpdate",
+    "UploadSessionCreate",
+    "UploadComplete",
+    "UploadInstant",
     "OCRRequest",
     "ASRRequest",
     "SummaryRequest",
     "LinkPreviewRequest",
     "SemanticSearchRequest",
+    "HybridSearchRequest",
     "SemanticSearchResult",
     "ChatMessage",
     "RAGChatRequest",
@@ -2,7 +2,7 @@
 
 from typing import Optional, List
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 
 
 class OCRRequest(BaseModel):
@@ -37,6 +37,19 @@ class SemanticSearchRequest(BaseModel):
     
     query: str
     top_k: int = 5
+    # ANN 召回参数（不传则使用服务端默认值）
+    ef_search: Optional[int] = Field(None, ge=1, le=1000, description="HNSW 候选集大小")
+    probes: Optional[int] = Field(None, ge=1, le=1000, description="IVFFlat 探测聚类数")
+
+
+class HybridSearchRequest(BaseModel):
+    """混合检索请求（全文 + 语义）"""
+    
+    query: str
+    page: int = Field(1, ge=1, le=100)
+    page_size: int = Field(10, ge=1, le=50)
+    ef_search: Optional[int] = Field(None, ge=1, le=1000, description="HNSW 候选集大小")
+    probes: Optional[int] = Field(None, ge=1, le=1000, description="IVFFlat 探测聚类数")
 
 
 class SemanticSearchResult(BaseModel):
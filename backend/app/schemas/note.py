@@ -23,6 +23,47 @@ class NoteUpdate(BaseModel):
     json_content: Optional[Any] = None
     is_pinned: Optional[bool] = None
     version: int = Field(..., description="乐观锁版本号")
+    session_id: Optional[str] = Field(
+        None, max_length=64, description="编辑会话 ID，同一会话的连续修改合并为一个版本"
+    )
+
+
+class BulkNoteTarget(BaseModel):
+    """批量操作的目标笔记"""
+
+    id: str
+    version: Optional[int] = Field(None, description="乐观锁版本号，提供时校验")
+
+
+class BulkNoteAction(BaseModel):
+    """批量删除 / 恢复"""
+
+    items: List[BulkNoteTarget] = Field(..., min_length=1)
+
+
+class BulkNotePin(BulkNoteAction):
+    """批量置顶 / 取消置顶"""
+
+    is_pinned: bool
+
+
+class BulkNoteTags(BulkNoteAction):
+    """批量添加 / 移除标签"""
+
+    add_tag_ids: List[str] = []
+    remove_tag_ids: List[str] = []
+
+
+class BulkNoteUpdateItem(NoteUpdate):
+    """批量更新中的单个笔记"""
+
+    id: str
+
+
+class BulkNoteUpdate(BaseModel):
+    """批量更新"""
+
+    items: List[BulkNoteUpdateItem] = Field(..., min_length=1)
 
 
 class TagCreate(BaseModel):
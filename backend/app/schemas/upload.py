@@ -0,0 +1,29 @@
+"""上传相关 Schema"""
+
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class UploadSessionCreate(BaseModel):
+    """创建可续传上传会话"""
+
+    type: str = Field(..., description="image, audio, video")
+    file_name: str = Field(..., min_length=1, max_length=255)
+    mime_type: str
+    file_size: int = Field(..., gt=0, description="文件总字节数")
+    note_id: Optional[str] = None
+
+
+class UploadInstant(UploadSessionCreate):
+    """秒传（按内容哈希复用已上传的文件）"""
+
+    sha256: str = Field(
+        ..., pattern=r"^[0-9a-f]{64}$", description="文件内容的 SHA-256（小写十六进制）"
+    )
+
+
+class UploadComplete(BaseModel):
+    """直传完成"""
+
+    session_id: str
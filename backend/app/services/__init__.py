@@ -1,7 +1,8 @@
 """服务模块"""
 
+from app.services.http_client import get_http_client, http_clients
 from app.services.storage import upload_to_cos, delete_from_cos
-from app.services.tencent import call_ocr, call_asr
+from app.services.tencent import call_ocr, get_asr_client
 from app.services.deepseek import call_summary, call_chat, call_chat_stream
 from app.services.embedding import (
     get_embedding,
@@ -9,13 +10,17 @@ from app.services.embedding import (
     chunk_text,
     extract_plain_text,
     count_tokens,
+    embedding_cache,
 )
+from app.services.text_search import segment_text, build_tsquery
 
 __all__ = [
+    "get_http_client",
+    "http_clients",
     "upload_to_cos",
     "delete_from_cos",
     "call_ocr",
-    "call_asr",
+    "get_asr_client",
     "call_summary",
     "call_chat",
     "call_chat_stream",
@@ -24,4 +29,7 @@ __all__ = [
     "chunk_text",
     "extract_plain_text",
     "count_tokens",
+    "embedding_cache",
+    "segment_text",
+    "build_tsquery",
 ]
@@ -0,0 +1,99 @@
+"""流式归档写入 - zip / tar.gz
+
+归档写入一个只追加的内存缓冲区，每写完一批条目就把已产生的字节取走发送，
+不需要可 seek 的文件，也不会在内存中保留完整归档。
+"""
+
+import io
+import tarfile
+import zipfile
+from datetime import datetime
+from typing import List, Optional
+
+ARCHIVE_FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar.gz": ("application/gzip", ".tar.gz"),
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """只追加、不可 seek 的输出流，写入的数据由 drain() 取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ArchiveWriter:
+    """增量写入 zip 或 tar.gz 归档"""
+
+    def __init__(self, fmt: str = "zip"):
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"不支持的归档格式: {fmt}")
+        self.format = fmt
+        self._sink = _ChunkSink()
+        if fmt == "zip":
+            # 不可 seek 时 zipfile 使用 data descriptor 记录大小和 CRC
+            self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(
+                self._sink, "w", compression=zipfile.ZIP_DEFLATED
+            )
+            self._tar: Optional[tarfile.TarFile] = None
+        else:
+            self._zip = None
+            self._tar = tarfile.open(fileobj=self._sink, mode="w|gz")
+
+    @property
+    def media_type(self) -> str:
+        return ARCHIVE_FORMATS[self.format][0]
+
+    @property
+    def extension(self) -> str:
+        return ARCHIVE_FORMATS[self.format][1]
+
+    def add(self, name: str, data: bytes, mtime: Optional[datetime] = None):
+        """写入一个文件条目"""
+        mtime = mtime or datetime.now()
+        if self._zip is not None:
+            # zip 时间戳不能早于 1980 年
+            date_time = max(mtime, datetime(1980, 1, 1)).timetuple()[:6]
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(mtime.timestamp())
+            info.mode = 0o644
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def drain(self) -> bytes:
+        """取走目前已产生的归档字节"""
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """写入归档尾部（目录 / 结束块），返回剩余字节"""
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+        return self._sink.drain()
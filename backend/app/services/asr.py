@@ -0,0 +1,264 @@
+"""语音识别任务编排
+
+/ai/asr 只创建任务记录（asr_tasks）并唤醒轮询器，由单个后台轮询器统一调度：
+- 提交：待提交的任务调用 CreateRecTask，失败按指数退避重试
+- 查询：每轮取出所有到期的任务，并发调用 DescribeTaskStatus（腾讯云没有批量查询接口，
+  同时进行的请求数有上限）
+- 自适应间隔：首次查询时间按音频时长估计（取媒体后处理提取的附件时长），
+  之后未完成的任务查询间隔逐次翻倍，限制在 [ASR_POLL_MIN_SECONDS, ASR_POLL_MAX_SECONDS]；
+  轮询器按最早到期的任务决定下一轮的等待时间，创建新任务时立即唤醒
+- 每轮的结果一次性写回附件的 asr_text，并通知本进程中等待该任务的 SSE 连接
+多个 API 副本中每轮只由持有咨询锁的实例执行；其他实例上的 SSE 连接定期重新读取任务状态。
+"""
+
+import asyncio
+import contextlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, advisory_lock
+from app.models import Attachment, AsrTask
+from app.services.tencent import AsrResult, get_asr_client
+
+ASR_LOCK_NAME = "lifeos:asr_poll"
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def poll_interval(polls: int) -> float:
+    """第 polls 次查询仍未完成时，到下一次查询的间隔"""
+    return min(settings.ASR_POLL_MAX_SECONDS, settings.ASR_POLL_MIN_SECONDS * 2 ** polls)
+
+
+def first_poll_delay(duration: float) -> float:
+    """提交后到首次查询的间隔（按音频时长估计识别耗时）"""
+    estimate = (duration or 0) * settings.ASR_DURATION_FACTOR
+    return min(settings.ASR_POLL_MAX_SECONDS, max(settings.ASR_POLL_MIN_SECONDS, estimate))
+
+
+async def enqueue_asr_task(
+    db: AsyncSession,
+    user_id: str,
+    audio_url: str,
+    attachment: Optional[Attachment] = None,
+) -> AsrTask:
+    """创建识别任务并唤醒轮询器（附件已有未完成的任务时直接返回该任务）"""
+    if attachment is not None:
+        result = await db.execute(
+            select(AsrTask)
+            .where(AsrTask.attachment_id == attachment.id, AsrTask.status.in_(ACTIVE_STATUSES))
+            .limit(1)
+        )
+        task = result.scalar_one_or_none()
+        if task:
+            return task
+
+    task = AsrTask(
+        user_id=user_id,
+        attachment_id=attachment.id if attachment is not None else None,
+        audio_url=audio_url,
+        engine_model=settings.ASR_ENGINE_MODEL,
+        next_poll_at=datetime.utcnow(),
+    )
+    db.add(task)
+    await db.commit()
+    await db.refresh(task)
+
+    asr_poller.notify()
+    return task
+
+
+class AsrPoller:
+    """识别任务轮询器（每个进程一个，同一时刻只有一个实例在执行）"""
+
+    def __init__(self, client=None):
+        # 未指定时使用 get_asr_client()（测试可注入模拟客户端）
+        self._client = client
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._listeners: Dict[str, Set[asyncio.Event]] = {}
+
+    @property
+    def client(self):
+        return self._client or get_asr_client()
+
+    def start(self):
+        """启动轮询（在应用 lifespan 中调用）"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def notify(self):
+        """有新任务时唤醒轮询器"""
+        self._wakeup.set()
+
+    @contextlib.contextmanager
+    def listen(self, task_id: str):
+        """订阅任务状态变化，返回在状态变化时被 set 的 Event"""
+        event = asyncio.Event()
+        self._listeners.setdefault(task_id, set()).add(event)
+        try:
+            yield event
+        finally:
+            listeners = self._listeners.get(task_id)
+            if listeners is not None:
+                listeners.discard(event)
+                if not listeners:
+                    del self._listeners[task_id]
+
+    def _publish(self, task_ids: List[str]):
+        for task_id in task_ids:
+            for event in self._listeners.get(task_id, ()):
+                event.set()
+
+    async def _run(self):
+        while True:
+            delay = settings.ASR_POLL_MIN_SECONDS
+            try:
+                async with advisory_lock(ASR_LOCK_NAME) as acquired:
+                    if acquired:
+                        delay = await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ASR Poller Error] {str(e)}")
+            self._wakeup.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+
+    async def tick(self, now: Optional[datetime] = None) -> float:
+        """执行一轮提交与查询，返回到下一轮的等待秒数"""
+        now = now or datetime.utcnow()
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(AsrTask)
+                .where(AsrTask.status.in_(ACTIVE_STATUSES), AsrTask.next_poll_at <= now)
+                .order_by(AsrTask.next_poll_at)
+                .limit(settings.ASR_POLL_BATCH_SIZE)
+            )
+            tasks = result.scalars().all()
+            durations = await self._attachment_durations(
+                session, [task.attachment_id for task in tasks if task.provider_task_id is None]
+            )
+            # 调用腾讯云期间不占用数据库事务
+            await session.commit()
+
+            changed = []
+            if tasks:
+                outcomes = await self._call(tasks)
+                texts: Dict[str, str] = {}
+                for task, (value, error) in zip(tasks, outcomes):
+                    status = task.status
+                    if error is not None:
+                        self._retry(task, error, now)
+                    elif isinstance(value, AsrResult):
+                        self._apply(task, value, now)
+                    else:
+                        task.provider_task_id = value
+                        task.status = "running"
+                        task.attempts = 0
+                        task.next_poll_at = now + timedelta(
+                            seconds=first_poll_delay(durations.get(task.attachment_id, 0))
+                        )
+                    if task.status != status:
+                        changed.append(task.id)
+                    if task.status == "completed" and task.attachment_id:
+                        texts[task.attachment_id] = task.result_text
+                if texts:
+                    table = Attachment.__table__
+                    await session.execute(
+                        update(table)
+                        .where(table.c.id == bindparam("b_id"))
+                        .values(asr_text=bindparam("b_text"), updated_at=now),
+                        [
+                            {"b_id": attachment_id, "b_text": text}
+                            for attachment_id, text in texts.items()
+                        ],
+                    )
+                await session.commit()
+
+            if len(tasks) >= settings.ASR_POLL_BATCH_SIZE:
+                # 还有到期的任务，立即进行下一轮
+                delay = 0.0
+            else:
+                result = await session.execute(
+                    select(func.min(AsrTask.next_poll_at)).where(AsrTask.status.in_(ACTIVE_STATUSES))
+                )
+                earliest = result.scalar()
+                delay = settings.ASR_IDLE_SECONDS
+                if earliest is not None:
+                    delay = min(delay, max(0.0, (earliest - now).total_seconds()))
+
+        self._publish(changed)
+        return delay
+
+    async def _attachment_durations(
+        self, session: AsyncSession, attachment_ids: List[str]
+    ) -> Dict[str, int]:
+        attachment_ids = [i for i in attachment_ids if i]
+        if not attachment_ids:
+            return {}
+        result = await session.execute(
+            select(Attachment.id, Attachment.duration).where(Attachment.id.in_(attachment_ids))
+        )
+        return {row.id: row.duration or 0 for row in result.all()}
+
+    async def _call(self, tasks: List[AsrTask]) -> list:
+        """并发提交 / 查询一批任务，返回 [(结果, 异常)]"""
+        semaphore = asyncio.Semaphore(max(1, settings.ASR_POLL_CONCURRENCY))
+        client = self.client
+
+        async def call(task: AsrTask):
+            async with semaphore:
+                try:
+                    if task.provider_task_id is None:
+                        return await client.create_task(task.audio_url, task.engine_model), None
+                    return await client.describe_task(task.provider_task_id), None
+                except Exception as e:
+                    return None, e
+
+        return await asyncio.gather(*(call(task) for task in tasks))
+
+    def _apply(self, task: AsrTask, result: AsrResult, now: datetime):
+        task.attempts = 0
+        if result.duration:
+            task.audio_duration = result.duration
+        if result.status == "completed":
+            task.status = "completed"
+            task.result_text = result.text
+            task.finished_at = now
+        elif result.status == "failed":
+            task.status = "failed"
+            task.last_error = (result.error or "识别失败")[:1000]
+            task.finished_at = now
+        elif task.created_at and now - task.created_at > timedelta(
+            hours=settings.ASR_TASK_TIMEOUT_HOURS
+        ):
+            task.status = "failed"
+            task.last_error = "识别超时"
+            task.finished_at = now
+        else:
+            task.polls += 1
+            task.next_poll_at = now + timedelta(seconds=poll_interval(task.polls))
+
+    def _retry(self, task: AsrTask, error: Exception, now: datetime):
+        """调用失败：按指数退避重试，连续失败超过上限后标记为失败"""
+        task.attempts += 1
+        task.last_error = str(error)[:1000]
+        if task.attempts >= settings.ASR_MAX_ATTEMPTS:
+            task.status = "failed"
+            task.finished_at = now
+        else:
+            task.next_poll_at = now + timedelta(seconds=poll_interval(task.attempts))
+
+
+asr_poller = AsrPoller()
@@ -0,0 +1,163 @@
+"""内容寻址的附件存储（按 SHA-256 去重）
+
+- 经服务端流式上传的文件边读边计算 SHA-256，写入后按哈希登记 blob：
+  内容已存在时附件引用已有对象，刚写入的重复对象随即删除
+- 附件的 blob_sha256 指向共享的 blob，blob.ref_count 为引用它的附件数；
+  删除附件只减少引用计数，归零超过宽限期的 blob 由存储清理任务删除对象
+- 秒传：客户端先提交哈希，当前用户已有同内容的附件时直接创建附件，不必再上传
+  （只对用户已拥有的内容生效，不能凭哈希取得他人的文件）
+可续传上传与直传的完整内容不经过服务端，哈希无法校验，不参与去重。
+"""
+
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, exists, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Attachment, Blob
+from app.services.media import derivative_keys
+from app.services.storage import delete_many_from_cos, object_key_from_url
+
+
+async def register_blob(
+    db: AsyncSession, sha256: str, key: str, size: int, mime_type: str
+) -> str:
+    """登记刚写入的对象并增加一次引用（不提交事务）
+
+    Returns:
+        附件应使用的对象 key：内容已存在时为已有 blob 的 key，调用方应删除刚写入的对象
+    """
+    now = datetime.utcnow()
+    statement = (
+        insert(Blob)
+        .values(
+            sha256=sha256, object_key=key, size=size, mime_type=mime_type,
+            ref_count=1, created_at=now, updated_at=now,
+        )
+        .on_conflict_do_update(
+            index_elements=[Blob.sha256],
+            set_={"ref_count": Blob.ref_count + 1, "updated_at": now},
+        )
+        .returning(Blob.object_key)
+    )
+    result = await db.execute(statement)
+    return result.scalar_one()
+
+
+async def reuse_blob(
+    db: AsyncSession, user_id: str, sha256: str, size: int, mime_type: str
+) -> Optional[str]:
+    """秒传：用户已有该内容的附件时增加一次引用并返回对象 key，否则返回 None（不提交事务）"""
+    owned = exists().where(Attachment.user_id == user_id, Attachment.blob_sha256 == sha256)
+    result = await db.execute(
+        update(Blob)
+        .where(
+            Blob.sha256 == sha256,
+            Blob.size == size,
+            Blob.mime_type == mime_type,
+            Blob.ref_count > 0,
+            owned,
+        )
+        .values(ref_count=Blob.ref_count + 1, updated_at=datetime.utcnow())
+        .returning(Blob.object_key)
+    )
+    return result.scalar_one_or_none()
+
+
+async def release_blobs(db: AsyncSession, hashes: List[Optional[str]]):
+    """附件删除后减少 blob 引用计数（一条 executemany，不提交事务）"""
+    counts = Counter(sha256 for sha256 in hashes if sha256)
+    if not counts:
+        return
+    table = Blob.__table__
+    now = datetime.utcnow()
+    await db.execute(
+        update(table)
+        .where(table.c.sha256 == bindparam("b_sha256"))
+        .values(ref_count=table.c.ref_count - bindparam("b_count"), updated_at=bindparam("b_now")),
+        [{"b_sha256": sha256, "b_count": count, "b_now": now} for sha256, count in counts.items()],
+    )
+
+
+async def remove_attachments(db: AsyncSession, rows: list) -> List[str]:
+    """删除附件记录及其存储（不提交事务）
+
+    rows 需包含 id、url、blob_sha256：共享 blob 的附件只减少引用计数，
+    独占对象先删除对象，删除失败的附件记录保留待重试。
+
+    Returns:
+        已删除的附件 id
+    """
+    keys = {row.id: object_key_from_url(row.url) for row in rows if not row.blob_sha256}
+    originals = {key for key in keys.values() if key}
+    # 缩略图与原对象一起删除
+    derived = [derived for key in originals for derived in derivative_keys(key)]
+    removed = set(await delete_many_from_cos(list(originals) + derived))
+    # 不属于当前存储的 URL 没有对象可删，只删除记录
+    done = [
+        row.id for row in rows
+        if row.blob_sha256 or keys[row.id] is None or keys[row.id] in removed
+    ]
+    if done:
+        done_ids = set(done)
+        await db.execute(delete(Attachment).where(Attachment.id.in_(done)))
+        await release_blobs(db, [row.blob_sha256 for row in rows if row.id in done_ids])
+    return done
+
+
+async def collect_blobs(
+    batch_size: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, float]:
+    """删除引用计数归零超过宽限期的 blob 对象，返回统计
+
+    锁定候选行（跳过正被上传登记的行），并再次确认没有附件引用，防止计数偏差误删。
+    """
+    batch_size = batch_size or settings.STORAGE_GC_BATCH_SIZE
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=settings.STORAGE_GC_GRACE_HOURS)
+    started = time.perf_counter()
+    stats = {"scanned": 0, "deleted": 0, "failed": 0, "bytes": 0}
+    last_sha = ""
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Blob.sha256, Blob.object_key, Blob.size)
+                .where(
+                    Blob.ref_count <= 0,
+                    Blob.updated_at < cutoff,
+                    Blob.sha256 > last_sha,
+                    ~exists().where(Attachment.blob_sha256 == Blob.sha256),
+                )
+                .order_by(Blob.sha256)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            last_sha = rows[-1].sha256
+            stats["scanned"] += len(rows)
+
+            derived = [derived for row in rows for derived in derivative_keys(row.object_key)]
+            removed = set(await delete_many_from_cos([row.object_key for row in rows] + derived))
+            done = [row for row in rows if row.object_key in removed]
+            if done:
+                await session.execute(
+                    delete(Blob).where(Blob.sha256.in_([row.sha256 for row in done]))
+                )
+            await session.commit()
+            stats["deleted"] += len(done)
+            stats["failed"] += len(rows) - len(done)
+            stats["bytes"] += sum(row.size for row in done)
+        if len(rows) < batch_size:
+            break
+        await asyncio.sleep(0)
+    stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
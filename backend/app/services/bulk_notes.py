@@ -0,0 +1,252 @@
+"""笔记批量操作
+
+每个批量操作在调用方的一个事务内完成，SQL 次数与笔记数量无关：
+1. 一次查询取出全部目标笔记并加行锁（按 id 顺序加锁，避免并发批量操作互相死锁），
+   逐条校验归属与乐观锁版本号
+2. 对通过校验的笔记执行集合式 UPDATE / DELETE / INSERT，
+   各笔记内容不同的更新按字段组合分组后用 executemany 一次发送
+每条笔记返回独立的结果，部分笔记失败不影响其余笔记。
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import lazyload
+
+from app.core.response import ResponseCode
+from app.models import Note, NoteTag, Tag
+from app.services.indexing import mark_embeddings_deleted
+from app.services.text_search import body_text, bound_search_vector, search_vector_params
+from app.services.version_store import snapshots_before_update
+
+# 批量更新可修改的字段
+UPDATABLE_FIELDS = ("title", "content", "json_content", "is_pinned")
+
+
+def note_content_changed(data, note: Note) -> bool:
+    """更新请求是否修改了笔记内容（需要保存版本、重建索引）"""
+    return (
+        (data.title is not None and data.title != note.title) or
+        (data.content is not None and data.content != note.content) or
+        (data.json_content is not None and data.json_content != str(note.json_content))
+    )
+
+
+class BulkResult:
+    """批量操作结果，按请求顺序保存每条笔记的结果"""
+
+    def __init__(self):
+        self.items: Dict[str, dict] = {}
+        self.changed_ids: List[str] = []  # 内容有变化、需要重嵌入的笔记
+
+    def ok(self, note_id: str, **extra):
+        self.items[note_id] = {"id": note_id, "code": ResponseCode.SUCCESS, "message": "", **extra}
+
+    def fail(self, note_id: str, code: int, message: str, **extra):
+        self.items[note_id] = {"id": note_id, "code": code, "message": message, **extra}
+
+    @property
+    def succeeded(self) -> List[str]:
+        return [i for i, item in self.items.items() if item["code"] == ResponseCode.SUCCESS]
+
+    def to_dict(self) -> dict:
+        succeeded = len(self.succeeded)
+        return {
+            "results": list(self.items.values()),
+            "succeeded": succeeded,
+            "failed": len(self.items) - succeeded,
+        }
+
+
+def duplicate_ids(targets: Sequence) -> List[str]:
+    """请求中重复出现的笔记 id"""
+    seen: Set[str] = set()
+    duplicates = []
+    for target in targets:
+        if target.id in seen:
+            duplicates.append(target.id)
+        seen.add(target.id)
+    return duplicates
+
+
+async def _claim_notes(
+    db: AsyncSession,
+    user_id: str,
+    targets: Sequence,
+    trashed: bool = False,
+    entity: bool = False,
+) -> Tuple[Dict[str, object], BulkResult]:
+    """锁定并校验目标笔记
+
+    Args:
+        targets: 带 id、version 的请求项（version 为 None 时不校验）
+        trashed: 操作回收站中的笔记（否则只操作未删除的笔记）
+        entity: 加载完整笔记（否则只读取 id / user_id / version）
+
+    Returns:
+        (通过校验的笔记 {id: 笔记}, 已填入成功 / 失败状态的结果)
+    """
+    ids = [target.id for target in targets]
+    in_trash = Note.deleted_at.isnot(None) if trashed else Note.deleted_at.is_(None)
+    if entity:
+        query = select(Note).options(lazyload("*"))
+    else:
+        query = select(Note.id, Note.user_id, Note.version)
+    result = await db.execute(
+        query.where(Note.id.in_(ids), in_trash).order_by(Note.id).with_for_update()
+    )
+    rows = result.scalars().all() if entity else result.all()
+    found = {row.id: row for row in rows}
+
+    outcome = BulkResult()
+    accepted = {}
+    for target in targets:
+        row = found.get(target.id)
+        if row is None:
+            message = "笔记不存在或未被删除" if trashed else "笔记不存在"
+            outcome.fail(target.id, ResponseCode.NOT_FOUND, message)
+        elif row.user_id != user_id:
+            outcome.fail(target.id, ResponseCode.FORBIDDEN, "无权限操作")
+        elif target.version is not None and target.version != row.version:
+            outcome.fail(
+                target.id, ResponseCode.VERSION_CONFLICT, "版本冲突，请刷新后重试",
+                version=row.version,
+            )
+        else:
+            accepted[target.id] = row
+            outcome.ok(target.id, version=row.version)
+    return accepted, outcome
+
+
+async def bulk_set_deleted(
+    db: AsyncSession, user_id: str, targets: Sequence, deleted: bool
+) -> BulkResult:
+    """批量移入回收站 / 从回收站恢复（不提交事务）"""
+    accepted, outcome = await _claim_notes(db, user_id, targets, trashed=not deleted)
+    if accepted:
+        ids = list(accepted)
+        await db.execute(
+            update(Note)
+            .where(Note.id.in_(ids))
+            .values(deleted_at=datetime.utcnow() if deleted else None)
+            .execution_options(synchronize_session=False)
+        )
+        await mark_embeddings_deleted(db, ids, deleted)
+    return outcome
+
+
+async def bulk_pin(
+    db: AsyncSession, user_id: str, targets: Sequence, is_pinned: bool
+) -> BulkResult:
+    """批量置顶 / 取消置顶，版本号递增（不提交事务）"""
+    accepted, outcome = await _claim_notes(db, user_id, targets)
+    if accepted:
+        await db.execute(
+            update(Note)
+            .where(Note.id.in_(list(accepted)))
+            .values(is_pinned=is_pinned, version=Note.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        for note_id, row in accepted.items():
+            outcome.ok(note_id, version=row.version + 1)
+    return outcome
+
+
+async def owned_tag_ids(db: AsyncSession, user_id: str, tag_ids: List[str]) -> Set[str]:
+    """属于当前用户的标签 id"""
+    if not tag_ids:
+        return set()
+    result = await db.execute(
+        select(Tag.id).where(Tag.id.in_(tag_ids), Tag.user_id == user_id)
+    )
+    return set(result.scalars().all())
+
+
+async def bulk_tag(
+    db: AsyncSession,
+    user_id: str,
+    targets: Sequence,
+    add_tag_ids: List[str],
+    remove_tag_ids: List[str],
+) -> BulkResult:
+    """批量添加 / 移除标签，标签归属由调用方校验（不提交事务）"""
+    accepted, outcome = await _claim_notes(db, user_id, targets)
+    if not accepted:
+        return outcome
+    ids = list(accepted)
+
+    if remove_tag_ids:
+        await db.execute(
+            delete(NoteTag).where(NoteTag.note_id.in_(ids), NoteTag.tag_id.in_(remove_tag_ids))
+        )
+    if add_tag_ids:
+        result = await db.execute(
+            select(NoteTag.note_id, NoteTag.tag_id).where(
+                NoteTag.note_id.in_(ids), NoteTag.tag_id.in_(add_tag_ids)
+            )
+        )
+        existing = set(result.all())
+        rows = [
+            {"note_id": note_id, "tag_id": tag_id}
+            for note_id in ids
+            for tag_id in add_tag_ids
+            if (note_id, tag_id) not in existing
+        ]
+        if rows:
+            await db.execute(insert(NoteTag), rows)
+    return outcome
+
+
+def _update_statement(fields: Tuple[str, ...], reindex: bool):
+    """按 id 更新指定字段的 executemany 语句（参数名加 b_ 前缀，避免与列名冲突）"""
+    table = Note.__table__
+    values = {field: bindparam(f"b_{field}") for field in fields}
+    values["version"] = bindparam("b_version")
+    values["updated_at"] = bindparam("b_updated_at")
+    if reindex:
+        values["search_vector"] = bound_search_vector()
+    return update(table).where(table.c.id == bindparam("b_id")).values(**values)
+
+
+async def bulk_update(db: AsyncSession, user_id: str, items: Sequence) -> BulkResult:
+    """批量更新笔记内容（不提交事务）
+
+    与单篇更新相同：校验乐观锁、内容变化时先保存版本（连续编辑合并）、版本号递增。
+    """
+    accepted, outcome = await _claim_notes(db, user_id, items, entity=True)
+    if not accepted:
+        return outcome
+
+    edits: List[Tuple[Note, Optional[str]]] = []
+    groups: Dict[Tuple[Tuple[str, ...], bool], List[dict]] = {}
+    now = datetime.utcnow()
+    for item in items:
+        note = accepted.get(item.id)
+        if note is None:
+            continue
+        values = {
+            field: getattr(item, field)
+            for field in UPDATABLE_FIELDS
+            if getattr(item, field) is not None
+        }
+        changed = note_content_changed(item, note)
+        params = {f"b_{field}": value for field, value in values.items()}
+        params.update(b_id=note.id, b_version=note.version + 1, b_updated_at=now)
+        if changed:
+            edits.append((note, item.session_id))
+            outcome.changed_ids.append(note.id)
+            body = body_text(
+                values.get("content", note.content),
+                values.get("json_content", note.json_content),
+            )
+            params.update(search_vector_params(values.get("title", note.title), body))
+        groups.setdefault((tuple(sorted(values)), changed), []).append(params)
+        outcome.ok(note.id, version=note.version + 1, updated_at=now.isoformat())
+
+    # 版本快照基于修改前的内容（笔记对象本身不修改，更新全部走下面的语句）
+    db.add_all(await snapshots_before_update(db, edits))
+    for (fields, reindex), rows in groups.items():
+        await db.execute(_update_statement(fields, reindex), rows)
+    return outcome
@@ -1,10 +1,10 @@
 """DeepSeek AI 服务"""
 
+import json
 from typing import AsyncGenerator
 
-import httpx
-
 from app.core.config import settings
+from app.services.http_client import get_http_client, request_timeout
 
 
 async def call_summary(content: str, max_length: int = 200) -> str:
@@ -23,23 +23,20 @@ async def call_summary(content: str, max_length: int = 200) -> str:
 
     prompt = f"请为以下内容生成一个简洁的摘要，不超过{max_length}字：\n\n{content}"
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            f"{settings.DEEPSEEK_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": settings.DEEPSEEK_MODEL,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": max_length * 2,
-            },
-        )
-        response.raise_for_status()
-        data = response.json()
+    client = get_http_client("deepseek")
+    response = await client.post(
+        "/chat/completions",
+        json={
+            "model": settings.DEEPSEEK_MODEL,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_length * 2,
+        },
+        timeout=request_timeout(30.0),
+    )
+    response.raise_for_status()
+    data = response.json()
 
     if data.get("choices") and len(data["choices"]) > 0:
         return data["choices"][0]["message"]["content"]
@@ -60,21 +57,18 @@ async def call_chat(messages: list, max_tokens: int = 1000) -> str:
     if not settings.DEEPSEEK_API_KEY:
         return "[AI 模拟回复] 这是 AI 的回复内容"
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(
-            f"{settings.DEEPSEEK_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": settings.DEEPSEEK_MODEL,
-                "messages": messages,
-                "max_tokens": max_tokens,
-            },
-        )
-        response.raise_for_status()
-        data = response.json()
+    client = get_http_client("deepseek")
+    response = await client.post(
+        "/chat/completions",
+        json={
+            "model": settings.DEEPSEEK_MODEL,
+            "messages": messages,
+            "max_tokens": max_tokens,
+        },
+        timeout=request_timeout(60.0),
+    )
+    response.raise_for_status()
+    data = response.json()
 
     if data.get("choices") and len(data["choices"]) > 0:
         return data["choices"][0]["message"]["content"]
@@ -99,36 +93,32 @@ async def call_chat_stream(messages: list, max_tokens: int = 1000) -> AsyncGener
             yield char
         return
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        async with client.stream(
-            "POST",
-            f"{settings.DEEPSEEK_BASE_URL}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": settings.DEEPSEEK_MODEL,
-                "messages": messages,
-                "max_tokens": max_tokens,
-                "stream": True,
-            },
-        ) as response:
-            response.raise_for_status()
-            
-            async for line in response.aiter_lines():
-                if line.startswith("data: "):
-                    data_str = line[6:]
-                    if data_str == "[DONE]":
-                        break
-                    
-                    try:
-                        import json
-                        data = json.loads(data_str)
-                        if data.get("choices") and len(data["choices"]) > 0:
-                            delta = data["choices"][0].get("delta", {})
-                            content = delta.get("content", "")
-                            if content:
-                                yield content
-                    except Exception:
-                        continue
+    client = get_http_client("deepseek")
+    async with client.stream(
+        "POST",
+        "/chat/completions",
+        json={
+            "model": settings.DEEPSEEK_MODEL,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "stream": True,
+        },
+        timeout=request_timeout(120.0),
+    ) as response:
+        response.raise_for_status()
+        
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                data_str = line[6:]
+                if data_str == "[DONE]":
+                    break
+                
+                try:
+                    data = json.loads(data_str)
+                    if data.get("choices") and len(data["choices"]) > 0:
+                        delta = data["choices"][0].get("delta", {})
+                        content = delta.get("content", "")
+                        if content:
+                            yield content
+                except Exception:
+                    continue
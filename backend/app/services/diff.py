@@ -0,0 +1,409 @@
+"""版本差异计算
+
+- Myers O(ND) 差异算法（先去掉相同的首尾），编辑距离超过上限时整体替换，耗时有界
+- 文本按行比较后，在改动的行内再按词（中日韩文字按单字）或按字符细化
+- Tiptap JSON 按顶层块做结构化比较，修改过的块给出块内的词级差异
+- 版本内容不可变，结果按 (版本 A, 版本 B, 粒度) 缓存
+"""
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.tiptap import document_text
+
+# 中日韩文字逐字切分，其他文字按单词、空白和标点切分
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_WORD_RE = re.compile(rf"[{_CJK}]|[^\W{_CJK}_]+|\s+|.", re.DOTALL)
+
+GRANULARITIES = ("word", "char", "line")
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def tokenize(text: str, granularity: str = "word") -> List[str]:
+    if granularity == "char":
+        return list(text)
+    if granularity == "line":
+        return text.splitlines(keepends=True)
+    return _WORD_RE.findall(text)
+
+
+def _myers(a: list, b: list, max_edits: int) -> Optional[List[Opcode]]:
+    """Myers 差异算法，返回 difflib 格式的操作码；编辑距离超过 max_edits 时返回 None"""
+    # 相同的首尾不参与搜索
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    a_mid = a[prefix:len(a) - suffix]
+    b_mid = b[prefix:len(b) - suffix]
+
+    # 元素映射为整数，比较更快
+    ids: dict = {}
+    xs = [ids.setdefault(token, len(ids)) for token in a_mid]
+    ys = [ids.setdefault(token, len(ids)) for token in b_mid]
+    n, m = len(xs), len(ys)
+
+    moves = []  # 从末尾回溯得到的 (x, y) 路径点
+    if n and m:
+        max_d = min(n + m, max_edits)
+        offset = max_d + 1
+        v = [0] * (2 * max_d + 3)
+        # trace[d] 保存第 d 轮开始前 k ∈ [-d-1, d+1] 的 V，按 k + d + 1 索引
+        trace = []
+        found = False
+        for d in range(max_d + 1):
+            trace.append(v[offset - d - 1:offset + d + 2])
+            for k in range(-d, d + 1, 2):
+                if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                    x = v[offset + k + 1]
+                else:
+                    x = v[offset + k - 1] + 1
+                y = x - k
+                while x < n and y < m and xs[x] == ys[y]:
+                    x += 1
+                    y += 1
+                v[offset + k] = x
+                if x >= n and y >= m:
+                    found = True
+                    break
+            if found:
+                break
+        if not found:
+            return None
+
+        # 回溯编辑路径
+        x, y = n, m
+        for d in range(len(trace) - 1, 0, -1):
+            v = trace[d]
+            k = x - y
+            if k == -d or (k != d and v[k - 1 + d + 1] < v[k + 1 + d + 1]):
+                prev_k = k + 1
+            else:
+                prev_k = k - 1
+            prev_x = v[prev_k + d + 1]
+            prev_y = prev_x - prev_k
+            while x > prev_x and y > prev_y:
+                x -= 1
+                y -= 1
+                moves.append(("equal", x, y))
+            if x == prev_x:
+                moves.append(("insert", x, prev_y))
+            else:
+                moves.append(("delete", prev_x, y))
+            x, y = prev_x, prev_y
+        while x > 0 and y > 0:
+            x -= 1
+            y -= 1
+            moves.append(("equal", x, y))
+        moves.reverse()
+    elif n:
+        moves = [("delete", i, 0) for i in range(n)]
+    elif m:
+        moves = [("insert", 0, j) for j in range(m)]
+
+    # 路径点合并为操作码，相邻的删除与插入合并为替换
+    opcodes: List[Opcode] = []
+    if prefix:
+        opcodes.append(("equal", 0, prefix, 0, prefix))
+    for tag, x, y in moves:
+        i, j = x + prefix, y + prefix
+        if tag == "equal":
+            step = (i, i + 1, j, j + 1)
+        elif tag == "delete":
+            step = (i, i + 1, j, j)
+        else:
+            step = (i, i, j, j + 1)
+        if opcodes:
+            last_tag, i1, i2, j1, j2 = opcodes[-1]
+            merged_tag = None
+            if last_tag == tag == "equal":
+                merged_tag = "equal"
+            elif tag != "equal" and last_tag != "equal":
+                merged_tag = "replace" if last_tag != tag or last_tag == "replace" else tag
+            if merged_tag and i2 == step[0] and j2 == step[2]:
+                opcodes[-1] = (merged_tag, i1, step[1], j1, step[3])
+                continue
+        opcodes.append((tag, *step))
+    if suffix:
+        i, j = len(a) - suffix, len(b) - suffix
+        opcodes.append(("equal", i, len(a), j, len(b)))
+    return opcodes
+
+
+def diff_sequences(a: list, b: list) -> List[Opcode]:
+    """比较两个序列；编辑距离超过 DIFF_MAX_EDITS 时视为整体替换"""
+    opcodes = _myers(a, b, settings.DIFF_MAX_EDITS)
+    if opcodes is not None:
+        return opcodes
+    prefix = 0
+    while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+        prefix += 1
+    result: List[Opcode] = []
+    if prefix:
+        result.append(("equal", 0, prefix, 0, prefix))
+    result.append(("replace", prefix, len(a), prefix, len(b)))
+    return result
+
+
+def _append(ops: list, op: str, text: str):
+    if not text:
+        return
+    if ops and ops[-1]["op"] == op:
+        ops[-1]["text"] += text
+    else:
+        ops.append({"op": op, "text": text})
+
+
+def diff_text(a: Optional[str], b: Optional[str], granularity: str = "word") -> List[dict]:
+    """文本差异：[{op: equal|delete|insert, text}]
+
+    先按行比较，再在替换的行块内按词 / 字符细化，长文本也只在改动处做细粒度比较。
+    """
+    a_lines = (a or "").splitlines(keepends=True)
+    b_lines = (b or "").splitlines(keepends=True)
+    ops: List[dict] = []
+    for tag, i1, i2, j1, j2 in diff_sequences(a_lines, b_lines):
+        old = "".join(a_lines[i1:i2])
+        new = "".join(b_lines[j1:j2])
+        if tag == "equal":
+            _append(ops, "equal", old)
+        elif tag == "replace" and granularity != "line":
+            old_tokens = tokenize(old, granularity)
+            new_tokens = tokenize(new, granularity)
+            for sub_tag, k1, k2, l1, l2 in diff_sequences(old_tokens, new_tokens):
+                if sub_tag == "equal":
+                    _append(ops, "equal", "".join(old_tokens[k1:k2]))
+                else:
+                    _append(ops, "delete", "".join(old_tokens[k1:k2]))
+                    _append(ops, "insert", "".join(new_tokens[l1:l2]))
+        else:
+            _append(ops, "delete", old)
+            _append(ops, "insert", new)
+    return ops
+
+
+def _format_range(start: int, stop: int) -> str:
+    # 与 difflib.unified_diff 的区间格式一致
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff(
+    a: Optional[str], b: Optional[str], fromfile: str = "", tofile: str = "", context: int = 3
+) -> List[str]:
+    """统一格式的行差异（与 difflib.unified_diff(..., lineterm="") 的输出格式相同）"""
+    a_lines = (a or "").splitlines()
+    b_lines = (b or "").splitlines()
+    opcodes = diff_sequences(a_lines, b_lines)
+    if not any(tag != "equal" for tag, *_ in opcodes):
+        return []
+
+    # 按上下文行数把操作码分组为 hunk（同 SequenceMatcher.get_grouped_opcodes）
+    if opcodes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if opcodes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal" and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+
+    lines = [f"--- {fromfile}", f"+++ {tofile}"]
+    for group in groups:
+        first, last = group[0], group[-1]
+        lines.append(
+            f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@"
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in a_lines[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                lines.extend("-" + line for line in a_lines[i1:i2])
+            if tag in ("replace", "insert"):
+                lines.extend("+" + line for line in b_lines[j1:j2])
+    return lines
+
+
+# ---------- Tiptap 结构化差异 ----------
+
+def _blocks(doc: Any) -> list:
+    if isinstance(doc, str):
+        try:
+            doc = json.loads(doc)
+        except json.JSONDecodeError:
+            return []
+    if not isinstance(doc, dict):
+        return []
+    content = doc.get("content")
+    if not isinstance(content, list):
+        return []
+    return [block for block in content if isinstance(block, dict)]
+
+
+def _block_key(block: dict) -> str:
+    return json.dumps(block, ensure_ascii=False, sort_keys=True)
+
+
+def diff_document(a: Any, b: Any, granularity: str = "word") -> List[dict]:
+    """按顶层块比较两个 Tiptap 文档
+
+    Returns:
+        [{op: equal, count} | {op: insert|delete, type, text} | {op: modify, type, changes}]，
+        相同类型的块一一替换时视为修改，给出块内文本差异
+    """
+    a_blocks = _blocks(a)
+    b_blocks = _blocks(b)
+    a_keys = [_block_key(block) for block in a_blocks]
+    b_keys = [_block_key(block) for block in b_blocks]
+    result: List[dict] = []
+    for tag, i1, i2, j1, j2 in diff_sequences(a_keys, b_keys):
+        if tag == "equal":
+            result.append({"op": "equal", "count": i2 - i1, "index_a": i1, "index_b": j1})
+            continue
+        old, new = a_blocks[i1:i2], b_blocks[j1:j2]
+        paired = 0
+        if tag == "replace":
+            while (
+                paired < min(len(old), len(new))
+                and old[paired].get("type") == new[paired].get("type")
+            ):
+                result.append({
+                    "op": "modify",
+                    "type": new[paired].get("type"),
+                    "index_a": i1 + paired,
+                    "index_b": j1 + paired,
+                    "changes": diff_text(
+                        document_text(old[paired]), document_text(new[paired]), granularity
+                    ),
+                })
+                paired += 1
+        for offset, block in enumerate(old[paired:], start=paired):
+            result.append({
+                "op": "delete",
+                "type": block.get("type"),
+                "index_a": i1 + offset,
+                "text": document_text(block),
+            })
+        for offset, block in enumerate(new[paired:], start=paired):
+            result.append({
+                "op": "insert",
+                "type": block.get("type"),
+                "index_b": j1 + offset,
+                "text": document_text(block),
+            })
+    return result
+
+
+def diff_stats(changes: List[dict]) -> dict:
+    """文本差异的字符统计"""
+    inserted = sum(len(op["text"]) for op in changes if op["op"] == "insert")
+    deleted = sum(len(op["text"]) for op in changes if op["op"] == "delete")
+    return {"inserted_chars": inserted, "deleted_chars": deleted}
+
+
+def compact_changes(changes: List[dict], context: int) -> List[dict]:
+    """把较长的相同片段折叠为首尾各 context 个字符（不返回正文时使用）"""
+    result = []
+    for op in changes:
+        text = op["text"]
+        if op["op"] == "equal" and len(text) > context * 2:
+            result.append({
+                "op": "equal",
+                "text": text[:context] + text[-context:],
+                "skipped": len(text) - context * 2,
+            })
+        else:
+            result.append(op)
+    return result
+
+
+# ---------- 缓存 ----------
+
+class _DiffCache:
+    """差异结果的 LRU 缓存"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: dict):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+diff_cache = _DiffCache(settings.DIFF_CACHE_SIZE)
+
+
+def diff_snapshots(
+    key: tuple,
+    old: dict,
+    new: dict,
+    fromfile: str,
+    tofile: str,
+    granularity: str = "word",
+) -> dict:
+    """比较两个内容快照 {title, content, json_content}，结果按 key 缓存
+
+    key 必须唯一确定两侧内容（版本 ID；当前笔记需带上其版本号）。
+    """
+    cache_key = (*key, granularity)
+    cached = diff_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    changes = diff_text(old["content"], new["content"], granularity)
+    result = {
+        "title_changed": old["title"] != new["title"],
+        "content_changed": old["content"] != new["content"],
+        "diff": unified_diff(old["content"], new["content"], fromfile, tofile),
+        "changes": changes,
+        "blocks": diff_document(old["json_content"], new["json_content"], granularity),
+        "stats": diff_stats(changes),
+    }
+    diff_cache.put(cache_key, result)
+    return result
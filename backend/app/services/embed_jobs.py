@@ -0,0 +1,271 @@
+"""批量嵌入任务队列
+
+任务持久化在 embedding_jobs 表中，由应用启动时创建的 worker 池执行：
+- 认领使用 FOR UPDATE SKIP LOCKED + 租约，多副本部署下同一任务只会被一个 worker 执行
+- 每次认领生成新的令牌，写入前加行锁确认令牌未变，租约过期被接手后旧 worker 不再写入
+- 按笔记 ID 升序分页处理，跨笔记收集待嵌入的文本块，按服务商限制打包请求
+- 每页提交后写入检查点，崩溃、重启或租约过期后从检查点继续
+- 失败按指数退避重试，连续失败超过上限后标记为 failed
+"""
+
+import asyncio
+import contextlib
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import select, update, or_, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Note, EmbeddingJob
+from app.services.embedding import embed_texts
+from app.services.indexing import plan_notes_embeddings, apply_note_embeddings
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+async def enqueue_embedding_job(
+    db: AsyncSession, user_id: str, force: bool = False
+) -> EmbeddingJob:
+    """创建批量嵌入任务（用户已有未完成任务时直接返回该任务）"""
+    result = await db.execute(
+        select(EmbeddingJob)
+        .where(EmbeddingJob.user_id == user_id, EmbeddingJob.status.in_(ACTIVE_STATUSES))
+        .order_by(EmbeddingJob.created_at.desc())
+        .limit(1)
+    )
+    job = result.scalar_one_or_none()
+    if job:
+        return job
+
+    total_result = await db.execute(
+        select(func.count()).select_from(Note).where(
+            Note.user_id == user_id,
+            Note.deleted_at.is_(None),
+        )
+    )
+    job = EmbeddingJob(
+        user_id=user_id,
+        force=force,
+        total_notes=total_result.scalar() or 0,
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+
+    embedding_job_worker.notify()
+    return job
+
+
+class EmbeddingJobWorker:
+    """嵌入任务 worker 池"""
+
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def start(self, concurrency: Optional[int] = None):
+        """启动 worker（在应用 lifespan 中调用）"""
+        concurrency = concurrency or settings.EMBED_JOB_WORKERS
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(concurrency)]
+
+    async def stop(self):
+        """停止所有 worker，正在执行的任务释放回队列"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    def notify(self):
+        """有新任务时唤醒空闲 worker"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                claim = await self._claim()
+            except Exception as e:
+                print(f"[Embed Job Error] 认领任务失败: {str(e)}")
+                claim = None
+
+            if claim is None:
+                self._wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), settings.EMBED_JOB_POLL_SECONDS)
+                continue
+
+            await self._execute(*claim)
+
+    async def _claim(self) -> Optional[tuple]:
+        """认领一个可执行的任务：待执行且到期，或租约已过期，返回 (任务 ID, 认领令牌)"""
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        async with AsyncSessionLocal() as session:
+            candidate = (
+                select(EmbeddingJob.id)
+                .where(
+                    or_(
+                        and_(EmbeddingJob.status == "pending", EmbeddingJob.run_after <= now),
+                        and_(EmbeddingJob.status == "running", EmbeddingJob.locked_until < now),
+                    )
+                )
+                .order_by(EmbeddingJob.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                update(EmbeddingJob)
+                .where(EmbeddingJob.id == candidate)
+                .values(
+                    status="running",
+                    locked_until=now + timedelta(seconds=settings.EMBED_JOB_LEASE_SECONDS),
+                    locked_by=token,
+                    started_at=func.coalesce(EmbeddingJob.started_at, now),
+                )
+                .returning(EmbeddingJob.id)
+            )
+            job_id = result.scalar_one_or_none()
+            await session.commit()
+            return (job_id, token) if job_id else None
+
+    async def _lock_owned(
+        self, session: AsyncSession, job_id: str, token: str
+    ) -> Optional[EmbeddingJob]:
+        """加行锁读取任务，仅在仍持有该令牌的租约时返回"""
+        result = await session.execute(
+            select(EmbeddingJob)
+            .where(
+                EmbeddingJob.id == job_id,
+                EmbeddingJob.status == "running",
+                EmbeddingJob.locked_by == token,
+            )
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+
+    async def _execute(self, job_id: str, token: str):
+        try:
+            while await self._process_page(job_id, token):
+                pass
+        except asyncio.CancelledError:
+            await self._release(job_id, token)
+            raise
+        except Exception as e:
+            print(f"[Embed Job Error] Job {job_id}: {str(e)}")
+            await self._fail(job_id, token, e)
+
+    async def _process_page(self, job_id: str, token: str) -> bool:
+        """处理下一页笔记并提交检查点，返回是否还有剩余
+
+        读取笔记、请求嵌入、写入结果分三步：请求嵌入服务期间不占用数据库连接。
+        """
+        async with AsyncSessionLocal() as session:
+            job = await session.get(EmbeddingJob, job_id)
+            if not job or job.status != "running" or job.locked_by != token:
+                return False
+
+            query = select(Note).where(
+                Note.user_id == job.user_id,
+                Note.deleted_at.is_(None),
+            )
+            if job.checkpoint_note_id:
+                query = query.where(Note.id > job.checkpoint_note_id)
+            result = await session.execute(
+                query.order_by(Note.id).limit(settings.EMBED_JOB_PAGE_SIZE)
+            )
+            notes = result.scalars().all()
+
+            if not notes:
+                job = await self._lock_owned(session, job_id, token)
+                if job is None:
+                    return False
+                job.status = "completed"
+                job.locked_until = None
+                job.locked_by = None
+                job.finished_at = datetime.utcnow()
+                await session.commit()
+                return False
+
+            # 跨笔记收集需要嵌入的文本块，一次性按服务商限制打包请求
+            plans = await plan_notes_embeddings(session, notes, force=job.force)
+            checkpoint_note_id = notes[-1].id
+
+        texts = [text for plan in plans for text in plan.texts_to_embed]
+        vectors = await embed_texts(texts) if texts else []
+
+        async with AsyncSessionLocal() as session:
+            # 嵌入请求期间租约可能已过期并被其他 worker 接手，确认仍持有租约后再写入；
+            # 行锁保证确认与提交检查点之间不会被接手
+            job = await self._lock_owned(session, job_id, token)
+            if job is None:
+                print(f"[Embed Job Error] Job {job_id}: 租约已失效，放弃本页结果")
+                return False
+
+            offset = 0
+            for plan in plans:
+                count = len(plan.to_embed)
+                stats = await apply_note_embeddings(
+                    session, plan, vectors[offset:offset + count]
+                )
+                offset += count
+                job.embedded_chunks += stats["embedded_count"]
+                job.reused_chunks += stats["reused_count"]
+
+            job.processed_notes += len(plans)
+            job.checkpoint_note_id = checkpoint_note_id
+            job.attempts = 0
+            job.last_error = None
+            job.locked_until = datetime.utcnow() + timedelta(
+                seconds=settings.EMBED_JOB_LEASE_SECONDS
+            )
+            await session.commit()
+            return True
+
+    async def _fail(self, job_id: str, token: str, error: Exception):
+        """记录失败，按指数退避重新排队或标记为失败（租约已被接手时不处理）"""
+        async with AsyncSessionLocal() as session:
+            job = await self._lock_owned(session, job_id, token)
+            if not job:
+                return
+            job.attempts += 1
+            job.last_error = str(error)[:1000]
+            job.locked_until = None
+            job.locked_by = None
+            if job.attempts >= settings.EMBED_JOB_MAX_ATTEMPTS:
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+            else:
+                delay = settings.EMBED_JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+                job.status = "pending"
+                job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            await session.commit()
+
+    async def _release(self, job_id: str, token: str):
+        """应用关闭时把任务放回队列，下次启动从检查点继续"""
+        with contextlib.suppress(Exception):
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(EmbeddingJob)
+                    .where(
+                        EmbeddingJob.id == job_id,
+                        EmbeddingJob.status == "running",
+                        EmbeddingJob.locked_by == token,
+                    )
+                    .values(
+                        status="pending",
+                        locked_until=None,
+                        locked_by=None,
+                        run_after=datetime.utcnow(),
+                    )
+                )
+                await session.commit()
+
+
+embedding_job_worker = EmbeddingJobWorker()
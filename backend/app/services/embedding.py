@@ -1,21 +1,33 @@
 """向量嵌入服务 - 使用 OpenAI Embedding API"""
 
+import asyncio
+import hashlib
 import re
+import time
+from array import array
+from collections import OrderedDict, deque
+from functools import lru_cache
 from typing import List, Optional, Tuple
 
-import httpx
 import tiktoken
 
 from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.http_client import get_http_client, request_timeout
+from app.services.tiptap import document_text
 
 
-def count_tokens(text: str, model: str = "text-embedding-3-small") -> int:
-    """计算文本 token 数量"""
+@lru_cache
+def _get_encoding(model: str) -> tiktoken.Encoding:
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        return tiktoken.encoding_for_model(model)
     except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(text))
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "text-embedding-3-small") -> int:
+    """计算文本 token 数量"""
+    return len(_get_encoding(model).encode(text))
 
 
 def chunk_text(
@@ -90,8 +102,133 @@ def chunk_text(
     return chunks
 
 
+def pack_vector(vector: List[float]) -> bytes:
+    """向量编码为 float32 二进制"""
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> List[float]:
+    """float32 二进制解码为向量"""
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """查询向量缓存
+    
+    以 (模型, 维度, 文本) 的 SHA-256 为键，两级存储：
+    - 进程内 LRU：有容量和 TTL 上限
+    - Redis：跨进程共享，Redis 不可用时自动降级并暂停一段时间
+    向量统一以 float32 二进制存储。
+    """
+
+    REDIS_PREFIX = "lifeos:emb:"
+    REDIS_RETRY_SECONDS = 30  # Redis 出错后暂停使用的时长
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items: OrderedDict[str, Tuple[float, bytes]] = OrderedDict()
+        self._redis_disabled_until = 0.0
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        """调用方需传入已规范化（去除首尾空白）的文本"""
+        model = f"{settings.OPENAI_EMBEDDING_MODEL}:{settings.OPENAI_EMBEDDING_DIMENSIONS}"
+        raw = f"{model}:{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, data = item
+        if expires_at < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return data
+
+    def _set_local(self, key: str, data: bytes):
+        self._items[key] = (time.monotonic() + self.ttl_seconds, data)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def _redis(self):
+        if not settings.EMBEDDING_CACHE_REDIS_ENABLED:
+            return None
+        if self._redis_disabled_until > time.monotonic():
+            return None
+        return get_redis()
+
+    def _redis_failed(self, e: Exception):
+        self.redis_errors += 1
+        self._redis_disabled_until = time.monotonic() + self.REDIS_RETRY_SECONDS
+        print(f"[Embedding Cache] Redis 不可用，暂时降级为进程内缓存: {str(e)}")
+
+    async def get(self, text: str) -> Optional[List[float]]:
+        key = self.make_key(text)
+        data = self._get_local(key)
+        if data is not None:
+            self.hits += 1
+            return unpack_vector(data)
+
+        redis = self._redis()
+        if redis is not None:
+            try:
+                data = await redis.get(self.REDIS_PREFIX + key)
+            except Exception as e:
+                self._redis_failed(e)
+                data = None
+            if data:
+                self.redis_hits += 1
+                self._set_local(key, data)
+                return unpack_vector(data)
+
+        self.misses += 1
+        return None
+
+    async def set(self, text: str, vector: List[float]):
+        key = self.make_key(text)
+        data = pack_vector(vector)
+        self._set_local(key, data)
+
+        redis = self._redis()
+        if redis is not None:
+            try:
+                await redis.set(
+                    self.REDIS_PREFIX + key, data, ex=settings.EMBEDDING_CACHE_REDIS_TTL_SECONDS
+                )
+            except Exception as e:
+                self._redis_failed(e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "redis_errors": self.redis_errors,
+        }
+
+
+embedding_cache = EmbeddingCache(
+    max_size=settings.EMBEDDING_CACHE_SIZE,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+)
+
+
 async def get_embedding(text: str) -> Optional[List[float]]:
-    """获取单个文本的向量嵌入
+    """获取单个文本的向量嵌入（优先读取查询向量缓存）
     
     Args:
         text: 要嵌入的文本
@@ -99,30 +236,42 @@ async def get_embedding(text: str) -> Optional[List[float]]:
     Returns:
         向量列表，失败返回 None
     """
-    if not text or not text.strip():
+    # 缓存键与 API 请求使用同一份规范化文本
+    text = (text or "").strip()
+    if not text:
         return None
     
+    cached = await embedding_cache.get(text)
+    if cached is not None:
+        return cached
+    
+    embedding = await _request_embedding(text)
+    # 未配置 API Key 时返回的是随机模拟向量，不写入缓存
+    if embedding is not None and settings.OPENAI_API_KEY:
+        await embedding_cache.set(text, embedding)
+    return embedding
+
+
+async def _request_embedding(text: str) -> Optional[List[float]]:
+    """调用 Embedding API 获取单个文本的向量"""
     if not settings.OPENAI_API_KEY:
         # 开发环境模拟 - 返回随机向量
         import random
         return [random.uniform(-1, 1) for _ in range(settings.OPENAI_EMBEDDING_DIMENSIONS)]
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{settings.OPENAI_BASE_URL}/embeddings",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": settings.OPENAI_EMBEDDING_MODEL,
-                    "input": text,
-                    "dimensions": settings.OPENAI_EMBEDDING_DIMENSIONS,
-                },
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client("openai")
+        response = await client.post(
+            "/embeddings",
+            json={
+                "model": settings.OPENAI_EMBEDDING_MODEL,
+                "input": text,
+                "dimensions": settings.OPENAI_EMBEDDING_DIMENSIONS,
+            },
+            timeout=request_timeout(30.0),
+        )
+        response.raise_for_status()
+        data = response.json()
         
         if data.get("data") and len(data["data"]) > 0:
             return data["data"][0]["embedding"]
@@ -134,6 +283,172 @@ async def get_embedding(text: str) -> Optional[List[float]]:
         return None
 
 
+async def _request_embeddings(texts: List[str]) -> List[List[float]]:
+    """单次调用 Embedding API 批量获取向量，失败时抛出异常"""
+    if not settings.OPENAI_API_KEY:
+        # 开发环境模拟
+        import random
+        return [
+            [random.uniform(-1, 1) for _ in range(settings.OPENAI_EMBEDDING_DIMENSIONS)]
+            for _ in texts
+        ]
+
+    client = get_http_client("openai")
+    response = await client.post(
+        "/embeddings",
+        json={
+            "model": settings.OPENAI_EMBEDDING_MODEL,
+            "input": texts,
+            "dimensions": settings.OPENAI_EMBEDDING_DIMENSIONS,
+        },
+        timeout=request_timeout(60.0),
+    )
+    response.raise_for_status()
+    data = response.json().get("data") or []
+    if len(data) != len(texts):
+        raise ValueError(f"Embedding API 返回 {len(data)} 条结果，期望 {len(texts)} 条")
+
+    data.sort(key=lambda item: item.get("index", 0))
+    return [item["embedding"] for item in data]
+
+
+class EmbeddingBatcher:
+    """跨调用方的 Embedding 微批处理器
+    
+    在一个很短的时间窗口内收集多个调用方提交的文本，按输入条数上限和
+    token 预算（count_tokens 计算）打包成一次 API 请求，再把向量分发回
+    各自等待的调用方。批量导入时吞吐随批大小扩展，而不是随请求数线性增长。
+    """
+
+    def __init__(
+        self,
+        window_ms: int,
+        max_inputs: int,
+        max_tokens: int,
+        max_concurrency: int,
+    ):
+        self.window = window_ms / 1000
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self._queue: deque = deque()  # (文本, token 数, Future)
+        self._queued_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._max_concurrency = max_concurrency
+        self.requests = 0
+        self.inputs = 0
+        self.errors = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """提交文本并等待向量，失败时抛出异常"""
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            tokens = count_tokens(text, settings.OPENAI_EMBEDDING_MODEL)
+            future = loop.create_future()
+            self._queue.append((text, tokens, future))
+            self._queued_tokens += tokens
+            futures.append(future)
+
+        if len(self._queue) >= self.max_inputs or self._queued_tokens >= self.max_tokens:
+            # 已凑满至少一批，立即发送满批，剩余部分等待窗口
+            self._flush(full_only=True)
+        if self._queue and self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    def _take_batch(self) -> List[Tuple[str, int, asyncio.Future]]:
+        """从队首取出不超过限制的一批（单条超出预算的文本单独成批）"""
+        batch = []
+        batch_tokens = 0
+        while self._queue and len(batch) < self.max_inputs:
+            tokens = self._queue[0][1]
+            if batch and batch_tokens + tokens > self.max_tokens:
+                break
+            batch.append(self._queue.popleft())
+            batch_tokens += tokens
+        self._queued_tokens -= batch_tokens
+        return batch
+
+    def _flush(self, full_only: bool = False):
+        if not full_only and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            if full_only and (
+                len(self._queue) < self.max_inputs and self._queued_tokens < self.max_tokens
+            ):
+                break
+            batch = self._take_batch()
+            task = asyncio.create_task(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: List[Tuple[str, int, asyncio.Future]]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async with self._semaphore:
+            self.requests += 1
+            self.inputs += len(batch)
+            try:
+                vectors = await _request_embeddings([text for text, _, _ in batch])
+            except Exception as e:
+                self.errors += 1
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        for (_, _, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def aclose(self):
+        """发送队列中剩余的文本并等待进行中的请求（应用关闭时调用）"""
+        self._flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "inputs": self.inputs,
+            "avg_batch_size": round(self.inputs / self.requests, 2) if self.requests else 0.0,
+            "queued": len(self._queue),
+            "inflight": len(self._inflight),
+            "errors": self.errors,
+        }
+
+
+embedding_batcher = EmbeddingBatcher(
+    window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+    max_inputs=settings.EMBEDDING_BATCH_MAX_INPUTS,
+    max_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+    max_concurrency=settings.EMBEDDING_BATCH_MAX_CONCURRENCY,
+)
+
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """批量获取向量嵌入，经微批处理器与其他调用方合并请求
+
+    与 get_embeddings_batch 不同，失败时直接抛出异常，便于调用方重试。
+
+    Args:
+        texts: 非空文本列表
+
+    Returns:
+        与输入一一对应的向量列表
+    """
+    return await embedding_batcher.embed(texts)
+
+
 async def get_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
     """批量获取向量嵌入
     
@@ -151,43 +466,15 @@ async def get_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
     if not valid_texts:
         return [None] * len(texts)
     
-    if not settings.OPENAI_API_KEY:
-        # 开发环境模拟
-        import random
-        results = [None] * len(texts)
-        for i, _ in valid_texts:
-            results[i] = [random.uniform(-1, 1) for _ in range(settings.OPENAI_EMBEDDING_DIMENSIONS)]
-        return results
-    
+    results = [None] * len(texts)
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{settings.OPENAI_BASE_URL}/embeddings",
-                headers={
-                    "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": settings.OPENAI_EMBEDDING_MODEL,
-                    "input": [t for _, t in valid_texts],
-                    "dimensions": settings.OPENAI_EMBEDDING_DIMENSIONS,
-                },
-            )
-            response.raise_for_status()
-            data = response.json()
-        
-        # 构建结果
-        results = [None] * len(texts)
-        if data.get("data"):
-            for j, (i, _) in enumerate(valid_texts):
-                if j < len(data["data"]):
-                    results[i] = data["data"][j]["embedding"]
-        
-        return results
-    
+        vectors = await embed_texts([t for _, t in valid_texts])
+        for (i, _), vector in zip(valid_texts, vectors):
+            results[i] = vector
     except Exception as e:
         print(f"[Batch Embedding Error] {str(e)}")
-        return [None] * len(texts)
+    
+    return results
 
 
 def extract_plain_text(json_content: dict) -> str:
@@ -201,24 +488,4 @@ def extract_plain_text(json_content: dict) -> str:
     """
     if not json_content:
         return ""
-    
-    texts = []
-    
-    def extract_from_node(node: dict):
-        if not isinstance(node, dict):
-            return
-        
-        # 提取文本节点
-        if node.get("type") == "text":
-            text = node.get("text", "")
-            if text:
-                texts.append(text)
-        
-        # 递归处理子节点
-        content = node.get("content", [])
-        if isinstance(content, list):
-            for child in content:
-                extract_from_node(child)
-    
-    extract_from_node(json_content)
-    return " ".join(texts)
+    return document_text(json_content)
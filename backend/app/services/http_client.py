@@ -0,0 +1,134 @@
+"""出站 HTTP 客户端注册表
+
+为每个上游（OpenAI、DeepSeek 等）维护一个长生命周期的 httpx.AsyncClient，
+复用 HTTP/2 keep-alive 连接池，避免每次请求都重新进行 TCP + TLS 握手。
+客户端在首次使用时创建，由应用 lifespan 统一关闭。
+"""
+
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+
+class _UpstreamStats:
+    """单个上游的连接复用统计"""
+
+    def __init__(self):
+        self.requests = 0  # 发出的请求数
+        self.connections_opened = 0  # 新建的 TCP 连接数
+        self.errors = 0  # 失败请求数
+
+    def to_dict(self) -> dict:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "errors": self.errors,
+        }
+
+
+class _InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """注入 httpcore trace 回调以统计新建连接"""
+
+    def __init__(self, stats: _UpstreamStats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._stats
+        stats.requests += 1
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                stats.connections_opened += 1
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            stats.errors += 1
+            raise
+
+
+def _upstream_config(name: str) -> dict:
+    """上游的 base_url 与默认请求头"""
+    if name == "openai":
+        return {
+            "base_url": settings.OPENAI_BASE_URL,
+            "headers": {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"},
+        }
+    if name == "deepseek":
+        return {
+            "base_url": settings.DEEPSEEK_BASE_URL,
+            "headers": {"Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}"},
+        }
+    # 通用客户端（链接预览等任意 URL）
+    return {"base_url": "", "headers": {}}
+
+
+class HTTPClientRegistry:
+    """按上游名称管理共享的 AsyncClient"""
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._stats: dict[str, _UpstreamStats] = {}
+
+    def get(self, name: str = "default") -> httpx.AsyncClient:
+        """获取（必要时创建）指定上游的客户端"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        stats = self._stats.setdefault(name, _UpstreamStats())
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+        transport = _InstrumentedTransport(
+            stats,
+            http2=settings.HTTP2_ENABLED,
+            limits=limits,
+            retries=settings.HTTP_CONNECT_RETRIES,
+        )
+        config = _upstream_config(name)
+        return httpx.AsyncClient(
+            base_url=config["base_url"],
+            headers=config["headers"],
+            timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+            transport=transport,
+        )
+
+    def stats(self) -> dict:
+        """各上游的连接复用指标"""
+        return {name: s.to_dict() for name, s in self._stats.items()}
+
+    async def aclose(self):
+        """关闭所有客户端（应用关闭时调用）"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+http_clients = HTTPClientRegistry()
+
+
+def get_http_client(name: str = "default") -> httpx.AsyncClient:
+    """获取共享 HTTP 客户端"""
+    return http_clients.get(name)
+
+
+def request_timeout(read: Optional[float] = None) -> httpx.Timeout:
+    """构建单次请求的超时（连接超时沿用全局配置）"""
+    return httpx.Timeout(read or settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
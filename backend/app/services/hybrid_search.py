@@ -0,0 +1,150 @@
+"""混合检索 - 全文检索与向量检索并行召回，RRF 融合排序
+
+两路召回各自使用独立的数据库会话并发执行（同一个 AsyncSession 不能并发查询）：
+- 全文：notes.search_vector 上的 GIN 索引，按 ts_rank_cd 排序
+- 向量：查询向量（带缓存）+ note_embeddings 上的 ANN 检索，同一笔记只保留最相似的块
+融合得分 = Σ 1 / (k + 排名)，任一路失败时降级为另一路的结果。
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.embedding import get_embedding
+from app.services.text_search import build_tsquery, lexical_search
+from app.services.vector_search import search_similar_chunks
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+async def _lexical_candidates(user_id: str, query: str, limit: int, timings: dict) -> list:
+    started = time.perf_counter()
+    tsquery = build_tsquery(query)
+    if not tsquery:
+        timings["lexical_ms"] = 0.0
+        return []
+    async with AsyncSessionLocal() as session:
+        rows = await lexical_search(session, user_id, tsquery, limit)
+    timings["lexical_ms"] = _elapsed_ms(started)
+    return rows
+
+
+async def _vector_candidates(
+    user_id: str,
+    query: str,
+    limit: int,
+    ef_search: Optional[int],
+    probes: Optional[int],
+    timings: dict,
+) -> list:
+    started = time.perf_counter()
+    query_embedding = await get_embedding(query)
+    timings["embedding_ms"] = _elapsed_ms(started)
+    if query_embedding is None:
+        raise RuntimeError("无法生成查询向量")
+
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        rows = await search_similar_chunks(
+            session,
+            user_id=user_id,
+            query_embedding=query_embedding,
+            top_k=limit,
+            ef_search=ef_search,
+            probes=probes,
+        )
+    timings["vector_ms"] = _elapsed_ms(started)
+
+    # 同一笔记的多个块只保留排名最高的一个
+    best = {}
+    for row in rows:
+        if row.note_id not in best:
+            best[row.note_id] = row
+    return list(best.values())
+
+
+async def hybrid_search(
+    user_id: str,
+    query: str,
+    page: int = 1,
+    page_size: int = 10,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+) -> dict:
+    """混合检索用户笔记
+
+    Returns:
+        {"results": [...], "total": 融合后的候选数, "timings": {...}, "degraded": 失败的召回路}
+    """
+    total_started = time.perf_counter()
+    timings: dict = {}
+    # 翻页需要更多候选，但有上限：超大的 page 不能把 LIMIT 直接传给两路查询
+    candidates = min(
+        max(settings.HYBRID_CANDIDATES, page * page_size),
+        settings.HYBRID_MAX_CANDIDATES,
+    )
+
+    lexical, vector = await asyncio.gather(
+        _lexical_candidates(user_id, query, candidates, timings),
+        # 向量召回按块计数，多取一些以便按笔记去重后仍有足够候选
+        _vector_candidates(user_id, query, candidates * 2, ef_search, probes, timings),
+        return_exceptions=True,
+    )
+
+    degraded = []
+    for name, outcome in (("lexical", lexical), ("vector", vector)):
+        if isinstance(outcome, BaseException):
+            print(f"[Hybrid Search Error] {name} 召回失败: {str(outcome)}")
+            degraded.append(name)
+    if len(degraded) == 2:
+        raise lexical
+    if "lexical" in degraded:
+        lexical = []
+    if "vector" in degraded:
+        vector = []
+
+    started = time.perf_counter()
+    k = settings.HYBRID_RRF_K
+    fused: dict = {}
+    for rank, row in enumerate(lexical, start=1):
+        fused[row.id] = {
+            "note_id": row.id,
+            "note_title": row.title,
+            "note_preview": row.preview,
+            "score": 1.0 / (k + rank),
+            "lexical_rank": rank,
+            "vector_rank": None,
+            "chunk_text": None,
+            "similarity": None,
+        }
+    for rank, row in enumerate(vector[:candidates], start=1):
+        item = fused.setdefault(row.note_id, {
+            "note_id": row.note_id,
+            "note_title": row.note_title,
+            "note_preview": row.note_preview,
+            "score": 0.0,
+            "lexical_rank": None,
+        })
+        item["score"] += 1.0 / (k + rank)
+        item["vector_rank"] = rank
+        item["chunk_text"] = row.chunk_text
+        item["similarity"] = float(row.similarity) if row.similarity is not None else None
+
+    ranked = sorted(fused.values(), key=lambda item: item["score"], reverse=True)
+    offset = (page - 1) * page_size
+    results = ranked[offset:offset + page_size]
+    for item in results:
+        item["score"] = round(item["score"], 6)
+    timings["fusion_ms"] = _elapsed_ms(started)
+    timings["total_ms"] = _elapsed_ms(total_started)
+
+    return {
+        "results": results,
+        "total": len(ranked),
+        "timings": timings,
+        "degraded": degraded,
+    }
@@ -0,0 +1,259 @@
+"""笔记向量索引维护 - 增量重嵌入
+
+笔记更新时重新分块，并按文本块哈希与已有嵌入比对：
+- 哈希与模型都未变化的块直接复用（仅更新 chunk_index）
+- 新增或变化的块才发送给 Embedding API
+- 不再出现的块被删除
+"""
+
+import asyncio
+import hashlib
+import weakref
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Note, NoteEmbedding
+from app.services.embedding import chunk_text, extract_plain_text, get_embeddings_batch
+
+# 同一笔记的重嵌入串行执行，避免并发更新产生重复块
+_note_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def note_plain_text(note: Note) -> str:
+    """获取笔记用于嵌入的纯文本"""
+    text_content = note.content
+    if not text_content and note.json_content:
+        text_content = extract_plain_text(note.json_content)
+    return text_content or ""
+
+
+def hash_chunk(chunk: str) -> str:
+    """计算文本块哈希"""
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+
+class EmbeddingPlan:
+    """单个笔记的重嵌入计划"""
+
+    def __init__(self, note_id: str, user_id: str, chunks: List[str], note_deleted: bool = False):
+        self.note_id = note_id
+        self.user_id = user_id
+        self.note_deleted = note_deleted  # 回收站中的笔记，新写入的行同样不参与检索
+        self.chunks = chunks
+        self.hashes = [hash_chunk(c) for c in chunks]
+        self.reused: Dict[int, dict] = {}  # chunk 位置 -> 复用的已有行
+        self.to_embed: List[int] = []  # 需要请求嵌入的 chunk 位置
+        self.stale_ids: List[str] = []  # 需要删除的已有行
+
+    @property
+    def texts_to_embed(self) -> List[str]:
+        return [self.chunks[i] for i in self.to_embed]
+
+
+async def plan_notes_embeddings(
+    db: AsyncSession, notes: List[Note], force: bool = False
+) -> List[EmbeddingPlan]:
+    """对比已有嵌入，为一批笔记生成重嵌入计划
+
+    Args:
+        db: 数据库会话
+        notes: 笔记列表
+        force: 是否忽略已有嵌入，全部重新生成
+    """
+    if not notes:
+        return []
+
+    # 只读取比对所需的列，不加载向量本身
+    result = await db.execute(
+        select(
+            NoteEmbedding.id,
+            NoteEmbedding.note_id,
+            NoteEmbedding.chunk_index,
+            NoteEmbedding.chunk_text,
+            NoteEmbedding.content_hash,
+            NoteEmbedding.model_name,
+            NoteEmbedding.embedding.is_(None).label("missing"),
+        ).where(NoteEmbedding.note_id.in_([note.id for note in notes]))
+    )
+    rows_by_note: Dict[str, list] = {}
+    for row in result.all():
+        rows_by_note.setdefault(row.note_id, []).append(row)
+
+    plans = []
+    for note in notes:
+        plan = EmbeddingPlan(
+            note.id,
+            note.user_id,
+            chunk_text(note_plain_text(note)),
+            note_deleted=note.deleted_at is not None,
+        )
+        existing: Dict[str, List[dict]] = {}
+        for row in rows_by_note.get(note.id, []):
+            # 强制重建、模型变化或上次嵌入失败的行都不复用
+            if force or row.missing or row.model_name != settings.OPENAI_EMBEDDING_MODEL:
+                plan.stale_ids.append(row.id)
+                continue
+            # 旧数据没有哈希，按原文即时计算
+            content_hash = row.content_hash or hash_chunk(row.chunk_text)
+            existing.setdefault(content_hash, []).append({
+                "id": row.id,
+                "chunk_index": row.chunk_index,
+                "content_hash": row.content_hash,
+            })
+
+        for i, content_hash in enumerate(plan.hashes):
+            candidates = existing.get(content_hash)
+            if candidates:
+                plan.reused[i] = candidates.pop()
+            else:
+                plan.to_embed.append(i)
+
+        for rows in existing.values():
+            plan.stale_ids.extend(row["id"] for row in rows)
+        plans.append(plan)
+
+    return plans
+
+
+async def plan_note_embeddings(
+    db: AsyncSession, note: Note, force: bool = False
+) -> EmbeddingPlan:
+    """对比已有嵌入，生成单个笔记的重嵌入计划"""
+    plans = await plan_notes_embeddings(db, [note], force=force)
+    return plans[0]
+
+
+async def apply_note_embeddings(
+    db: AsyncSession, plan: EmbeddingPlan, vectors: List[Optional[List[float]]]
+) -> dict:
+    """按计划写入嵌入结果（不提交事务）
+
+    Args:
+        db: 数据库会话
+        plan: 重嵌入计划
+        vectors: 与 plan.to_embed 一一对应的向量
+    """
+    if plan.stale_ids:
+        await db.execute(
+            delete(NoteEmbedding).where(NoteEmbedding.id.in_(plan.stale_ids))
+        )
+
+    # 复用行只更新位置和缺失的哈希
+    moved = [
+        {"id": row["id"], "chunk_index": i, "content_hash": plan.hashes[i]}
+        for i, row in plan.reused.items()
+        if row["chunk_index"] != i or row["content_hash"] is None
+    ]
+    if moved:
+        await db.execute(update(NoteEmbedding), moved)
+
+    embedded = 0
+    for i, vector in zip(plan.to_embed, vectors):
+        if vector is None:
+            continue
+        db.add(NoteEmbedding(
+            note_id=plan.note_id,
+            user_id=plan.user_id,
+            chunk_index=i,
+            chunk_text=plan.chunks[i],
+            content_hash=plan.hashes[i],
+            embedding=vector,
+            model_name=settings.OPENAI_EMBEDDING_MODEL,
+            note_deleted=plan.note_deleted,
+        ))
+        embedded += 1
+
+    return {
+        "chunks_count": len(plan.chunks),
+        "reused_count": len(plan.reused),
+        "embedded_count": embedded,
+        "failed_count": len(plan.to_embed) - embedded,
+        "deleted_count": len(plan.stale_ids),
+    }
+
+
+async def sync_note_embeddings(db: AsyncSession, note: Note, force: bool = False) -> dict:
+    """增量同步单个笔记的嵌入（不提交事务）"""
+    plan = await plan_note_embeddings(db, note, force=force)
+    vectors = await get_embeddings_batch(plan.texts_to_embed) if plan.to_embed else []
+    return await apply_note_embeddings(db, plan, vectors)
+
+
+async def mark_embeddings_deleted(db: AsyncSession, note_ids: List[str], deleted: bool):
+    """同步笔记的回收站状态到其嵌入（不提交事务）"""
+    if not note_ids:
+        return
+    await db.execute(
+        update(NoteEmbedding)
+        .where(NoteEmbedding.note_id.in_(note_ids))
+        .values(note_deleted=deleted)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reembed_note_task(note_id: str):
+    """后台任务：笔记更新后增量重嵌入
+
+    使用独立的数据库会话，不依赖请求会话的生命周期。
+    """
+    lock = _note_locks.get(note_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _note_locks[note_id] = lock
+
+    async with lock:
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Note).where(Note.id == note_id, Note.deleted_at.is_(None))
+                )
+                note = result.scalar_one_or_none()
+                if not note:
+                    return
+                await sync_note_embeddings(session, note)
+                await session.commit()
+        except Exception as e:
+            print(f"[Reembed Error] Note {note_id}: {str(e)}")
+
+
+async def reembed_notes_task(note_ids: List[str]):
+    """后台任务：批量修改后增量重嵌入多个笔记
+
+    按 EMBED_JOB_PAGE_SIZE 分批，每批一次规划、一次打包请求 Embedding、一次提交。
+    """
+    page_size = settings.EMBED_JOB_PAGE_SIZE
+    for start in range(0, len(note_ids), page_size):
+        page = sorted(note_ids[start:start + page_size])
+        # 按 id 顺序加锁，与单篇重嵌入互斥
+        locks = []
+        for note_id in page:
+            lock = _note_locks.get(note_id)
+            if lock is None:
+                lock = asyncio.Lock()
+                _note_locks[note_id] = lock
+            locks.append(lock)
+        for lock in locks:
+            await lock.acquire()
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Note).where(Note.id.in_(page), Note.deleted_at.is_(None))
+                )
+                plans = await plan_notes_embeddings(session, result.scalars().all())
+                texts = [text for plan in plans for text in plan.texts_to_embed]
+                vectors = await get_embeddings_batch(texts) if texts else []
+                offset = 0
+                for plan in plans:
+                    count = len(plan.to_embed)
+                    await apply_note_embeddings(session, plan, vectors[offset:offset + count])
+                    offset += count
+                await session.commit()
+        except Exception as e:
+            print(f"[Reembed Error] {len(page)} notes: {str(e)}")
+        finally:
+            for lock in locks:
+                lock.release()
@@ -0,0 +1,396 @@
+"""附件媒体后处理
+
+上传完成后为附件创建媒体任务（media_jobs），由 worker 认领后在进程池中处理：
+- 图片：读取尺寸（按 EXIF 方向校正），按 MEDIA_THUMBNAIL_SIZES 生成 WebP 缩略图（不放大）
+- 视频：ffprobe 读取尺寸与时长，ffmpeg 截取一帧生成缩略图
+- 音频：ffprobe 读取时长
+缩略图以原对象 key 加尺寸后缀存放（共享 blob 的附件共用同一组缩略图），
+附件的 thumbnail_url 指向最小的一张，全部尺寸记录在 extra_info["variants"]。
+未安装 ffmpeg 时跳过音视频的元数据提取。
+任务调度与嵌入任务相同：FOR UPDATE SKIP LOCKED + 租约令牌，失败按指数退避重试；
+大文件处理较慢，各阶段之间续租，写入结果前确认仍持有租约。
+"""
+
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Attachment, MediaJob
+from app.services.storage import get_storage, object_key_from_url, object_url
+
+# EXIF 方向为 5-8 时图片需旋转 90 度，宽高互换
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def derivative_key(object_key: str, size: int) -> str:
+    """缩略图的对象 key"""
+    return f"{object_key}.w{size}.webp"
+
+
+def derivative_keys(object_key: str) -> List[str]:
+    """对象可能存在的全部缩略图 key（删除原对象时一并删除）"""
+    return [derivative_key(object_key, size) for size in settings.MEDIA_THUMBNAIL_SIZES]
+
+
+def _probe(path: str, timeout: int) -> dict:
+    """ffprobe 读取时长与视频尺寸（未安装时返回空）"""
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe:
+        return {}
+    output = subprocess.run(
+        [ffprobe, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True, check=True, timeout=timeout,
+    ).stdout
+    data = json.loads(output or b"{}")
+    info = {"duration": round(float((data.get("format") or {}).get("duration") or 0))}
+    for stream in data.get("streams") or []:
+        if stream.get("codec_type") == "video" and stream.get("width"):
+            info["width"], info["height"] = int(stream["width"]), int(stream["height"])
+            break
+    return info
+
+
+def _video_frame(path: str, out_dir: str, duration: int, timeout: int) -> Optional[str]:
+    """ffmpeg 截取一帧作为视频封面（未安装时返回 None）"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    frame = os.path.join(out_dir, "frame.png")
+    subprocess.run(
+        [ffmpeg, "-v", "error", "-y", "-ss", str(min(1, duration / 2)), "-i", path,
+         "-frames:v", "1", frame],
+        capture_output=True, check=True, timeout=timeout,
+    )
+    return frame if os.path.exists(frame) else None
+
+
+def _thumbnails(path: str, out_dir: str, sizes: List[int], quality: int) -> dict:
+    """生成各尺寸 WebP 缩略图，返回原图尺寸与缩略图列表"""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        longest = max(width, height)
+        # JPEG 按需降采样解码，大图只解码到接近最大缩略图的尺寸
+        image.draft("RGB", (min(max(sizes), longest),) * 2)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.mode in ("LA", "P", "PA") else "RGB")
+
+        variants = []
+        for size in sorted(sizes):
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            out = os.path.join(out_dir, f"w{size}.webp")
+            variant.save(out, "WEBP", quality=quality, method=4)
+            variants.append({
+                "size": size, "path": out, "width": variant.width, "height": variant.height,
+            })
+            # 原图不大于该尺寸时更大的缩略图都相同，不再生成
+            if size >= longest:
+                break
+    return {"width": width, "height": height, "variants": variants}
+
+
+def _process_media(
+    path: str, kind: str, out_dir: str, sizes: List[int], quality: int, timeout: int
+) -> dict:
+    """在工作进程中执行：提取元数据并生成缩略图"""
+    info = {"width": 0, "height": 0, "duration": 0, "variants": []}
+    frame = path if kind == "image" else None
+    if kind in ("audio", "video"):
+        info.update(_probe(path, timeout))
+        if kind == "video":
+            frame = _video_frame(path, out_dir, info["duration"], timeout)
+    if frame:
+        thumbs = _thumbnails(frame, out_dir, sizes, quality)
+        info["variants"] = thumbs["variants"]
+        if kind == "image":
+            info["width"], info["height"] = thumbs["width"], thumbs["height"]
+    return info
+
+
+async def enqueue_media_job(db: AsyncSession, attachment: Attachment):
+    """为新附件创建媒体任务（与附件在同一事务中，提交后调用 media_job_worker.notify()）"""
+    await db.flush()
+    db.add(MediaJob(attachment_id=attachment.id))
+
+
+class LeaseLost(Exception):
+    """任务租约已过期并被其他 worker 接手"""
+
+
+class MediaJobWorker:
+    """媒体任务 worker：协程负责调度与存储读写，CPU 密集的解码 / 编码在进程池中执行"""
+
+    def __init__(self):
+        self.workers = max(1, settings.MEDIA_WORKERS)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 使用 spawn：从带线程的事件循环进程中 fork 可能死锁
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=settings.MEDIA_WORKER_MAX_TASKS or None,
+            )
+        return self._executor
+
+    def start(self):
+        """启动 worker（在应用 lifespan 中调用）"""
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """停止 worker 并关闭进程池，正在处理的任务在租约到期后重新执行"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def notify(self):
+        """有新任务时唤醒空闲 worker"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                print(f"[Media Job Error] 认领任务失败: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), settings.MEDIA_JOB_POLL_SECONDS)
+                continue
+
+            job_id, attachment_id, token = job
+            try:
+                await self.process(attachment_id, job_id, token)
+                await self._finish(job_id, token)
+            except asyncio.CancelledError:
+                raise
+            except LeaseLost:
+                print(f"[Media Job Error] 附件 {attachment_id}: 租约已失效，放弃处理结果")
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # 工作进程异常退出，下次处理时重建进程池
+                    self._executor = None
+                print(f"[Media Job Error] 附件 {attachment_id}: {str(e)}")
+                await self._fail(job_id, token, e)
+
+    async def _claim(self) -> Optional[tuple]:
+        """认领一个可执行的任务：待执行且到期，或租约已过期，返回 (任务 ID, 附件 ID, 认领令牌)"""
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        async with AsyncSessionLocal() as session:
+            candidate = (
+                select(MediaJob.id)
+                .where(
+                    or_(
+                        and_(MediaJob.status == "pending", MediaJob.run_after <= now),
+                        and_(MediaJob.status == "running", MediaJob.locked_until < now),
+                    )
+                )
+                .order_by(MediaJob.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                update(MediaJob)
+                .where(MediaJob.id == candidate)
+                .values(
+                    status="running",
+                    locked_until=now + timedelta(seconds=settings.MEDIA_JOB_LEASE_SECONDS),
+                    locked_by=token,
+                )
+                .returning(MediaJob.id, MediaJob.attachment_id)
+            )
+            job = result.first()
+            await session.commit()
+            return (*job, token) if job else None
+
+    async def _lock_owned(
+        self, session: AsyncSession, job_id: str, token: str
+    ) -> Optional[MediaJob]:
+        """加行锁读取任务，仅在仍持有该令牌的租约时返回
+
+        处理超时被其他 worker 接手后，原 worker 不再改写任务状态。
+        """
+        result = await session.execute(
+            select(MediaJob)
+            .where(MediaJob.id == job_id, MediaJob.status == "running", MediaJob.locked_by == token)
+            .with_for_update()
+        )
+        return result.scalar_one_or_none()
+
+    async def _renew(self, job_id: Optional[str], token: Optional[str]):
+        """延长租约（处理阶段之间调用），租约已被接手时抛出 LeaseLost"""
+        if job_id is None:
+            return
+        locked_until = datetime.utcnow() + timedelta(seconds=settings.MEDIA_JOB_LEASE_SECONDS)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(MediaJob)
+                .where(
+                    MediaJob.id == job_id,
+                    MediaJob.status == "running",
+                    MediaJob.locked_by == token,
+                )
+                .values(locked_until=locked_until)
+            )
+            await session.commit()
+        if result.rowcount == 0:
+            raise LeaseLost(job_id)
+
+    async def _check_lease(
+        self, session: AsyncSession, job_id: Optional[str], token: Optional[str]
+    ):
+        """写入结果前加行锁确认仍持有租约，直到提交都不会被接手"""
+        if job_id is not None and await self._lock_owned(session, job_id, token) is None:
+            raise LeaseLost(job_id)
+
+    async def process(
+        self, attachment_id: str, job_id: Optional[str] = None, token: Optional[str] = None
+    ):
+        """处理一个附件：同内容的附件已处理过时直接复用结果
+
+        由任务 worker 调用时传入任务 ID 与认领令牌，处理期间续租并在写入前校验租约。
+        """
+        async with AsyncSessionLocal() as session:
+            attachment = await session.get(Attachment, attachment_id)
+            if attachment is None:
+                return
+            key = object_key_from_url(attachment.url)
+            if key is None or not get_storage().enabled:
+                return
+            if attachment.blob_sha256 and await self._copy_from_sibling(session, attachment):
+                await self._check_lease(session, job_id, token)
+                await session.commit()
+                return
+            kind = attachment.type
+        # 下载与处理期间不占用数据库连接
+        info = await self._render(key, kind, lambda: self._renew(job_id, token))
+
+        async with AsyncSessionLocal() as session:
+            await self._check_lease(session, job_id, token)
+            attachment = await session.get(Attachment, attachment_id)
+            if attachment is None:
+                return
+            attachment.width = info["width"]
+            attachment.height = info["height"]
+            attachment.duration = info["duration"]
+            if info["variants"]:
+                attachment.thumbnail_url = info["variants"][0]["url"]
+            attachment.extra_info = {**(attachment.extra_info or {}), "variants": info["variants"]}
+            await session.commit()
+
+    async def _copy_from_sibling(self, session: AsyncSession, attachment: Attachment) -> bool:
+        result = await session.execute(
+            select(Attachment)
+            .where(
+                Attachment.blob_sha256 == attachment.blob_sha256,
+                Attachment.id != attachment.id,
+                Attachment.extra_info.isnot(None),
+            )
+            .limit(5)
+        )
+        for sibling in result.scalars().all():
+            if "variants" in (sibling.extra_info or {}):
+                attachment.width = sibling.width
+                attachment.height = sibling.height
+                attachment.duration = sibling.duration
+                attachment.thumbnail_url = sibling.thumbnail_url
+                attachment.extra_info = {
+                    **(attachment.extra_info or {}),
+                    "variants": sibling.extra_info["variants"],
+                }
+                return True
+        return False
+
+    async def _render(self, key: str, kind: str, renew) -> dict:
+        """下载原文件，在进程池中处理，上传缩略图（每个阶段之后调用 renew 续租）"""
+        storage = get_storage()
+        with tempfile.TemporaryDirectory(prefix="lifeos-media-") as work_dir:
+            source = os.path.join(work_dir, "source")
+            await storage.download(key, source)
+            await renew()
+            loop = asyncio.get_running_loop()
+            info = await loop.run_in_executor(
+                self._get_executor(), _process_media, source, kind, work_dir,
+                list(settings.MEDIA_THUMBNAIL_SIZES), settings.MEDIA_WEBP_QUALITY,
+                settings.MEDIA_PROBE_TIMEOUT,
+            )
+            await renew()
+            variants = []
+            for variant in info["variants"]:
+                with open(variant.pop("path"), "rb") as f:
+                    content = f.read()
+                variant_key = derivative_key(key, variant["size"])
+                await storage.put(variant_key, content, "image/webp")
+                variants.append({**variant, "url": object_url(variant_key)})
+            info["variants"] = variants
+        return info
+
+    async def _finish(self, job_id: str, token: str):
+        async with AsyncSessionLocal() as session:
+            job = await self._lock_owned(session, job_id, token)
+            if not job:
+                return
+            job.status = "completed"
+            job.locked_until = None
+            job.locked_by = None
+            job.last_error = None
+            job.finished_at = datetime.utcnow()
+            await session.commit()
+
+    async def _fail(self, job_id: str, token: str, error: Exception):
+        """记录失败，按指数退避重新排队或标记为失败（租约已被接手时不处理）"""
+        with contextlib.suppress(Exception):
+            async with AsyncSessionLocal() as session:
+                job = await self._lock_owned(session, job_id, token)
+                if not job:
+                    return
+                job.attempts += 1
+                job.last_error = str(error)[:1000]
+                job.locked_until = None
+                job.locked_by = None
+                if job.attempts >= settings.MEDIA_JOB_MAX_ATTEMPTS:
+                    job.status = "failed"
+                    job.finished_at = datetime.utcnow()
+                else:
+                    delay = settings.MEDIA_JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+                    job.status = "pending"
+                    job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+                await session.commit()
+
+
+media_job_worker = MediaJobWorker()
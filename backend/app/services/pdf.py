@@ -0,0 +1,245 @@
+"""PDF 渲染 - WeasyPrint 工作进程池
+
+WeasyPrint 的排版是纯 CPU 计算，放在事件循环或线程池里都会拖慢 API 请求，
+这里在独立的进程池中渲染：
+- 同时渲染的数量不超过进程数，排队等待的请求数有上限，队列满时直接拒绝
+- 渲染结果按 (note_id, version) 缓存，缓存总字节数有上限
+- 工作进程处理一定数量的任务后重启，避免长期运行的内存增长
+"""
+
+import asyncio
+import html
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from app.core.config import settings
+from app.services.storage import get_storage
+from app.services.tiptap import render_note
+
+_PDF_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+@page {{ size: A4; margin: 2cm; }}
+body {{
+  font-family: "Noto Sans CJK SC", "Source Han Sans SC", "PingFang SC", "Microsoft YaHei",
+    "DejaVu Sans", sans-serif;
+  font-size: 11pt; line-height: 1.6; color: #222;
+}}
+h1.note-title {{ font-size: 20pt; margin: 0 0 0.3em; }}
+.note-meta {{ color: #888; font-size: 9pt; margin-bottom: 1.5em; }}
+pre {{ background: #f5f5f5; padding: 0.8em; white-space: pre-wrap; word-wrap: break-word; }}
+code {{ font-family: "DejaVu Sans Mono", monospace; font-size: 9.5pt; }}
+blockquote {{ border-left: 3px solid #ddd; margin-left: 0; padding-left: 1em; color: #555; }}
+img {{ max-width: 100%; }}
+mark {{ background: #fff3a3; }}
+</style>
+</head>
+<body>
+<h1 class="note-title">{title}</h1>
+<div class="note-meta">{meta}</div>
+{body}
+</body>
+</html>
+"""
+
+_MARKDOWN_EXTRAS = ["fenced-code-blocks", "tables", "strike", "break-on-newline"]
+
+
+class PdfQueueFull(Exception):
+    """渲染队列已满"""
+
+
+def _allowed_prefixes() -> tuple:
+    """允许加载的远程资源前缀：本服务的对象存储及配置的 CDN（前缀均以 / 结尾，固定到主机）"""
+    prefixes = [get_storage().url_prefix, *settings.PDF_FETCH_ALLOWED_PREFIXES]
+    return tuple(prefix if prefix.endswith("/") else prefix + "/" for prefix in prefixes if prefix)
+
+
+def _url_fetcher(url: str, *args, **kwargs):
+    """只允许加载 data: 与本服务存储中的资源
+
+    笔记内容中的任意 URL 都会被渲染进程请求，放开外部地址会造成 SSRF
+    （内网服务、127.0.0.1、云厂商元数据接口等），也禁止读取服务器本地文件。
+    """
+    if not url.startswith("data:") and not url.startswith(_allowed_prefixes()):
+        raise ValueError(f"不允许加载的资源: {url}")
+
+    from weasyprint import default_url_fetcher
+
+    return default_url_fetcher(url, timeout=settings.PDF_FETCH_TIMEOUT)
+
+
+def _render_pdf(
+    title: str, meta: str, body_html: Optional[str], body_markdown: Optional[str]
+) -> bytes:
+    """在工作进程中执行：生成完整 HTML 并排版为 PDF"""
+    from weasyprint import HTML
+
+    if body_html is None:
+        import markdown2
+
+        body_html = markdown2.markdown(
+            body_markdown or "", extras=_MARKDOWN_EXTRAS, safe_mode="escape"
+        )
+    document = _PDF_TEMPLATE.format(
+        title=html.escape(title), meta=html.escape(meta), body=body_html
+    )
+    return HTML(string=document, url_fetcher=_url_fetcher).write_pdf()
+
+
+def _pdf_arguments(note) -> tuple:
+    """在主进程中准备渲染参数（Tiptap 内容使用带缓存的 HTML 渲染结果）"""
+    meta = []
+    if note.created_at:
+        meta.append(f"创建时间: {note.created_at.strftime('%Y-%m-%d %H:%M:%S')}")
+    if note.updated_at:
+        meta.append(f"更新时间: {note.updated_at.strftime('%Y-%m-%d %H:%M:%S')}")
+    title = note.title or "无标题"
+    if note.json_content:
+        return title, "  ·  ".join(meta), render_note(note).html, None
+    return title, "  ·  ".join(meta), None, note.content or ""
+
+
+class _PdfCache:
+    """已渲染 PDF 的 LRU 缓存，按总字节数淘汰"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, count_miss: bool = True) -> Optional[bytes]:
+        value = self._items.get(key)
+        if value is None:
+            self.misses += count_miss
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: tuple, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._items[key] = value
+        self._bytes += len(value)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._items),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class PdfRenderer:
+    """PDF 渲染调度：进程池 + 并发上限 + 有界等待队列 + 结果缓存"""
+
+    def __init__(self):
+        self.workers = max(1, settings.PDF_WORKERS)
+        self.cache = _PdfCache(settings.PDF_CACHE_MAX_BYTES)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 事件循环启动后再创建信号量
+        self._running: Optional[asyncio.Semaphore] = None
+        self._admission: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 使用 spawn：从带线程的事件循环进程中 fork 可能死锁
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=settings.PDF_WORKER_MAX_TASKS or None,
+            )
+        return self._executor
+
+    def _semaphores(self):
+        if self._running is None:
+            self._running = asyncio.Semaphore(self.workers)
+            # 等待中 + 渲染中的任务总数
+            self._admission = asyncio.Semaphore(self.workers + settings.PDF_QUEUE_SIZE)
+        return self._running, self._admission
+
+    @property
+    def saturated(self) -> bool:
+        """队列已满（新的单篇请求会被拒绝）"""
+        _, admission = self._semaphores()
+        return admission.locked()
+
+    async def render_note(self, note, wait: bool = False) -> bytes:
+        """渲染笔记为 PDF
+
+        Args:
+            note: 笔记
+            wait: 队列满时等待空位（批量导出）；否则抛出 PdfQueueFull
+        """
+        key = (note.id, note.version, note.updated_at)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        running, admission = self._semaphores()
+        if admission.locked() and not wait:
+            self.rejected += 1
+            raise PdfQueueFull()
+
+        arguments = _pdf_arguments(note)
+        self.pending += 1
+        try:
+            async with admission, running:
+                # 等待期间可能已被其他请求渲染
+                cached = self.cache.get(key, count_miss=False)
+                if cached is not None:
+                    return cached
+                loop = asyncio.get_running_loop()
+                data = await loop.run_in_executor(self._get_executor(), _render_pdf, *arguments)
+        except BrokenProcessPool:
+            # 工作进程异常退出，下次请求重建进程池
+            self._executor = None
+            self.failed += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.rendered += 1
+        self.cache.put(key, data)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "rendered": self.rendered,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "cache": self.cache.stats(),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pdf_renderer = PdfRenderer()
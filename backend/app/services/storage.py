@@ -1,12 +1,30 @@
-"""腾讯云 COS 存储服务"""
+"""对象存储服务
+
+支持两种后端（STORAGE_BACKEND）：
+- cos：腾讯云 COS（未配置密钥时只生成模拟 URL，不实际上传）
+- local：本地目录，用于开发和测试，文件通过 STORAGE_LOCAL_URL 对外访问，
+  预签名上传由应用的 /upload/local 接口按签名接收（对象存储直传的替身）
+"""
 
 import asyncio
-from typing import Optional
+import hashlib
+import hmac
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode
 
 from qcloud_cos import CosConfig, CosS3Client
+from qcloud_cos.cos_exception import CosServiceError
 
 from app.core.config import settings
 
+# COS 批量删除接口单次最多 1000 个对象
+COS_DELETE_BATCH = 1000
+
 
 def get_cos_client() -> Optional[CosS3Client]:
     """获取 COS 客户端"""
@@ -21,8 +39,357 @@ def get_cos_client() -> Optional[CosS3Client]:
     return CosS3Client(config)
 
 
+class CosStorage:
+    """腾讯云 COS"""
+
+    name = "cos"
+
+    def __init__(self):
+        self.bucket = settings.COS_BUCKET
+        self.client = get_cos_client() if self.bucket else None
+        bucket = self.bucket or "mock-bucket"
+        self.url_prefix = f"https://{bucket}.cos.{settings.COS_REGION}.myqcloud.com/"
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    async def put(self, key: str, content: bytes, content_type: str):
+        if not self.enabled:
+            return
+        # 同步上传（在线程池中执行）
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Body=content,
+            Key=key,
+            ContentType=content_type,
+        )
+
+    async def download(self, key: str, path: str):
+        """下载对象到本地文件"""
+        await asyncio.to_thread(
+            self.client.download_file, Bucket=self.bucket, Key=key, DestFilePath=path
+        )
+
+    async def delete(self, key: str) -> bool:
+        if not self.enabled:
+            return True
+        try:
+            await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+    def _delete_batch(self, keys: List[str]) -> List[str]:
+        response = self.client.delete_objects(
+            Bucket=self.bucket,
+            Delete={"Object": [{"Key": key} for key in keys], "Quiet": "true"},
+        )
+        # 安静模式只返回删除失败的对象（单个时 SDK 返回 dict 而不是 list）
+        errors = (response or {}).get("Error") or []
+        if isinstance(errors, dict):
+            errors = [errors]
+        failed = {error.get("Key") for error in errors}
+        return [key for key in keys if key not in failed]
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        if not self.enabled or not keys:
+            return list(keys)
+        semaphore = asyncio.Semaphore(settings.STORAGE_DELETE_CONCURRENCY)
+
+        async def _run(batch: List[str]) -> List[str]:
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(self._delete_batch, batch)
+                except Exception as e:
+                    print(f"[Storage Error] 批量删除失败: {str(e)}")
+                    return []
+
+        batches = [keys[i:i + COS_DELETE_BATCH] for i in range(0, len(keys), COS_DELETE_BATCH)]
+        results = await asyncio.gather(*(_run(batch) for batch in batches))
+        return [key for deleted in results for key in deleted]
+
+    # ---------- 分片上传 ----------
+
+    async def create_multipart(self, key: str, content_type: str) -> str:
+        if not self.enabled:
+            return uuid.uuid4().hex
+        response = await asyncio.to_thread(
+            self.client.create_multipart_upload,
+            Bucket=self.bucket,
+            Key=key,
+            ContentType=content_type,
+        )
+        return response["UploadId"]
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        if not self.enabled:
+            return hashlib.md5(data).hexdigest()
+        response = await asyncio.to_thread(
+            self.client.upload_part,
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            PartNumber=part_number,
+            UploadId=upload_id,
+        )
+        return response["ETag"]
+
+    async def complete_multipart(self, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        if not self.enabled:
+            return
+        await asyncio.to_thread(
+            self.client.complete_multipart_upload,
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Part": [{"PartNumber": n, "ETag": etag} for n, etag in parts]},
+        )
+
+    async def abort_multipart(self, key: str, upload_id: str):
+        if not self.enabled:
+            return
+        await asyncio.to_thread(
+            self.client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id
+        )
+
+    def _list_parts(self, key: str, upload_id: str) -> List[Tuple[int, str, int]]:
+        parts, marker = [], 0
+        while True:
+            response = self.client.list_parts(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MaxParts=1000,
+                PartNumberMarker=marker,
+            )
+            items = response.get("Part") or []
+            if isinstance(items, dict):
+                items = [items]
+            parts.extend((int(p["PartNumber"]), p["ETag"], int(p["Size"])) for p in items)
+            if str(response.get("IsTruncated")).lower() != "true":
+                return parts
+            marker = int(response["NextPartNumberMarker"])
+
+    async def list_parts(self, key: str, upload_id: str) -> List[Tuple[int, str, int]]:
+        """已上传的分片 [(分片号, ETag, 字节数)]"""
+        return await asyncio.to_thread(self._list_parts, key, upload_id)
+
+    # ---------- 直传 ----------
+
+    def presign_put(
+        self,
+        key: str,
+        expires: int,
+        content_type: Optional[str] = None,
+        upload_id: Optional[str] = None,
+        part_number: Optional[int] = None,
+    ) -> str:
+        """客户端直接 PUT 到对象存储的预签名 URL（传 upload_id 时为分片 URL）"""
+        params = {}
+        if upload_id is not None:
+            params = {"partNumber": str(part_number), "uploadId": upload_id}
+        headers = {"Content-Type": content_type} if content_type else {}
+        return self.client.get_presigned_url(
+            Bucket=self.bucket,
+            Key=key,
+            Method="PUT",
+            Expired=expires,
+            Params=params,
+            Headers=headers,
+        )
+
+    async def head(self, key: str) -> Optional[dict]:
+        """对象的大小与类型，不存在时返回 None"""
+        try:
+            response = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+        except CosServiceError as e:
+            if e.get_status_code() == 404:
+                return None
+            raise
+        return {
+            "size": int(response.get("Content-Length") or 0),
+            "content_type": response.get("Content-Type"),
+        }
+
+
+class LocalStorage:
+    """本地目录（开发 / 测试用的对象存储替身）"""
+
+    name = "local"
+    enabled = True
+
+    def __init__(self, root: Optional[str] = None, url_prefix: Optional[str] = None):
+        self.root = os.path.abspath(root or settings.STORAGE_LOCAL_ROOT)
+        self.url_prefix = url_prefix or settings.STORAGE_LOCAL_URL
+        # 未完成的分片放在根目录之外，不会通过 /media 暴露
+        self.parts_root = self.root + ".multipart"
+
+    def path_for(self, key: str) -> str:
+        """对象 key 对应的文件路径，拒绝越出根目录的 key"""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"非法的对象 key: {key}")
+        return path
+
+    def _write(self, key: str, content: bytes):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    def _remove(self, key: str) -> bool:
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            return False
+        return True
+
+    async def put(self, key: str, content: bytes, content_type: str):
+        await asyncio.to_thread(self._write, key, content)
+
+    async def download(self, key: str, path: str):
+        await asyncio.to_thread(shutil.copyfile, self.path_for(key), path)
+
+    async def delete(self, key: str) -> bool:
+        return await asyncio.to_thread(self._remove, key)
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        removed = await asyncio.to_thread(lambda: [key for key in keys if self._remove(key)])
+        return removed
+
+    # ---------- 分片上传 ----------
+
+    def _parts_dir(self, upload_id: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id):
+            raise ValueError(f"非法的分片上传 ID: {upload_id}")
+        return os.path.join(self.parts_root, upload_id)
+
+    def _write_part(self, upload_id: str, part_number: int, data: bytes) -> str:
+        directory = self._parts_dir(upload_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{part_number:05d}"), "wb") as f:
+            f.write(data)
+        return hashlib.md5(data).hexdigest()
+
+    def _assemble(self, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        directory = self._parts_dir(upload_id)
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            for part_number, _ in parts:
+                with open(os.path.join(directory, f"{part_number:05d}"), "rb") as part:
+                    shutil.copyfileobj(part, out)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    async def create_multipart(self, key: str, content_type: str) -> str:
+        self.path_for(key)
+        return uuid.uuid4().hex
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        return await asyncio.to_thread(self._write_part, upload_id, part_number, data)
+
+    async def complete_multipart(self, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        await asyncio.to_thread(self._assemble, key, upload_id, parts)
+
+    async def abort_multipart(self, key: str, upload_id: str):
+        await asyncio.to_thread(shutil.rmtree, self._parts_dir(upload_id), True)
+
+    def _list_parts(self, upload_id: str) -> List[Tuple[int, str, int]]:
+        directory = self._parts_dir(upload_id)
+        if not os.path.isdir(directory):
+            return []
+        parts = []
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name), "rb") as f:
+                data = f.read()
+            parts.append((int(name), hashlib.md5(data).hexdigest(), len(data)))
+        return parts
+
+    async def list_parts(self, key: str, upload_id: str) -> List[Tuple[int, str, int]]:
+        return await asyncio.to_thread(self._list_parts, upload_id)
+
+    # ---------- 直传 ----------
+
+    @staticmethod
+    def _signature(
+        key: str, expires: int, content_type: str, upload_id: str, part_number: str
+    ) -> str:
+        message = "\n".join(["PUT", key, str(expires), content_type, upload_id, part_number])
+        return hmac.new(settings.JWT_SECRET.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+    def presign_put(
+        self,
+        key: str,
+        expires: int,
+        content_type: Optional[str] = None,
+        upload_id: Optional[str] = None,
+        part_number: Optional[int] = None,
+    ) -> str:
+        self.path_for(key)
+        params = {"expires": int(time.time()) + expires}
+        if upload_id is not None:
+            params.update(upload_id=upload_id, part_number=part_number)
+        params["signature"] = self._signature(
+            key, params["expires"], content_type or "", upload_id or "", str(part_number or "")
+        )
+        return f"{settings.STORAGE_LOCAL_UPLOAD_URL}{key}?{urlencode(params)}"
+
+    def verify_presigned(
+        self,
+        key: str,
+        expires: int,
+        signature: str,
+        content_type: Optional[str] = None,
+        upload_id: Optional[str] = None,
+        part_number: Optional[int] = None,
+    ) -> bool:
+        """校验预签名上传请求（签名与有效期）"""
+        if expires < time.time():
+            return False
+        expected = self._signature(
+            key, expires, content_type or "", upload_id or "", str(part_number or "")
+        )
+        return hmac.compare_digest(expected, signature)
+
+    async def head(self, key: str) -> Optional[dict]:
+        try:
+            size = await asyncio.to_thread(os.path.getsize, self.path_for(key))
+        except FileNotFoundError:
+            return None
+        # 本地文件不记录类型，类型在接收上传时已按签名校验
+        return {"size": size, "content_type": None}
+
+
+_storage = None
+
+
+def get_storage():
+    """当前配置的存储后端（进程内单例）"""
+    global _storage
+    if _storage is None:
+        _storage = LocalStorage() if settings.STORAGE_BACKEND == "local" else CosStorage()
+    return _storage
+
+
+def object_url(key: str) -> str:
+    """对象的访问 URL"""
+    return get_storage().url_prefix + key
+
+
+def object_key_from_url(url: str) -> Optional[str]:
+    """从附件 URL 取回对象 key，不是当前存储的 URL 时返回 None"""
+    prefix = get_storage().url_prefix
+    if not url or not url.startswith(prefix):
+        return None
+    return url[len(prefix):] or None
+
+
 async def upload_to_cos(content: bytes, file_name: str, content_type: str) -> str:
-    """上传文件到 COS
+    """上传文件到对象存储
 
     Args:
         content: 文件内容
@@ -32,44 +399,15 @@ async def upload_to_cos(content: bytes, file_name: str, content_type: str) -> st
     Returns:
         文件 URL
     """
-    client = get_cos_client()
-
-    if not client or not settings.COS_BUCKET:
-        # 开发环境：返回模拟 URL
-        return f"https://{settings.COS_BUCKET or 'mock-bucket'}.cos.{settings.COS_REGION}.myqcloud.com/{file_name}"
-
-    # 同步上传（在线程池中执行）
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(
-        None,
-        lambda: client.put_object(
-            Bucket=settings.COS_BUCKET,
-            Body=content,
-            Key=file_name,
-            ContentType=content_type,
-        ),
-    )
-
-    # 返回文件 URL
-    return f"https://{settings.COS_BUCKET}.cos.{settings.COS_REGION}.myqcloud.com/{file_name}"
+    await get_storage().put(file_name, content, content_type)
+    return object_url(file_name)
 
 
 async def delete_from_cos(file_name: str) -> bool:
-    """从 COS 删除文件"""
-    client = get_cos_client()
+    """从对象存储删除文件"""
+    return await get_storage().delete(file_name)
 
-    if not client or not settings.COS_BUCKET:
-        return True
 
-    try:
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: client.delete_object(
-                Bucket=settings.COS_BUCKET,
-                Key=file_name,
-            ),
-        )
-        return True
-    except Exception:
-        return False
+async def delete_many_from_cos(file_names: List[str]) -> List[str]:
+    """批量删除多个对象（使用后端的批量删除接口，并发数有上限），返回删除成功的 key"""
+    return await get_storage().delete_many(file_names)
@@ -0,0 +1,156 @@
+"""孤立附件清理
+
+笔记被永久删除后附件的 note_id 被置空（外键 SET NULL），对象存储中的文件不会被删除；
+回收站清除时删除对象失败的附件也会留下。这里周期性地按 id 分批扫描：
+- 候选：note_id 为空且创建超过 STORAGE_GC_GRACE_HOURS 的附件
+  （新建笔记前上传的附件同样 note_id 为空，宽限期内不处理）
+- 同一用户的笔记正文或 Tiptap JSON 中仍引用该对象的附件保留
+  （每批按用户分组，每个用户的笔记只分页读取一遍，在内存中匹配对象 key）
+- 其余附件批量删除对象（后端支持时使用批量删除接口，并发数有上限），成功后删除附件记录；
+  共享 blob 的附件只减少引用计数，引用归零超过宽限期的 blob 随后删除对象
+同时中止过期未完成的可续传上传，释放对象存储中残留的分片。
+多个 API 副本中只由持有咨询锁的实例执行。
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import Text, cast, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, advisory_lock
+from app.models import Attachment, Note
+from app.services.blobs import collect_blobs, remove_attachments
+from app.services.storage import object_key_from_url
+from app.services.uploads import abort_expired_sessions
+
+GC_LOCK_NAME = "lifeos:storage_gc"
+
+
+async def _referenced_needles(db: AsyncSession, user_id: str, needles: Set[str]) -> Set[str]:
+    """在用户的全部笔记中查找仍被引用的对象 key / URL
+
+    正文与 JSON 上的 LIKE 无法走索引，逐个候选查询会让每个附件都扫一遍笔记；
+    这里按 id 分页只读一遍该用户的笔记，在内存中做子串匹配，全部找到后提前结束。
+    """
+    pending = set(needles)
+    found: Set[str] = set()
+    last_id = ""
+    while pending:
+        result = await db.execute(
+            select(Note.id, Note.content, cast(Note.json_content, Text))
+            .where(Note.user_id == user_id, Note.id > last_id)
+            .order_by(Note.id)
+            .limit(settings.STORAGE_GC_BATCH_SIZE)
+        )
+        notes = result.all()
+        for _, content, json_text in notes:
+            for needle in [n for n in pending if n in (content or "") or n in (json_text or "")]:
+                pending.discard(needle)
+                found.add(needle)
+        if len(notes) < settings.STORAGE_GC_BATCH_SIZE:
+            break
+        last_id = notes[-1].id
+    return found
+
+
+async def _referenced_ids(db: AsyncSession, rows: list) -> Set[str]:
+    """候选附件中仍被笔记内容引用的附件 id（每个用户扫描一遍笔记）"""
+    needles_by_user: Dict[str, Dict[str, List[str]]] = {}
+    for row in rows:
+        needle = object_key_from_url(row.url) or row.url
+        needles_by_user.setdefault(row.user_id, {}).setdefault(needle, []).append(row.id)
+
+    referenced: Set[str] = set()
+    for user_id, needles in needles_by_user.items():
+        for needle in await _referenced_needles(db, user_id, set(needles)):
+            referenced.update(needles[needle])
+    return referenced
+
+
+async def collect_orphans(
+    batch_size: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, float]:
+    """分批清理孤立附件，返回统计"""
+    batch_size = batch_size or settings.STORAGE_GC_BATCH_SIZE
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=settings.STORAGE_GC_GRACE_HOURS)
+    started = time.perf_counter()
+    stats = {"scanned": 0, "referenced": 0, "deleted": 0, "failed": 0, "bytes": 0}
+    last_id = ""
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(
+                    Attachment.id, Attachment.user_id, Attachment.url,
+                    Attachment.file_size, Attachment.blob_sha256,
+                )
+                .where(
+                    Attachment.note_id.is_(None),
+                    Attachment.created_at < cutoff,
+                    Attachment.id > last_id,
+                )
+                .order_by(Attachment.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            stats["scanned"] += len(rows)
+
+            referenced = await _referenced_ids(session, rows)
+            stats["referenced"] += len(referenced)
+            garbage = [row for row in rows if row.id not in referenced]
+
+            done: List[str] = await remove_attachments(session, garbage)
+            done_ids = set(done)
+            await session.commit()
+            stats["deleted"] += len(done)
+            stats["failed"] += len(garbage) - len(done)
+            # 共享 blob 的空间在 blob 无引用后才释放，不计入
+            stats["bytes"] += sum(
+                row.file_size or 0 for row in garbage if row.id in done_ids and not row.blob_sha256
+            )
+        if len(rows) < batch_size:
+            break
+        await asyncio.sleep(0)
+    stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
+
+
+async def run_storage_gc() -> Optional[Dict[str, float]]:
+    """执行一次孤立附件清理；其他实例正在执行时返回 None"""
+    async with advisory_lock(GC_LOCK_NAME) as acquired:
+        if not acquired:
+            return None
+        stats = await collect_orphans()
+        blobs = await collect_blobs()
+        stats["blobs_deleted"] = blobs["deleted"]
+        stats["blobs_failed"] = blobs["failed"]
+        stats["blob_bytes"] = blobs["bytes"]
+        stats["expired_uploads"] = await abort_expired_sessions()
+        return stats
+
+
+async def storage_gc_worker():
+    """周期性清理孤立附件"""
+    while True:
+        try:
+            stats = await run_storage_gc()
+            counts = ("deleted", "failed", "blobs_deleted", "blobs_failed")
+            if stats and any(stats[name] for name in counts):
+                print(
+                    f"[Storage GC] 检查 {stats['scanned']} 个附件，删除 {stats['deleted']} 个"
+                    f"（{stats['bytes']} 字节），失败 {stats['failed']} 个；"
+                    f"删除无引用 blob {stats['blobs_deleted']} 个（{stats['blob_bytes']} 字节），"
+                    f"失败 {stats['blobs_failed']} 个，耗时 {stats['duration_ms']} ms"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Storage GC Error] {str(e)}")
+        await asyncio.sleep(settings.STORAGE_GC_INTERVAL_HOURS * 3600)
@@ -2,7 +2,8 @@
 
 import asyncio
 import json
-from typing import Optional
+import re
+from typing import Dict, Optional
 
 from tencentcloud.common import credential
 from tencentcloud.common.profile.client_profile import ClientProfile
@@ -63,48 +64,107 @@ async def call_ocr(image_url: Optional[str] = None, image_base64: Optional[str]
     return "\n".join(texts)
 
 
-async def call_asr(audio_url: str) -> str:
-    """调用腾讯云 ASR 语音识别
-
-    注意：这是录音文件识别，是异步任务。
-    简化处理：这里只返回模拟结果。
-    实际使用需要：
-    1. 创建识别任务 (CreateRecTask)
-    2. 轮询获取结果 (DescribeTaskStatus)
-
-    Args:
-        audio_url: 音频 URL
-
-    Returns:
-        识别的文本
+class AsrResult:
+    """录音文件识别任务的状态"""
+
+    def __init__(self, status: str, text: str = "", error: str = "", duration: float = 0):
+        self.status = status  # running, completed, failed
+        self.text = text
+        self.error = error
+        self.duration = duration
+
+
+# DescribeTaskStatus 的 Status：0 排队、1 识别中、2 成功、3 失败
+_ASR_STATUS = {0: "running", 1: "running", 2: "completed", 3: "failed"}
+# ResTextFormat=0 的结果每行带时间戳前缀："[0:0.020,0:2.380]  文本"
+_ASR_TIMESTAMP = re.compile(r"^\[[^\]]*\]\s*")
+
+
+def clean_asr_result(result: str) -> str:
+    """去掉识别结果每行的时间戳"""
+    lines = (_ASR_TIMESTAMP.sub("", line).strip() for line in (result or "").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+class TencentAsrClient:
+    """腾讯云录音文件识别（CreateRecTask 创建任务，DescribeTaskStatus 查询结果）"""
+
+    def __init__(self, cred):
+        http_profile = HttpProfile()
+        http_profile.endpoint = "asr.tencentcloudapi.com"
+        client_profile = ClientProfile()
+        client_profile.httpProfile = http_profile
+        self.client = asr_client.AsrClient(cred, "", client_profile)
+
+    async def create_task(self, audio_url: str, engine_model: str) -> str:
+        """创建识别任务，返回 TaskId"""
+        req = asr_models.CreateRecTaskRequest()
+        req.from_json_string(json.dumps({
+            "EngineModelType": engine_model,
+            "ChannelNum": 1,
+            "ResTextFormat": 0,
+            "SourceType": 0,
+            "Url": audio_url,
+        }))
+        resp = await asyncio.to_thread(self.client.CreateRecTask, req)
+        return str(resp.Data.TaskId)
+
+    async def describe_task(self, task_id: str) -> AsrResult:
+        """查询识别任务状态"""
+        req = asr_models.DescribeTaskStatusRequest()
+        req.from_json_string(json.dumps({"TaskId": int(task_id)}))
+        resp = await asyncio.to_thread(self.client.DescribeTaskStatus, req)
+        data = resp.Data
+        return AsrResult(
+            _ASR_STATUS.get(data.Status, "running"),
+            text=clean_asr_result(data.Result),
+            error=data.ErrorMsg or "",
+            duration=data.AudioDuration or 0,
+        )
+
+
+class MockAsrClient:
+    """未配置腾讯云凭证时使用的模拟识别（开发 / 测试）
+
+    任务在查询 polls 次后完成；测试可传入 results 指定各任务的结果。
     """
-    cred = get_credential()
-    if not cred:
-        # 开发环境模拟
-        return "[ASR 模拟结果] 这是语音识别出的文字内容"
-
-    http_profile = HttpProfile()
-    http_profile.endpoint = "asr.tencentcloudapi.com"
-
-    client_profile = ClientProfile()
-    client_profile.httpProfile = http_profile
-
-    client = asr_client.AsrClient(cred, "", client_profile)
-
-    # 创建识别任务
-    req = asr_models.CreateRecTaskRequest()
-    params = {
-        "EngineModelType": "16k_zh",
-        "ChannelNum": 1,
-        "ResTextFormat": 0,
-        "SourceType": 0,
-        "Url": audio_url,
-    }
-    req.from_json_string(json.dumps(params))
-
-    loop = asyncio.get_event_loop()
-    resp = await loop.run_in_executor(None, client.CreateRecTask, req)
 
-    # 实际使用需要轮询 DescribeTaskStatus 获取结果
-    # 这里简化返回任务 ID
-    return f"[ASR 任务已创建] TaskId: {resp.Data.TaskId}，请稍后查询结果"
+    def __init__(self, polls: int = 1, text: str = "[ASR 模拟结果] 这是语音识别出的文字内容"):
+        self.polls = polls
+        self.text = text
+        self.results: Dict[str, AsrResult] = {}
+        self.created: Dict[str, str] = {}
+        self.describe_calls = 0
+        self._polled: Dict[str, int] = {}
+
+    async def create_task(self, audio_url: str, engine_model: str) -> str:
+        task_id = str(len(self.created) + 1)
+        self.created[task_id] = audio_url
+        return task_id
+
+    async def describe_task(self, task_id: str) -> AsrResult:
+        self.describe_calls += 1
+        if task_id in self.results:
+            return self.results[task_id]
+        self._polled[task_id] = self._polled.get(task_id, 0) + 1
+        if self._polled[task_id] < self.polls:
+            return AsrResult("running")
+        return AsrResult("completed", text=self.text)
+
+
+_asr_client = None
+
+
+def get_asr_client():
+    """ASR 客户端（进程内单例；未配置凭证时为模拟客户端）"""
+    global _asr_client
+    if _asr_client is None:
+        cred = get_credential()
+        _asr_client = TencentAsrClient(cred) if cred else MockAsrClient()
+    return _asr_client
+
+
+def set_asr_client(client):
+    """替换 ASR 客户端（测试时注入模拟客户端）"""
+    global _asr_client
+    _asr_client = client
@@ -0,0 +1,246 @@
+"""全文检索 - notes.search_vector 的维护与查询
+
+PostgreSQL 内置分词器不会切分中文，这里在应用侧预先分词：
+- 中日韩连续字符输出单字 + 相邻二元组（「北京大学」→ 北 京 大 学 北京 京大 大学）
+- 其他文字按单词切分并转小写
+分词结果以空格拼接后交给 'simple' 配置生成 tsvector，标题权重 A、正文权重 B。
+查询时中文取二元组（单字查询取单字）、英文单词按前缀匹配，全部以 AND 连接。
+"""
+
+import asyncio
+import html
+import re
+from typing import List, Optional
+
+from sqlalchemy import Text, bindparam, event, func, inspect, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Note
+from app.services.embedding import extract_plain_text
+
+# 平假名/片假名、CJK 扩展 A、CJK 统一汉字、韩文音节、CJK 兼容汉字
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[^\W{_CJK}_]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+
+def segment_text(content: Optional[str]) -> str:
+    """把文本切分为以空格分隔的索引词"""
+    if not content:
+        return ""
+    tokens = []
+    for match in _TOKEN_RE.finditer(content[:settings.SEARCH_MAX_INDEX_CHARS]):
+        word = match.group()
+        if _CJK_RE.match(word):
+            tokens.extend(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word.lower())
+    return " ".join(tokens)
+
+
+def query_terms(query: str) -> List[str]:
+    """把搜索词切分为查询词"""
+    terms = []
+    for match in _TOKEN_RE.finditer(query):
+        word = match.group()
+        if _CJK_RE.match(word):
+            if len(word) == 1:
+                terms.append(word)
+            else:
+                terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            terms.append(word.lower())
+    # 去重并保持顺序
+    return list(dict.fromkeys(terms))
+
+
+def highlight_terms(query: str) -> List[str]:
+    """高亮用的词：查询词加上完整的中文片段（优先整体高亮）"""
+    runs = [m.group() for m in _TOKEN_RE.finditer(query) if _CJK_RE.match(m.group())]
+    return list(dict.fromkeys(runs + query_terms(query)))
+
+
+def build_tsquery(query: str) -> Optional[str]:
+    """生成 to_tsquery('simple', ...) 的查询串，没有可检索的词时返回 None
+
+    查询词只包含文字字符，不会引入 tsquery 运算符。
+    """
+    parts = []
+    for term in query_terms(query):
+        if _CJK_RE.match(term):
+            parts.append(f"'{term}'")
+        else:
+            parts.append(f"'{term}':*")
+    return " & ".join(parts) or None
+
+
+def tsquery_expression(tsquery: str):
+    """to_tsquery('simple', ...) 表达式"""
+    return func.to_tsquery(literal_column("'simple'::regconfig"), tsquery)
+
+
+def highlight(content: Optional[str], terms: List[str], max_len: Optional[int] = None) -> str:
+    """HTML 转义并用 <mark> 标出命中的查询词
+
+    指定 max_len 时截取第一个命中位置附近的片段作为摘要。
+    """
+    if not content:
+        return ""
+    pattern = None
+    if terms:
+        pattern = re.compile(
+            "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)),
+            re.IGNORECASE,
+        )
+
+    if max_len and len(content) > max_len:
+        match = pattern.search(content) if pattern else None
+        start = max(0, match.start() - max_len // 3) if match else 0
+        end = min(len(content), start + max_len)
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(content) else ""
+        content = prefix + content[start:end] + suffix
+
+    if not pattern:
+        return html.escape(content)
+
+    pieces = []
+    last = 0
+    for match in pattern.finditer(content):
+        pieces.append(html.escape(content[last:match.start()]))
+        pieces.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    pieces.append(html.escape(content[last:]))
+    # 相邻的二元组命中合并为一个高亮
+    return "".join(pieces).replace("</mark><mark>", "")
+
+
+def _weighted_vector(title_tokens, body_tokens):
+    config = literal_column("'simple'::regconfig")
+    return func.setweight(
+        func.to_tsvector(config, title_tokens), literal_column("'A'")
+    ).op("||")(
+        func.setweight(func.to_tsvector(config, body_tokens), literal_column("'B'"))
+    )
+
+
+def search_vector_expression(title: Optional[str], body: Optional[str]):
+    """标题与正文的加权 tsvector 表达式"""
+    return _weighted_vector(segment_text(title), segment_text(body))
+
+
+def bound_search_vector():
+    """批量 UPDATE（executemany）用的 tsvector 表达式，分词结果由参数 sv_title / sv_body 传入"""
+    return _weighted_vector(bindparam("sv_title", type_=Text), bindparam("sv_body", type_=Text))
+
+
+def search_vector_params(title: Optional[str], body: Optional[str]) -> dict:
+    """bound_search_vector 的参数"""
+    return {"sv_title": segment_text(title), "sv_body": segment_text(body)}
+
+
+def body_text(content: Optional[str], json_content) -> str:
+    """参与全文索引的正文：优先纯文本，没有时从 Tiptap JSON 提取"""
+    if content:
+        return content
+    return extract_plain_text(json_content) if json_content else ""
+
+
+def note_body_text(note: Note) -> str:
+    """笔记参与全文索引的正文"""
+    return body_text(note.content, note.json_content)
+
+
+@event.listens_for(Note, "before_insert")
+def _set_search_vector_on_insert(mapper, connection, target: Note):
+    target.search_vector = search_vector_expression(target.title, note_body_text(target))
+
+
+@event.listens_for(Note, "before_update")
+def _set_search_vector_on_update(mapper, connection, target: Note):
+    state = inspect(target)
+    if any(
+        state.attrs[key].history.has_changes()
+        for key in ("title", "content", "json_content")
+    ):
+        target.search_vector = search_vector_expression(target.title, note_body_text(target))
+
+
+async def lexical_search(
+    db: AsyncSession,
+    user_id: str,
+    tsquery: str,
+    limit: int,
+) -> list:
+    """全文检索用户笔记，按 ts_rank_cd 排序
+
+    Returns:
+        行列表，包含 id, title, preview, rank
+    """
+    result = await db.execute(
+        text("""
+            SELECT
+                n.id,
+                n.title,
+                LEFT(n.content, 200) as preview,
+                ts_rank_cd(n.search_vector, q) as rank
+            FROM notes n, to_tsquery('simple', :tsquery) q
+            WHERE n.user_id = :user_id
+                AND n.deleted_at IS NULL
+                AND n.search_vector @@ q
+            ORDER BY rank DESC, n.updated_at DESC
+            LIMIT :limit
+        """),
+        {"tsquery": tsquery, "user_id": user_id, "limit": limit},
+    )
+    return result.fetchall()
+
+
+async def backfill_search_vectors(batch_size: int = 500):
+    """为尚未建立全文索引的笔记补充 search_vector（启动后在后台执行）"""
+    last_id = ""
+    total = 0
+    try:
+        while True:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Note.id, Note.title, Note.content, Note.json_content)
+                    .where(Note.search_vector.is_(None), Note.id > last_id)
+                    .order_by(Note.id)
+                    .limit(batch_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                await session.execute(
+                    text(
+                        "UPDATE notes SET search_vector = "
+                        "setweight(to_tsvector('simple', :title), 'A') || "
+                        "setweight(to_tsvector('simple', :body), 'B') "
+                        "WHERE id = :id"
+                    ),
+                    [
+                        {
+                            "id": row.id,
+                            "title": segment_text(row.title),
+                            "body": segment_text(
+                                row.content or extract_plain_text(row.json_content or {})
+                            ),
+                        }
+                        for row in rows
+                    ],
+                )
+                await session.commit()
+                last_id = rows[-1].id
+                total += len(rows)
+            # 让出事件循环，避免长时间占用
+            await asyncio.sleep(0)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"[Search Index Error] 回填 search_vector 失败: {str(e)}")
+    if total:
+        print(f"[Search Index] 已回填 {total} 篇笔记的全文索引")
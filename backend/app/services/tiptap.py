@@ -0,0 +1,398 @@
+"""Tiptap 文档渲染引擎
+
+一次遍历同时生成纯文本、Markdown 和 HTML：
+- 块级节点使用显式栈迭代遍历，深层嵌套的文档不会触发递归深度限制
+- 块级节点处理函数放在分派表中按类型查表，行内节点在紧凑循环中直接渲染
+- 输出写入列表、最后统一 join，避免重复的字符串拼接
+- 不需要的输出写入空缓冲区，只取纯文本时开销最小
+- 笔记的渲染结果按 (note_id, version) 缓存
+
+Markdown 输出与原 export 实现保持一致：未知节点在 Markdown 中忽略，
+但其中的文本仍计入纯文本（与原 extract_plain_text 一致），HTML 中渲染其子节点。
+"""
+
+import html
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+from app.core.config import settings
+
+
+class RenderedDocument(NamedTuple):
+    """渲染结果"""
+
+    text: str
+    markdown: str
+    html: str
+
+
+class _Discard(list):
+    """被丢弃的输出（被忽略的子树或不需要的输出）
+
+    继承 list 以保留 C 实现的 append；内容从不读取，每次渲染结束后清空。
+    """
+
+    __slots__ = ()
+
+
+_NULL = _Discard()
+
+
+_escape = html.escape
+
+
+def _attrs(node: dict) -> dict:
+    return node.get("attrs") or {}
+
+
+def _children(node: dict) -> list:
+    content = node.get("content")
+    return content if isinstance(content, list) else []
+
+
+def _collect_text(nodes: list, texts: list):
+    """只收集文本（被忽略的子树、只需纯文本时使用）"""
+    stack = nodes[::-1]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if node.get("type") == "text":
+            text = node.get("text", "")
+            if text:
+                texts.append(text)
+        content = node.get("content")
+        if content and isinstance(content, list):
+            stack.extend(reversed(content))
+
+
+# ---------- 行内节点 ----------
+
+# 标记 -> (前缀, 后缀)，按 marks 顺序由内向外包裹
+_MARK_MARKDOWN = {
+    "bold": ("**", "**"),
+    "italic": ("*", "*"),
+    "code": ("`", "`"),
+    "strike": ("~~", "~~"),
+    "highlight": ("==", "=="),
+}
+
+_MARK_HTML = {
+    "bold": ("<strong>", "</strong>"),
+    "italic": ("<em>", "</em>"),
+    "code": ("<code>", "</code>"),
+    "strike": ("<s>", "</s>"),
+    "highlight": ("<mark>", "</mark>"),
+    "underline": ("<u>", "</u>"),
+}
+
+
+def _marked_markdown(text: str, marks: list) -> str:
+    for mark in marks:
+        mark_type = mark.get("type", "")
+        if mark_type == "link":
+            text = f"[{text}]({_attrs(mark).get('href', '')})"
+        else:
+            wrap = _MARK_MARKDOWN.get(mark_type)
+            if wrap:
+                text = wrap[0] + text + wrap[1]
+    return text
+
+
+def _marked_html(text: str, marks: list) -> str:
+    text = _escape(text)
+    for mark in marks:
+        mark_type = mark.get("type", "")
+        if mark_type == "link":
+            text = f'<a href="{_escape(str(_attrs(mark).get("href", "") or ""))}">{text}</a>'
+        else:
+            wrap = _MARK_HTML.get(mark_type)
+            if wrap:
+                text = wrap[0] + text + wrap[1]
+    return text
+
+
+def _render_inline(nodes: list, md, out, texts: list):
+    """渲染行内节点：文本（含标记）与换行；其他节点在 Markdown 中忽略，HTML 中渲染其子节点
+
+    用迭代器栈遍历，常见的扁平行内内容只有一层循环。
+    """
+    html_on = out is not _NULL
+    frames = [(iter(nodes), md)]
+    while frames:
+        children, frame_md = frames[-1]
+        md_on = frame_md is not _NULL
+        for node in children:
+            if not isinstance(node, dict):
+                continue
+            node_type = node.get("type")
+            if node_type == "text":
+                text = node.get("text", "")
+                if text:
+                    texts.append(text)
+                    marks = node.get("marks")
+                    if marks:
+                        if md_on:
+                            frame_md.append(_marked_markdown(text, marks))
+                        if html_on:
+                            out.append(_marked_html(text, marks))
+                    else:
+                        if md_on:
+                            frame_md.append(text)
+                        if html_on:
+                            out.append(_escape(text))
+            elif node_type == "hardBreak":
+                frame_md.append("  \n")
+                out.append("<br>")
+            else:
+                frames.append((iter(_children(node)), _NULL))
+                break
+            if "content" in node:
+                _collect_text(_children(node), texts)
+        else:
+            frames.pop()
+
+
+# ---------- 块级节点 ----------
+# 处理函数签名：(栈, 节点, 深度, md 缓冲, html 缓冲, 文本列表)
+# 需要子节点全部输出后再收尾的节点压入收尾动作 (None, 函数, *参数)
+
+def _paragraph(stack, node, depth, md, out, texts):
+    out.append("<p>")
+    _render_inline(_children(node), md, out, texts)
+    md.append("\n")
+    out.append("</p>")
+
+
+def _heading(stack, node, depth, md, out, texts):
+    level = int(_attrs(node).get("level", 1) or 1)
+    tag = f"h{min(max(level, 1), 6)}"
+    md.append("#" * level + " ")
+    out.append(f"<{tag}>")
+    _render_inline(_children(node), md, out, texts)
+    md.append("\n")
+    out.append(f"</{tag}>")
+
+
+def _code_block(stack, node, depth, md, out, texts):
+    language = _attrs(node).get("language", "")
+    md.append(f"```{language}\n")
+    css = f' class="language-{_escape(str(language))}"' if language else ""
+    out.append(f"<pre><code{css}>")
+    _render_inline(_children(node), md, out, texts)
+    md.append("\n```\n")
+    out.append("</code></pre>")
+
+
+def _list(tag: str, ordered: bool):
+    def handler(stack, node, depth, md, out, texts):
+        out.append(f"<{tag}>")
+        stack.append((None, out.append, f"</{tag}>"))
+        children = _children(node)
+        for i in range(len(children) - 1, -1, -1):
+            marker = f"{i + 1}. " if ordered else "- "
+            stack.append((None, _list_entry, stack, children[i], depth, marker, md, out))
+    return handler
+
+
+def _list_entry(stack, node, depth, marker, md, out):
+    """列表的每个子节点都按列表项处理：内容写入独立缓冲区，结束时去掉首尾空白并加上缩进和标记"""
+    if not isinstance(node, dict):
+        return
+    inner = [] if md is not _NULL else _NULL
+    out.append("<li>")
+    stack.append((None, _close_list_entry, md, inner, depth, marker, out))
+    _push_blocks(stack, _children(node), depth + 1, inner, out)
+
+
+def _close_list_entry(md, inner, depth, marker, out):
+    out.append("</li>")
+    if md is not _NULL:
+        md.append("  " * depth + marker + "".join(inner).strip() + "\n")
+
+
+def _list_item(stack, node, depth, md, out, texts):
+    out.append("<li>")
+    stack.append((None, out.append, "</li>"))
+    _push_blocks(stack, _children(node), depth, md, out)
+
+
+def _blockquote(stack, node, depth, md, out, texts):
+    # 引用内容先写入独立缓冲区，结束时逐行加上 "> "
+    inner = [] if md is not _NULL else _NULL
+    out.append("<blockquote>")
+    stack.append((None, _close_blockquote, md, inner, out))
+    _push_blocks(stack, _children(node), 0, inner, out)
+
+
+def _close_blockquote(md, inner, out):
+    out.append("</blockquote>")
+    if md is not _NULL:
+        for line in "".join(inner).strip().split("\n"):
+            md.append("> " + line + "\n")
+
+
+def _image(stack, node, depth, md, out, texts):
+    attrs = _attrs(node)
+    src = attrs.get("src", "")
+    alt = attrs.get("alt", "")
+    md.append(f"![{alt}]({src})\n")
+    out.append(f'<img src="{_escape(str(src or ""))}" alt="{_escape(str(alt or ""))}">')
+    _collect_text(_children(node), texts)
+
+
+def _horizontal_rule(stack, node, depth, md, out, texts):
+    md.append("---\n")
+    out.append("<hr>")
+    _collect_text(_children(node), texts)
+
+
+def _hard_break(stack, node, depth, md, out, texts):
+    md.append("  \n")
+    out.append("<br>")
+    _collect_text(_children(node), texts)
+
+
+def _text_block(stack, node, depth, md, out, texts):
+    # 块级位置的文本：Markdown 中忽略（与原实现一致），HTML 中保留
+    text = node.get("text", "")
+    if text:
+        texts.append(text)
+        out.append(_escape(text))
+    _collect_text(_children(node), texts)
+
+
+def _unknown_block(stack, node, depth, md, out, texts):
+    # Markdown 忽略未知节点，HTML 保留其子节点
+    _push_blocks(stack, _children(node), depth, _NULL, out)
+
+
+_BLOCK_HANDLERS = {
+    "paragraph": _paragraph,
+    "heading": _heading,
+    "bulletList": _list("ul", ordered=False),
+    "orderedList": _list("ol", ordered=True),
+    "listItem": _list_item,
+    "blockquote": _blockquote,
+    "codeBlock": _code_block,
+    "image": _image,
+    "horizontalRule": _horizontal_rule,
+    "hardBreak": _hard_break,
+    "text": _text_block,
+}
+
+
+def _push_blocks(stack: list, nodes: list, depth: int, md, out):
+    """按文档顺序压入块级子节点（栈后进先出，所以倒序压入）"""
+    for i in range(len(nodes) - 1, -1, -1):
+        stack.append((nodes[i], depth, md, out))
+
+
+def _load(doc: Any) -> Optional[dict]:
+    if isinstance(doc, str):
+        try:
+            doc = json.loads(doc)
+        except json.JSONDecodeError:
+            return None
+    return doc if doc and isinstance(doc, dict) else None
+
+
+def render_document(
+    doc: Any, markdown: bool = True, html_output: bool = True
+) -> RenderedDocument:
+    """渲染 Tiptap 文档（dict 或 JSON 字符串）
+
+    Args:
+        doc: Tiptap JSON
+        markdown: 是否生成 Markdown
+        html_output: 是否生成 HTML
+    """
+    doc = _load(doc)
+    if doc is None:
+        return RenderedDocument("", "", "")
+
+    texts: list = []
+    if not markdown and not html_output:
+        _collect_text([doc], texts)
+        return RenderedDocument(" ".join(texts), "", "")
+
+    md = [] if markdown else _NULL
+    out = [] if html_output else _NULL
+    if doc.get("type") == "text":
+        texts.append(doc.get("text", ""))
+
+    # 栈元素：(节点, 深度, md 缓冲, html 缓冲)，或收尾动作 (None, 函数, *参数)
+    stack: list = []
+    _push_blocks(stack, _children(doc), 0, md, out)
+    while stack:
+        item = stack.pop()
+        node = item[0]
+        if node is None:
+            item[1](*item[2:])
+        elif isinstance(node, dict):
+            handler = _BLOCK_HANDLERS.get(node.get("type"), _unknown_block)
+            handler(stack, node, item[1], item[2], item[3], texts)
+
+    _NULL.clear()
+    return RenderedDocument(
+        " ".join(texts),
+        "".join(md) if markdown else "",
+        "".join(out) if html_output else "",
+    )
+
+
+def document_text(doc: Any) -> str:
+    """只提取纯文本"""
+    return render_document(doc, markdown=False, html_output=False).text
+
+
+class _RenderCache:
+    """笔记渲染结果的 LRU 缓存（导出可能在工作线程中渲染，需要加锁）"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[tuple, RenderedDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[RenderedDocument]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: RenderedDocument):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+render_cache = _RenderCache(settings.TIPTAP_RENDER_CACHE_SIZE)
+
+
+def render_note(note) -> RenderedDocument:
+    """渲染笔记内容，按 (note_id, version) 缓存
+
+    键中额外带上 updated_at，防止未递增版本号的写入读到旧结果。
+    """
+    key = (note.id, note.version, note.updated_at)
+    cached = render_cache.get(key)
+    if cached is not None:
+        return cached
+    rendered = render_document(note.json_content)
+    render_cache.put(key, rendered)
+    return rendered
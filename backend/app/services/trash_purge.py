@@ -0,0 +1,169 @@
+"""回收站永久删除 - 分批清除笔记及其关联数据
+
+按笔记 id 做 keyset 分批，每批一个短事务：
+- 显式删除嵌入与版本历史（避免单条 DELETE 级联出大量行、长时间持锁）
+- 删除笔记本身（标签关联由外键级联）
+- 记录笔记的附件，事务提交后再异步删除对象存储中的文件和附件记录
+回收站过期清理在多个 API 副本中只由持有咨询锁的实例执行。
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, advisory_lock
+from app.core.pagination import count_cache
+from app.models import Attachment, Note, NoteEmbedding, NoteVersion
+from app.services.blobs import remove_attachments
+
+PURGE_LOCK_NAME = "lifeos:trash_purge"
+
+
+class PurgeResult:
+    """一次清除的统计"""
+
+    def __init__(self):
+        self.notes = 0
+        self.embeddings = 0
+        self.versions = 0
+        self.batches = 0
+        self.attachment_ids: List[str] = []
+        self._started = time.perf_counter()
+        self.duration_ms = 0.0
+
+    def finish(self) -> "PurgeResult":
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 1)
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "notes": self.notes,
+            "embeddings": self.embeddings,
+            "versions": self.versions,
+            "attachments": len(self.attachment_ids),
+            "batches": self.batches,
+            "duration_ms": self.duration_ms,
+        }
+
+
+async def _purge_batch(db: AsyncSession, note_ids: List[str], result: PurgeResult):
+    """删除一批笔记及其嵌入、版本（不提交事务）"""
+    embeddings = await db.execute(delete(NoteEmbedding).where(NoteEmbedding.note_id.in_(note_ids)))
+    versions = await db.execute(delete(NoteVersion).where(NoteVersion.note_id.in_(note_ids)))
+    attachments = await db.execute(select(Attachment.id).where(Attachment.note_id.in_(note_ids)))
+    # 附件记录随外键置空，由提交后的异步清理删除
+    result.attachment_ids.extend(attachments.scalars().all())
+    notes = await db.execute(delete(Note).where(Note.id.in_(note_ids)))
+    result.embeddings += embeddings.rowcount or 0
+    result.versions += versions.rowcount or 0
+    result.notes += notes.rowcount or 0
+
+
+async def purge_notes(
+    db: AsyncSession,
+    user_id: Optional[str] = None,
+    deleted_before: Optional[datetime] = None,
+    note_ids: Optional[List[str]] = None,
+    batch_size: Optional[int] = None,
+) -> PurgeResult:
+    """分批永久删除回收站中的笔记，每批提交一次
+
+    附件对象不在这里删除，调用方应在之后执行 delete_attachments(result.attachment_ids)。
+
+    Args:
+        user_id: 只删除该用户的笔记
+        deleted_before: 只删除在该时间之前移入回收站的笔记
+        note_ids: 只删除指定的笔记
+    """
+    batch_size = batch_size or settings.TRASH_PURGE_BATCH_SIZE
+    conditions = [Note.deleted_at.isnot(None)]
+    if user_id is not None:
+        conditions.append(Note.user_id == user_id)
+    if deleted_before is not None:
+        conditions.append(Note.deleted_at < deleted_before)
+    if note_ids is not None:
+        conditions.append(Note.id.in_(note_ids))
+
+    result = PurgeResult()
+    last_id = ""
+    while True:
+        # 跳过正被其他事务锁定（例如正在恢复）的笔记，留给下一次清理
+        rows = await db.execute(
+            select(Note.id, Note.user_id)
+            .where(*conditions, Note.id > last_id)
+            .order_by(Note.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        rows = rows.all()
+        if not rows:
+            break
+        await _purge_batch(db, [row.id for row in rows], result)
+        await db.commit()
+        for owner in {row.user_id for row in rows}:
+            count_cache.invalidate(owner)
+        result.batches += 1
+        last_id = rows[-1].id
+        if len(rows) < batch_size:
+            break
+        # 批次之间让出事件循环
+        await asyncio.sleep(0)
+    return result.finish()
+
+
+async def delete_attachments(attachment_ids: List[str]) -> int:
+    """删除附件的存储对象（共享 blob 只减少引用），成功后删除附件记录，返回删除的附件数
+
+    删除失败的附件记录保留（note_id 已为空），之后由孤立对象清理任务重试。
+    """
+    deleted = 0
+    for start in range(0, len(attachment_ids), settings.TRASH_PURGE_BATCH_SIZE):
+        batch = attachment_ids[start:start + settings.TRASH_PURGE_BATCH_SIZE]
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Attachment.id, Attachment.url, Attachment.blob_sha256)
+                    .where(Attachment.id.in_(batch))
+                )
+                done = await remove_attachments(session, result.all())
+                await session.commit()
+                deleted += len(done)
+        except Exception as e:
+            print(f"[Trash Purge Error] 删除附件失败: {str(e)}")
+    return deleted
+
+
+async def run_trash_retention() -> Optional[PurgeResult]:
+    """清除超过保留期的回收站笔记；其他实例正在执行时返回 None"""
+    async with advisory_lock(PURGE_LOCK_NAME) as acquired:
+        if not acquired:
+            return None
+        threshold = datetime.utcnow() - timedelta(days=settings.TRASH_RETENTION_DAYS)
+        async with AsyncSessionLocal() as session:
+            result = await purge_notes(session, deleted_before=threshold)
+        await delete_attachments(result.attachment_ids)
+        return result
+
+
+async def trash_purge_worker():
+    """周期性清理回收站中过期笔记"""
+    while True:
+        try:
+            result = await run_trash_retention()
+            if result is not None and result.notes:
+                stats = result.to_dict()
+                print(
+                    f"[Trash Purge] 已清理 {stats['notes']} 篇笔记（嵌入 {stats['embeddings']}，"
+                    f"版本 {stats['versions']}，附件 {stats['attachments']}），"
+                    f"{stats['batches']} 批，耗时 {stats['duration_ms']} ms"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Trash Purge Error] {str(e)}")
+        await asyncio.sleep(settings.TRASH_CLEANUP_INTERVAL_HOURS * 3600)
@@ -0,0 +1,169 @@
+"""流式上传
+
+请求体按块读取，边读边：
+- 检查大小上限（超出立即中止，不再继续读取）
+- 计算 SHA-256
+- 攒满一个分片就提交到对象存储的分片上传，多个分片并行上传；
+  在途分片数达到上限时暂停读取，单个上传占用的内存约为 (UPLOAD_PART_CONCURRENCY + 1) 个分片
+不超过一个分片的小文件直接整体上传。
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import UploadFile
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import UploadSession
+from app.services.storage import get_storage, object_url
+
+
+class UploadTooLarge(Exception):
+    """上传内容超过大小上限"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"文件大小超过上限 {max_size} 字节")
+        self.max_size = max_size
+
+
+class StoredObject:
+    """已写入对象存储的文件"""
+
+    def __init__(self, key: str, size: int, sha256: str):
+        self.key = key
+        self.url = object_url(key)
+        self.size = size
+        self.sha256 = sha256
+
+
+async def iter_upload_file(
+    file: UploadFile, chunk_size: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """按块读取表单上传的文件"""
+    chunk_size = chunk_size or settings.UPLOAD_READ_CHUNK_SIZE
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def read_limited(chunks: AsyncIterator[bytes], max_size: int) -> bytes:
+    """读取全部内容，超过 max_size 时立即中止"""
+    buffer = bytearray()
+    async for chunk in chunks:
+        if len(buffer) + len(chunk) > max_size:
+            raise UploadTooLarge(max_size)
+        buffer += chunk
+    return bytes(buffer)
+
+
+async def stream_to_storage(
+    chunks: AsyncIterator[bytes],
+    key: str,
+    content_type: str,
+    max_size: int,
+) -> StoredObject:
+    """把字节流写入对象存储，失败或超限时中止分片上传"""
+    storage = get_storage()
+    part_size = settings.UPLOAD_PART_SIZE
+    slots = asyncio.Semaphore(max(1, settings.UPLOAD_PART_CONCURRENCY))
+    hasher = hashlib.sha256()
+    buffer = bytearray()
+    size = 0
+    upload_id: Optional[str] = None
+    etags: Dict[int, str] = {}
+    tasks: list = []
+
+    async def send(part_number: int, data: bytes):
+        try:
+            etags[part_number] = await storage.upload_part(key, upload_id, part_number, data)
+        finally:
+            slots.release()
+
+    async def submit(data: bytes):
+        nonlocal upload_id
+        if upload_id is None:
+            upload_id = await storage.create_multipart(key, content_type)
+        # 在途分片已满时等待空位（同时暂停读取请求体）
+        await slots.acquire()
+        for task in tasks:
+            if task.done() and task.exception():
+                slots.release()
+                raise task.exception()
+        tasks.append(asyncio.create_task(send(len(tasks) + 1, data)))
+
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(max_size)
+            hasher.update(chunk)
+            buffer += chunk
+            while len(buffer) >= part_size:
+                await submit(bytes(buffer[:part_size]))
+                del buffer[:part_size]
+
+        if upload_id is None:
+            await storage.put(key, bytes(buffer), content_type)
+        else:
+            if buffer:
+                await submit(bytes(buffer))
+            await asyncio.gather(*tasks)
+            await storage.complete_multipart(key, upload_id, sorted(etags.items()))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if upload_id is not None:
+            try:
+                await storage.abort_multipart(key, upload_id)
+            except Exception as e:
+                print(f"[Upload Error] 中止分片上传失败 {key}: {str(e)}")
+        raise
+
+    return StoredObject(key, size, hasher.hexdigest())
+
+
+def composite_sha256(parts: dict) -> str:
+    """可续传上传的组合校验和：按分片顺序拼接各分片 SHA-256 后再取 SHA-256
+
+    分片可能跨多个请求、乱序上传，无法对整个文件做流式摘要；客户端按同样方式计算即可比对。
+    """
+    hasher = hashlib.sha256()
+    for number in sorted(parts, key=int):
+        hasher.update(bytes.fromhex(parts[number]["sha256"]))
+    return f"{hasher.hexdigest()}-{len(parts)}"
+
+
+async def release_session_storage(upload: UploadSession):
+    """释放未完成会话占用的存储：中止分片上传；直传且不分片时删除可能已上传的对象"""
+    storage = get_storage()
+    try:
+        if upload.upload_id:
+            await storage.abort_multipart(upload.object_key, upload.upload_id)
+        else:
+            await storage.delete(upload.object_key)
+    except Exception as e:
+        print(f"[Upload Error] 中止上传失败 {upload.object_key}: {str(e)}")
+
+
+async def abort_expired_sessions() -> int:
+    """中止过期未完成的上传会话，释放对象存储中的分片，返回处理的会话数"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(UploadSession).where(
+                UploadSession.status == "uploading",
+                UploadSession.expires_at < datetime.utcnow(),
+            ).limit(settings.STORAGE_GC_BATCH_SIZE)
+        )
+        expired = result.scalars().all()
+        for upload in expired:
+            await release_session_storage(upload)
+            upload.status = "aborted"
+        await session.commit()
+        return len(expired)
@@ -0,0 +1,91 @@
+"""向量检索 - note_embeddings 上的近似最近邻查询"""
+
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+
+async def apply_search_params(
+    db: AsyncSession,
+    top_k: int,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+):
+    """为当前事务设置 ANN 查询参数（召回率与延迟的权衡）
+
+    使用 set_config(..., is_local => true)，只影响当前事务。
+    HNSW 的 ef_search 小于 top_k 时返回结果会不足，因此取两者较大值。
+    按用户过滤时启用迭代扫描（pgvector >= 0.8），避免过滤后结果不足 top_k。
+    """
+    if settings.VECTOR_INDEX_TYPE == "hnsw":
+        params = {"hnsw.ef_search": max(ef_search or settings.VECTOR_HNSW_EF_SEARCH, top_k)}
+    elif settings.VECTOR_INDEX_TYPE == "ivfflat":
+        params = {"ivfflat.probes": probes or settings.VECTOR_IVFFLAT_PROBES}
+    else:
+        return
+
+    if settings.VECTOR_ITERATIVE_SCAN != "off":
+        params[f"{settings.VECTOR_INDEX_TYPE}.iterative_scan"] = settings.VECTOR_ITERATIVE_SCAN
+
+    for name, value in params.items():
+        await db.execute(
+            text("SELECT set_config(:name, :value, true)"),
+            {"name": name, "value": str(value)},
+        )
+
+
+async def search_similar_chunks(
+    db: AsyncSession,
+    user_id: str,
+    query_embedding: List[float],
+    top_k: int,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+) -> list:
+    """按 cosine 距离检索用户最相似的文本块
+
+    Returns:
+        行列表，包含 id, note_id, chunk_text, similarity, note_title, note_preview
+    """
+    await apply_search_params(db, top_k, ef_search=ef_search, probes=probes)
+
+    # 先在 note_embeddings 上按用户预过滤并取 top_k，再只为结果关联 notes
+    # 1 - cosine_distance = cosine_similarity
+    query = text("""
+        WITH candidates AS (
+            SELECT
+                ne.id,
+                ne.note_id,
+                ne.chunk_text,
+                ne.embedding <=> :query_embedding::vector as distance
+            FROM note_embeddings ne
+            WHERE ne.user_id = :user_id
+                AND NOT ne.note_deleted
+                AND ne.embedding IS NOT NULL
+            ORDER BY ne.embedding <=> :query_embedding::vector
+            LIMIT :top_k
+        )
+        SELECT
+            c.id,
+            c.note_id,
+            c.chunk_text,
+            1 - c.distance as similarity,
+            n.title as note_title,
+            LEFT(n.content, 200) as note_preview
+        FROM candidates c
+        JOIN notes n ON c.note_id = n.id AND n.deleted_at IS NULL
+        ORDER BY c.distance
+    """)
+
+    result = await db.execute(
+        query,
+        {
+            "query_embedding": str(query_embedding),
+            "user_id": user_id,
+            "top_k": top_k,
+        }
+    )
+    return result.fetchall()
@@ -0,0 +1,363 @@
+"""笔记版本存储 - 关键帧 + 增量
+
+每个笔记的版本链由若干关键帧（完整内容）组成，关键帧之间的版本只保存相对
+所属关键帧的增量，还原任意版本最多读取两行、应用一次增量。
+以下情况写入新的关键帧：
+- 笔记还没有关键帧
+- 当前关键帧之后的增量版本数达到 VERSION_KEYFRAME_INTERVAL
+- 增量大小超过完整内容的 VERSION_DELTA_MAX_RATIO（内容改动过大）
+
+自动保存的连续修改合并为一个版本（见 snapshot_before_update），
+旧历史由后台压缩任务按小时 / 按天抽稀（见 compact_note_versions）。
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.delta import dump_json, encode_field
+from app.core.pagination import count_cache
+from app.models import Note, NoteVersion
+
+# 压缩时始终保留的版本类型
+KEPT_CHANGE_TYPES = ("create", "restore")
+
+PREVIEW_LENGTH = 200
+
+
+def content_size(snapshot: dict) -> int:
+    """完整内容的大致存储大小（字符数）"""
+    size = len(snapshot.get("content") or "")
+    if snapshot.get("json_content") is not None:
+        size += len(dump_json(snapshot["json_content"]))
+    return size
+
+
+def plan_delta(keyframe: dict, snapshot: dict, deltas_since_keyframe: int) -> Optional[dict]:
+    """计算相对关键帧的增量；应当改存关键帧时返回 None"""
+    if deltas_since_keyframe >= settings.VERSION_KEYFRAME_INTERVAL:
+        return None
+    delta = {}
+    for field, is_json in (("content", False), ("json_content", True)):
+        encoded = encode_field(keyframe[field], snapshot[field], is_json)
+        if encoded is not None:
+            delta[field] = encoded
+    delta_size = len(json.dumps(delta, ensure_ascii=False))
+    if delta_size > content_size(snapshot) * settings.VERSION_DELTA_MAX_RATIO:
+        return None
+    return delta
+
+
+def _preview(content: Optional[str]) -> Optional[str]:
+    if content and len(content) > PREVIEW_LENGTH:
+        return content[:PREVIEW_LENGTH] + "..."
+    return content
+
+
+async def _latest_keyframe(db: AsyncSession, note_id: str) -> Optional[NoteVersion]:
+    result = await db.execute(
+        select(NoteVersion)
+        .where(NoteVersion.note_id == note_id, NoteVersion.is_keyframe.is_(True))
+        .order_by(NoteVersion.version.desc(), NoteVersion.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def _latest_versions(
+    db: AsyncSession, note_ids: List[str], keyframes_only: bool = False
+) -> Dict[str, NoteVersion]:
+    """一次查询取多个笔记各自最新的版本（或关键帧）"""
+    rank = func.row_number().over(
+        partition_by=NoteVersion.note_id,
+        order_by=(NoteVersion.version.desc(), NoteVersion.created_at.desc()),
+    ).label("rank")
+    conditions = [NoteVersion.note_id.in_(note_ids)]
+    if keyframes_only:
+        conditions.append(NoteVersion.is_keyframe.is_(True))
+    ranked = select(NoteVersion.id, rank).where(*conditions).subquery()
+    result = await db.execute(
+        select(NoteVersion).join(ranked, ranked.c.id == NoteVersion.id).where(ranked.c.rank == 1)
+    )
+    return {version.note_id: version for version in result.scalars().all()}
+
+
+def _make_version(
+    note: Note,
+    keyframe: Optional[NoteVersion],
+    deltas_since_keyframe: int,
+    change_type: str,
+    change_summary: Optional[str],
+    session_id: Optional[str],
+    restore_point: bool,
+) -> NoteVersion:
+    snapshot = {
+        "title": note.title,
+        "content": note.content,
+        "json_content": note.json_content,
+    }
+    version = NoteVersion(
+        note_id=note.id,
+        version=note.version or 1,
+        title=note.title,
+        change_type=change_type,
+        change_summary=change_summary,
+        session_id=session_id,
+        is_restore_point=restore_point,
+    )
+
+    delta = None
+    if keyframe is not None:
+        delta = plan_delta(keyframe.snapshot(), snapshot, deltas_since_keyframe)
+
+    if delta is None:
+        version.is_keyframe = True
+        version.content = note.content
+        version.json_content = note.json_content
+    else:
+        version.is_keyframe = False
+        version.keyframe_id = keyframe.id
+        version.keyframe = keyframe
+        version.delta = delta
+        version.preview = _preview(note.content)
+    return version
+
+
+async def build_version_snapshot(
+    db: AsyncSession,
+    note: Note,
+    change_type: str = "update",
+    change_summary: Optional[str] = None,
+    session_id: Optional[str] = None,
+    restore_point: bool = False,
+) -> NoteVersion:
+    """为笔记的当前内容生成版本记录（关键帧或增量），由调用方加入会话
+
+    Args:
+        session_id: 编辑会话 ID（用于合并同一会话的连续修改）
+        restore_point: 显式恢复点，不参与合并与压缩
+    """
+    keyframe = await _latest_keyframe(db, note.id)
+    deltas = 0
+    if keyframe is not None:
+        result = await db.execute(
+            select(func.count()).where(NoteVersion.keyframe_id == keyframe.id)
+        )
+        deltas = result.scalar() or 0
+    return _make_version(
+        note, keyframe, deltas, change_type, change_summary, session_id, restore_point
+    )
+
+
+def with_keyframe(query):
+    """版本查询附带加载关键帧，以便读取完整内容"""
+    return query.options(selectinload(NoteVersion.keyframe))
+
+
+# ---------- 连续修改合并 ----------
+
+def should_coalesce(
+    latest: Optional[NoteVersion],
+    last_saved_at: Optional[datetime],
+    session_id: Optional[str],
+    now: datetime,
+) -> bool:
+    """本次修改是否并入上一个版本（不再保存修改前的快照）
+
+    上一个版本之后的修改属于同一次连续编辑时合并：同一编辑会话，或距上次保存
+    不超过 VERSION_COALESCE_WINDOW_SECONDS。合并最长持续 VERSION_COALESCE_MAX_SPAN_SECONDS，
+    不同会话之间、以及创建记录和恢复点之后不合并。
+    """
+    if latest is None or latest.change_type != "update" or latest.is_restore_point:
+        return False
+    if latest.created_at is None or now - latest.created_at > timedelta(
+        seconds=settings.VERSION_COALESCE_MAX_SPAN_SECONDS
+    ):
+        return False
+    if session_id and latest.session_id:
+        return session_id == latest.session_id
+    window = settings.VERSION_COALESCE_WINDOW_SECONDS
+    if not window or last_saved_at is None:
+        return False
+    return now - last_saved_at <= timedelta(seconds=window)
+
+
+async def snapshot_before_update(
+    db: AsyncSession, note: Note, session_id: Optional[str] = None
+) -> Optional[NoteVersion]:
+    """内容修改前保存当前内容的版本，与上一版本属于同一次连续编辑时返回 None"""
+    result = await db.execute(
+        select(NoteVersion)
+        .where(NoteVersion.note_id == note.id)
+        .order_by(NoteVersion.version.desc(), NoteVersion.created_at.desc())
+        .limit(1)
+    )
+    latest = result.scalar_one_or_none()
+    if should_coalesce(latest, note.updated_at, session_id, datetime.utcnow()):
+        return None
+    return await build_version_snapshot(db, note, "update", session_id=session_id)
+
+
+async def snapshots_before_update(
+    db: AsyncSession, edits: List[Tuple[Note, Optional[str]]]
+) -> List[NoteVersion]:
+    """批量修改前保存版本：同 snapshot_before_update，但不论笔记数量只查询三次
+
+    Args:
+        edits: (修改前的笔记, 编辑会话 ID) 列表
+    """
+    if not edits:
+        return []
+    now = datetime.utcnow()
+    latest = await _latest_versions(db, [note.id for note, _ in edits])
+    pending = [
+        (note, session_id) for note, session_id in edits
+        if not should_coalesce(latest.get(note.id), note.updated_at, session_id, now)
+    ]
+    if not pending:
+        return []
+
+    keyframes = await _latest_versions(db, [note.id for note, _ in pending], keyframes_only=True)
+    deltas: Dict[str, int] = {}
+    if keyframes:
+        result = await db.execute(
+            select(NoteVersion.keyframe_id, func.count())
+            .where(NoteVersion.keyframe_id.in_([keyframe.id for keyframe in keyframes.values()]))
+            .group_by(NoteVersion.keyframe_id)
+        )
+        deltas = dict(result.all())
+
+    versions = []
+    for note, session_id in pending:
+        keyframe = keyframes.get(note.id)
+        count = deltas.get(keyframe.id, 0) if keyframe is not None else 0
+        versions.append(_make_version(note, keyframe, count, "update", None, session_id, False))
+    return versions
+
+
+# ---------- 历史压缩 ----------
+
+def _promote_to_keyframe(version: NoteVersion):
+    """把增量版本改存为完整内容（其关键帧即将被删除）"""
+    snapshot = version.snapshot()
+    version.content = snapshot["content"]
+    version.json_content = snapshot["json_content"]
+    version.is_keyframe = True
+    version.keyframe = None
+    version.delta = None
+    version.preview = None
+
+
+def select_versions_to_drop(rows: list, now: datetime) -> List[str]:
+    """按保留策略挑出可删除的版本
+
+    早于 VERSION_COMPACTION_HOURLY_AFTER_DAYS 的历史每小时保留最后一个，
+    早于 VERSION_COMPACTION_DAILY_AFTER_DAYS 的每天保留最后一个；
+    创建记录、恢复记录和显式恢复点始终保留。
+
+    Args:
+        rows: 按 created_at 升序的版本行（id, created_at, change_type, is_restore_point）
+    """
+    daily_cutoff = now - timedelta(days=settings.VERSION_COMPACTION_DAILY_AFTER_DAYS)
+    last_in_bucket: dict = {}
+    candidates = []
+    for row in rows:
+        if row.is_restore_point or row.change_type in KEPT_CHANGE_TYPES:
+            continue
+        if row.created_at < daily_cutoff:
+            bucket = row.created_at.date()
+        else:
+            bucket = row.created_at.replace(minute=0, second=0, microsecond=0)
+        last_in_bucket[bucket] = row.id
+        candidates.append(row.id)
+    kept = set(last_in_bucket.values())
+    return [version_id for version_id in candidates if version_id not in kept]
+
+
+async def compact_note_versions(
+    db: AsyncSession, note_id: str, now: Optional[datetime] = None
+) -> int:
+    """抽稀单个笔记的旧版本，返回删除的版本数（由调用方提交）"""
+    now = now or datetime.utcnow()
+    hourly_cutoff = now - timedelta(days=settings.VERSION_COMPACTION_HOURLY_AFTER_DAYS)
+    result = await db.execute(
+        select(
+            NoteVersion.id,
+            NoteVersion.created_at,
+            NoteVersion.change_type,
+            NoteVersion.is_restore_point,
+        )
+        .where(NoteVersion.note_id == note_id, NoteVersion.created_at < hourly_cutoff)
+        .order_by(NoteVersion.created_at, NoteVersion.version, NoteVersion.id)
+    )
+    drop_ids = select_versions_to_drop(result.all(), now)
+    if not drop_ids:
+        return 0
+
+    # 保留下来的增量版本若依赖被删除的关键帧，先改存完整内容
+    dependents = await db.execute(
+        with_keyframe(select(NoteVersion)).where(
+            NoteVersion.keyframe_id.in_(drop_ids),
+            NoteVersion.id.not_in(drop_ids),
+        )
+    )
+    for version in dependents.scalars().all():
+        _promote_to_keyframe(version)
+    await db.flush()
+
+    await db.execute(delete(NoteVersion).where(NoteVersion.id.in_(drop_ids)))
+    return len(drop_ids)
+
+
+async def run_version_compaction(batch_size: Optional[int] = None) -> int:
+    """压缩所有笔记的旧版本历史，返回删除的版本数"""
+    batch_size = batch_size or settings.VERSION_COMPACTION_BATCH_SIZE
+    hourly_after = timedelta(days=settings.VERSION_COMPACTION_HOURLY_AFTER_DAYS)
+    hourly_cutoff = datetime.utcnow() - hourly_after
+    last_id = ""
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(NoteVersion.note_id, Note.user_id)
+                .join(Note, Note.id == NoteVersion.note_id)
+                .where(NoteVersion.created_at < hourly_cutoff, NoteVersion.note_id > last_id)
+                .group_by(NoteVersion.note_id, Note.user_id)
+                .having(func.count() > 1)
+                .order_by(NoteVersion.note_id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            for note_id, user_id in rows:
+                dropped = await compact_note_versions(session, note_id)
+                if dropped:
+                    total += dropped
+                    count_cache.invalidate(user_id)
+            await session.commit()
+            last_id = rows[-1].note_id
+        # 让出事件循环，避免长时间占用
+        await asyncio.sleep(0)
+    return total
+
+
+async def version_compaction_worker():
+    """周期性压缩旧版本历史"""
+    while True:
+        try:
+            dropped = await run_version_compaction()
+            if dropped:
+                print(f"[Version Compaction] 已清理 {dropped} 个旧版本")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[Version Compaction Error] {str(e)}")
+        await asyncio.sleep(settings.VERSION_COMPACTION_INTERVAL_HOURS * 3600)
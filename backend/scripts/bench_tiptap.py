@@ -0,0 +1,206 @@
+"""Tiptap 渲染微基准
+
+对比原递归实现（Markdown 与纯文本各遍历一次）与 app.services.tiptap
+单次遍历引擎在大型合成文档上的耗时，并校验两者的 Markdown / 纯文本输出一致。
+
+用法（在 backend 目录下）：
+    python scripts/bench_tiptap.py --blocks 5000 --repeat 20
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.tiptap import render_document, render_note  # noqa: E402
+
+WORDS = "笔记 记录 想法 project idea 今天 明天 会议 summary 数据 search 向量 索引".split()
+MARKS = [
+    [], [], [],
+    [{"type": "bold"}],
+    [{"type": "italic"}],
+    [{"type": "code"}],
+    [{"type": "bold"}, {"type": "italic"}],
+    [{"type": "link", "attrs": {"href": "https://example.com"}}],
+    [{"type": "highlight"}],
+]
+
+
+# ---------- 原实现（基线） ----------
+
+def legacy_markdown(doc: dict) -> str:
+    return _legacy_nodes(doc.get("content", []))
+
+
+def _legacy_nodes(nodes: list, depth: int = 0) -> str:
+    result = []
+    for node in nodes:
+        node_type = node.get("type", "")
+        if node_type == "paragraph":
+            result.append(_legacy_inline(node.get("content", [])) + "\n")
+        elif node_type == "heading":
+            level = node.get("attrs", {}).get("level", 1)
+            result.append("#" * level + " " + _legacy_inline(node.get("content", [])) + "\n")
+        elif node_type in ("bulletList", "orderedList"):
+            for i, item in enumerate(node.get("content", []), 1):
+                marker = "- " if node_type == "bulletList" else f"{i}. "
+                item_text = _legacy_nodes(item.get("content", []), depth + 1)
+                result.append("  " * depth + marker + item_text.strip() + "\n")
+        elif node_type == "listItem":
+            result.append(_legacy_nodes(node.get("content", []), depth))
+        elif node_type == "blockquote":
+            text = _legacy_nodes(node.get("content", []))
+            for line in text.strip().split("\n"):
+                result.append("> " + line + "\n")
+        elif node_type == "codeBlock":
+            language = node.get("attrs", {}).get("language", "")
+            result.append(f"```{language}\n{_legacy_inline(node.get('content', []))}\n```\n")
+        elif node_type == "image":
+            attrs = node.get("attrs", {})
+            result.append(f"![{attrs.get('alt', '')}]({attrs.get('src', '')})\n")
+        elif node_type == "horizontalRule":
+            result.append("---\n")
+        elif node_type == "hardBreak":
+            result.append("  \n")
+    return "".join(result)
+
+
+def _legacy_inline(nodes: list) -> str:
+    result = []
+    for node in nodes:
+        node_type = node.get("type", "")
+        if node_type == "text":
+            text = node.get("text", "")
+            for mark in node.get("marks", []):
+                mark_type = mark.get("type", "")
+                if mark_type == "bold":
+                    text = f"**{text}**"
+                elif mark_type == "italic":
+                    text = f"*{text}*"
+                elif mark_type == "code":
+                    text = f"`{text}`"
+                elif mark_type == "strike":
+                    text = f"~~{text}~~"
+                elif mark_type == "link":
+                    text = f"[{text}]({mark.get('attrs', {}).get('href', '')})"
+                elif mark_type == "highlight":
+                    text = f"=={text}=="
+            result.append(text)
+        elif node_type == "hardBreak":
+            result.append("  \n")
+    return "".join(result)
+
+
+def legacy_text(doc: dict) -> str:
+    texts = []
+
+    def walk(node):
+        if not isinstance(node, dict):
+            return
+        if node.get("type") == "text" and node.get("text", ""):
+            texts.append(node["text"])
+        for child in node.get("content", []) or []:
+            walk(child)
+
+    walk(doc)
+    return " ".join(texts)
+
+
+# ---------- 合成文档 ----------
+
+def make_inline(rng: random.Random) -> list:
+    nodes = []
+    for _ in range(rng.randint(1, 6)):
+        node = {"type": "text", "text": " ".join(rng.choices(WORDS, k=rng.randint(1, 8)))}
+        marks = rng.choice(MARKS)
+        if marks:
+            node["marks"] = marks
+        nodes.append(node)
+        if rng.random() < 0.05:
+            nodes.append({"type": "hardBreak"})
+    return nodes
+
+
+def make_block(rng: random.Random, depth: int = 0) -> dict:
+    kind = rng.random()
+    if kind < 0.45 or depth > 3:
+        return {"type": "paragraph", "content": make_inline(rng)}
+    if kind < 0.55:
+        return {
+            "type": "heading",
+            "attrs": {"level": rng.randint(1, 4)},
+            "content": make_inline(rng),
+        }
+    if kind < 0.75:
+        return {
+            "type": rng.choice(["bulletList", "orderedList"]),
+            "content": [
+                {
+                    "type": "listItem",
+                    "content": [make_block(rng, depth + 1) for _ in range(rng.randint(1, 2))],
+                }
+                for _ in range(rng.randint(1, 5))
+            ],
+        }
+    if kind < 0.82:
+        return {"type": "blockquote", "content": [make_block(rng, depth + 1) for _ in range(2)]}
+    if kind < 0.9:
+        return {
+            "type": "codeBlock",
+            "attrs": {"language": "python"},
+            "content": [{"type": "text", "text": "print('hello')\nreturn 1"}],
+        }
+    if kind < 0.95:
+        return {"type": "image", "attrs": {"src": "https://example.com/a.png", "alt": "图"}}
+    return {"type": "horizontalRule"}
+
+
+def make_document(blocks: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    return {"type": "doc", "content": [make_block(rng) for _ in range(blocks)]}
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiptap 渲染微基准")
+    parser.add_argument("--blocks", type=int, default=5000, help="文档块级节点数量")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    doc = make_document(args.blocks, args.seed)
+
+    rendered = render_document(doc)
+    assert rendered.markdown == legacy_markdown(doc), "Markdown 输出与原实现不一致"
+    assert rendered.text == legacy_text(doc), "纯文本输出与原实现不一致"
+
+    legacy_ms = timed(lambda: (legacy_markdown(doc), legacy_text(doc)), args.repeat)
+    markdown_text_ms = timed(lambda: render_document(doc, html_output=False), args.repeat)
+    all_ms = timed(lambda: render_document(doc), args.repeat)
+    text_ms = timed(lambda: render_document(doc, markdown=False, html_output=False), args.repeat)
+    legacy_text_ms = timed(lambda: legacy_text(doc), args.repeat)
+    note = SimpleNamespace(id="bench", version=1, updated_at=None, json_content=doc)
+    render_note(note)
+    cached_ms = timed(lambda: render_note(note), args.repeat)
+
+    print(f"文档: {args.blocks} 个块, Markdown {len(rendered.markdown)} 字符")
+    print(f"原实现 Markdown + 纯文本（两次遍历）: {legacy_ms:8.2f} ms")
+    print(f"新引擎 Markdown + 纯文本（一次遍历）: {markdown_text_ms:8.2f} ms")
+    print(f"新引擎 纯文本 + Markdown + HTML:      {all_ms:8.2f} ms")
+    print(f"原实现 仅纯文本:                      {legacy_text_ms:8.2f} ms")
+    print(f"新引擎 仅纯文本:                      {text_ms:8.2f} ms")
+    print(f"render_note 缓存命中:                 {cached_ms:8.4f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""版本存储基准：完整快照 vs 关键帧 + 增量
+
+模拟自动保存产生的版本历史（每次只改动少量段落），比较两种方案的存储大小，
+以及还原任意版本的耗时（包含从 JSON 解码行数据，近似数据库驱动的开销）。
+同时校验每个版本都能从增量准确还原。
+
+用法（在 backend 目录下）：
+    python scripts/bench_versions.py --versions 300 --paragraphs 200
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.models import NoteVersion  # noqa: E402
+from app.services.tiptap import document_text  # noqa: E402
+from app.services.version_store import plan_delta  # noqa: E402
+
+WORDS = "今天 会议 记录 项目 进度 想法 note idea draft 数据 检索 总结".split()
+
+
+def make_paragraph(rng: random.Random) -> dict:
+    text = " ".join(rng.choices(WORDS, k=rng.randint(8, 30))) + "。"
+    return {"type": "paragraph", "content": [{"type": "text", "text": text}]}
+
+
+def make_history(versions: int, paragraphs: int, seed: int) -> list:
+    """自动保存式的版本序列：每次追加几个字、偶尔新增或删除段落"""
+    rng = random.Random(seed)
+    doc = {"type": "doc", "content": [make_paragraph(rng) for _ in range(paragraphs)]}
+    history = []
+    for v in range(1, versions + 1):
+        history.append({
+            "title": "基准笔记",
+            "content": document_text(doc),
+            "json_content": copy.deepcopy(doc),
+        })
+        blocks = doc["content"]
+        roll = rng.random()
+        if roll < 0.1:
+            blocks.insert(rng.randrange(len(blocks) + 1), make_paragraph(rng))
+        elif roll < 0.15 and len(blocks) > 1:
+            blocks.pop(rng.randrange(len(blocks)))
+        else:
+            for _ in range(rng.randint(1, 3)):
+                node = blocks[rng.randrange(len(blocks))]["content"][0]
+                node["text"] += rng.choice(WORDS)
+    return history
+
+
+def encode_row(row: dict) -> str:
+    return json.dumps(row, ensure_ascii=False)
+
+
+def store_full(history: list) -> list:
+    return [encode_row(snapshot) for snapshot in history]
+
+
+def store_delta(history: list) -> list:
+    """按 version_store 的策略生成行：(关键帧下标, 行 JSON)"""
+    rows = []
+    keyframe_index = None
+    deltas = 0
+    for index, snapshot in enumerate(history):
+        delta = None
+        if keyframe_index is not None:
+            delta = plan_delta(history[keyframe_index], snapshot, deltas)
+        if delta is None:
+            keyframe_index, deltas = index, 0
+            rows.append((None, encode_row(snapshot)))
+        else:
+            deltas += 1
+            rows.append((keyframe_index, encode_row({"title": snapshot["title"], "delta": delta})))
+    return rows
+
+
+def restore_full(rows: list, index: int) -> dict:
+    version = NoteVersion(is_keyframe=True, **json.loads(rows[index]))
+    return version.to_dict_full()
+
+
+def restore_delta(rows: list, index: int) -> dict:
+    keyframe_index, data = rows[index]
+    if keyframe_index is None:
+        return NoteVersion(is_keyframe=True, **json.loads(data)).to_dict_full()
+    keyframe = NoteVersion(is_keyframe=True, **json.loads(rows[keyframe_index][1]))
+    version = NoteVersion(is_keyframe=False, keyframe=keyframe, **json.loads(data))
+    return version.to_dict_full()
+
+
+def timed(fn, indexes: list) -> float:
+    started = time.perf_counter()
+    for index in indexes:
+        fn(index)
+    return (time.perf_counter() - started) / len(indexes) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="版本存储基准")
+    parser.add_argument("--versions", type=int, default=300)
+    parser.add_argument("--paragraphs", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=200, help="还原耗时的抽样次数")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    history = make_history(args.versions, args.paragraphs, args.seed)
+
+    started = time.perf_counter()
+    full_rows = store_full(history)
+    full_write_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    delta_rows = store_delta(history)
+    delta_write_ms = (time.perf_counter() - started) * 1000
+
+    for index, snapshot in enumerate(history):
+        restored = restore_delta(delta_rows, index)
+        for field in ("content", "json_content"):
+            assert restored[field] == snapshot[field], f"版本 {index + 1} 的 {field} 还原不一致"
+
+    full_bytes = sum(len(row.encode("utf-8")) for row in full_rows)
+    delta_bytes = sum(len(row.encode("utf-8")) for _, row in delta_rows)
+    keyframes = sum(1 for keyframe_index, _ in delta_rows if keyframe_index is None)
+
+    rng = random.Random(args.seed)
+    indexes = [rng.randrange(len(history)) for _ in range(args.samples)]
+    full_restore_ms = timed(lambda i: restore_full(full_rows, i), indexes)
+    delta_restore_ms = timed(lambda i: restore_delta(delta_rows, i), indexes)
+
+    print(
+        f"版本数: {len(history)}, 段落数: {args.paragraphs}, "
+        f"关键帧间隔: {settings.VERSION_KEYFRAME_INTERVAL}, 关键帧: {keyframes}"
+    )
+    print(f"完整快照  存储: {full_bytes / 1024:10.1f} KB  写入(编码): {full_write_ms:8.1f} ms")
+    print(
+        f"关键帧+增量 存储: {delta_bytes / 1024:10.1f} KB  写入(编码): {delta_write_ms:8.1f} ms  "
+        f"（{delta_bytes / full_bytes:.1%}）"
+    )
+    print(
+        f"还原单个版本  完整快照: {full_restore_ms:.3f} ms  "
+        f"关键帧+增量: {delta_restore_ms:.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""离线压缩旧版本历史
+
+按 VERSION_COMPACTION_* 配置抽稀所有笔记的旧版本（与后台压缩任务相同的策略），
+适合在低峰期手动执行或由定时任务调用。
+
+用法（在 backend 目录下）：
+    python scripts/compact_versions.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.version_store import run_version_compaction  # noqa: E402
+
+
+async def main():
+    dropped = await run_version_compaction()
+    print(f"已清理 {dropped} 个旧版本")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+"""离线清理孤立附件
+
+按 STORAGE_GC_* 配置删除未被任何笔记引用的附件及其存储对象，以及引用计数归零的 blob
+（与后台清理任务相同的策略）。
+设置 STORAGE_BACKEND=local 时作用于本地目录，便于在测试环境中验证。
+
+用法（在 backend 目录下）：
+    python scripts/storage_gc.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.blobs import collect_blobs  # noqa: E402
+from app.services.storage_gc import collect_orphans  # noqa: E402
+
+
+async def main():
+    stats = await collect_orphans()
+    print(
+        f"检查 {stats['scanned']} 个附件，仍被引用 {stats['referenced']} 个，"
+        f"删除 {stats['deleted']} 个（{stats['bytes']} 字节），失败 {stats['failed']} 个，"
+        f"耗时 {stats['duration_ms']} ms"
+    )
+    blobs = await collect_blobs()
+    print(
+        f"检查无引用 blob {blobs['scanned']} 个，"
+        f"删除 {blobs['deleted']} 个（{blobs['bytes']} 字节），"
+        f"失败 {blobs['failed']} 个，耗时 {blobs['duration_ms']} ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
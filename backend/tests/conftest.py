@@ -0,0 +1,72 @@
+"""测试配置
+
+测试使用 SQLite（aiosqlite）与 local 存储后端，不依赖 PostgreSQL、对象存储和腾讯云：
+- 环境变量必须在导入 app 之前设置，Settings 在导入时读取
+- PostgreSQL 专用的列类型在 SQLite 上编译为等价的通用类型
+"""
+
+import os
+import shutil
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="lifeos-test-")
+STORAGE_ROOT = os.path.join(_TMP_DIR, "storage")
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["STORAGE_LOCAL_ROOT"] = STORAGE_ROOT
+os.environ["STORAGE_LOCAL_URL"] = "http://testserver/media/"
+os.environ["STORAGE_LOCAL_UPLOAD_URL"] = "http://testserver/upload/local/"
+os.environ["UPLOAD_PART_SIZE"] = "1000"
+os.environ["TENCENT_SECRET_ID"] = ""
+os.environ["TENCENT_SECRET_KEY"] = ""
+
+import pytest_asyncio  # noqa: E402
+from pgvector.sqlalchemy import Vector  # noqa: E402
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, Base, engine  # noqa: E402
+from app.models import User  # noqa: E402  同时注册全部模型
+
+
+@compiles(TSVECTOR, "sqlite")
+def _compile_tsvector(type_, compiler, **kw):
+    return "TEXT"
+
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(Vector, "sqlite")
+def _compile_vector(type_, compiler, **kw):
+    return "BLOB"
+
+
+@pytest_asyncio.fixture
+async def database():
+    """每个测试使用全新的表与空的存储目录"""
+    shutil.rmtree(STORAGE_ROOT, ignore_errors=True)
+    shutil.rmtree(STORAGE_ROOT + ".multipart", ignore_errors=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    # 连接绑定在当前测试的事件循环上
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def user(database) -> User:
+    """测试用户"""
+    async with AsyncSessionLocal() as session:
+        user = User(email="tester@example.com", password="x", nickname="tester")
+        session.add(user)
+        await session.commit()
+        return user
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TMP_DIR, ignore_errors=True)
@@ -0,0 +1,151 @@
+"""语音识别任务轮询测试"""
+
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import AsrTask, Attachment
+from app.services.asr import AsrPoller, enqueue_asr_task, first_poll_delay, poll_interval
+from app.services.tencent import AsrResult, MockAsrClient
+
+AUDIO_URL = "http://testserver/media/a.mp3"
+
+
+class FlakyClient(MockAsrClient):
+    """前 failures 次提交失败的模拟客户端"""
+
+    def __init__(self, failures: int, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+
+    async def create_task(self, audio_url: str, engine_model: str) -> str:
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("RequestLimitExceeded")
+        return await super().create_task(audio_url, engine_model)
+
+
+async def _create_task(user, duration: int = 0, with_attachment: bool = True) -> AsrTask:
+    async with AsyncSessionLocal() as session:
+        attachment = None
+        if with_attachment:
+            attachment = Attachment(user_id=user.id, type="audio", url=AUDIO_URL, duration=duration)
+            session.add(attachment)
+            await session.flush()
+        return await enqueue_asr_task(session, user.id, AUDIO_URL, attachment)
+
+
+async def _load(task_id: str) -> AsrTask:
+    async with AsyncSessionLocal() as session:
+        return await session.get(AsrTask, task_id)
+
+
+async def test_create_poll_and_complete(user):
+    client = MockAsrClient(polls=2, text="你好世界")
+    poller = AsrPoller(client)
+    task = await _create_task(user, duration=100)
+    now = datetime.utcnow()
+
+    with poller.listen(task.id) as event:
+        # 提交：首次查询时间按音频时长估计
+        delay = await poller.tick(now)
+        current = await _load(task.id)
+        assert current.status == "running"
+        assert current.provider_task_id == "1"
+        assert delay == first_poll_delay(100) == 20
+        assert event.is_set()
+    assert await poller.tick(now + timedelta(seconds=10)) == 10
+    assert client.describe_calls == 0
+
+    # 第一次查询仍在识别，间隔翻倍
+    now += timedelta(seconds=delay)
+    delay = await poller.tick(now)
+    current = await _load(task.id)
+    assert (current.status, current.polls) == ("running", 1)
+    assert delay == poll_interval(1)
+
+    now += timedelta(seconds=delay)
+    await poller.tick(now)
+    current = await _load(task.id)
+    assert current.status == "completed"
+    assert current.result_text == "你好世界"
+    assert current.finished_at == now
+    assert client.describe_calls == 2
+    async with AsyncSessionLocal() as session:
+        attachment = await session.get(Attachment, current.attachment_id)
+        assert attachment.asr_text == "你好世界"
+
+    # 没有未完成的任务
+    assert await poller.tick(now) == settings.ASR_IDLE_SECONDS
+
+
+async def test_enqueue_reuses_active_task(user):
+    task = await _create_task(user)
+    async with AsyncSessionLocal() as session:
+        attachment = await session.get(Attachment, task.attachment_id)
+        again = await enqueue_asr_task(session, user.id, attachment.url, attachment)
+    assert again.id == task.id
+
+
+async def test_provider_failure_is_reported(user):
+    client = MockAsrClient()
+    client.results["1"] = AsrResult("failed", error="音频无法下载")
+    poller = AsrPoller(client)
+    task = await _create_task(user, with_attachment=False)
+    now = datetime.utcnow()
+    await poller.tick(now)
+    await poller.tick(now + timedelta(seconds=settings.ASR_POLL_MAX_SECONDS))
+    current = await _load(task.id)
+    assert current.status == "failed"
+    assert current.last_error == "音频无法下载"
+
+
+async def test_submit_retries_with_backoff(user):
+    poller = AsrPoller(FlakyClient(failures=1))
+    task = await _create_task(user)
+    now = datetime.utcnow()
+
+    delay = await poller.tick(now)
+    current = await _load(task.id)
+    assert (current.status, current.attempts) == ("pending", 1)
+    assert current.last_error == "RequestLimitExceeded"
+    assert current.next_poll_at == now + timedelta(seconds=poll_interval(1))
+    assert delay == poll_interval(1)
+
+    # 退避期间不重试
+    await poller.tick(now + timedelta(seconds=1))
+    assert (await _load(task.id)).attempts == 1
+
+    now += timedelta(seconds=delay)
+    await poller.tick(now)
+    current = await _load(task.id)
+    assert (current.status, current.attempts, current.provider_task_id) == ("running", 0, "1")
+
+
+async def test_submit_gives_up_after_max_attempts(user, monkeypatch):
+    monkeypatch.setattr(settings, "ASR_MAX_ATTEMPTS", 2)
+    poller = AsrPoller(FlakyClient(failures=10))
+    task = await _create_task(user)
+    now = datetime.utcnow()
+
+    await poller.tick(now)
+    await poller.tick(now + timedelta(seconds=poll_interval(1)))
+    current = await _load(task.id)
+    assert (current.status, current.attempts) == ("failed", 2)
+    assert current.finished_at is not None
+
+
+async def test_task_times_out(user):
+    client = MockAsrClient(polls=1000)
+    poller = AsrPoller(client)
+    task = await _create_task(user)
+    now = datetime.utcnow()
+    await poller.tick(now)
+
+    # 创建时间超过 ASR_TASK_TIMEOUT_HOURS 后仍在识别
+    later = now + timedelta(hours=settings.ASR_TASK_TIMEOUT_HOURS, minutes=1)
+    await poller.tick(later)
+    current = await _load(task.id)
+    assert current.status == "failed"
+    assert current.last_error == "识别超时"
+    assert current.finished_at == later
@@ -0,0 +1,175 @@
+"""笔记批量操作测试"""
+
+import importlib.util
+from pathlib import Path
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy import bindparam, event, insert, select
+
+import app
+from app.core import get_current_user
+from app.core.database import AsyncSessionLocal, engine
+from app.core.response import ResponseCode
+from app.models import Note, NoteTag, Tag
+from app.services import bulk_notes
+
+
+@pytest.fixture
+def notes_api(monkeypatch):
+    """直接加载 notes 路由模块，不经过 app.api.v1 包（其 __init__ 会导入全部路由模块）"""
+    path = Path(app.__file__).parent / "api" / "v1" / "notes.py"
+    spec = importlib.util.spec_from_file_location("tests._notes_api", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    async def skip_reembed(note_ids):
+        pass
+
+    monkeypatch.setattr(module, "reembed_notes_task", skip_reembed)
+    # SQLite 没有 to_tsvector，分词结果直接拼接写入
+    monkeypatch.setattr(
+        bulk_notes, "bound_search_vector",
+        lambda: bindparam("sv_title") + " | " + bindparam("sv_body"),
+    )
+    return module
+
+
+@pytest_asyncio.fixture
+async def client(user, notes_api):
+    api = FastAPI()
+    api.include_router(notes_api.router)
+    api.dependency_overrides[get_current_user] = lambda: user
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        yield client
+
+
+@pytest_asyncio.fixture
+async def notes(user):
+    """n0 ~ n3 属于当前用户，x0 属于其他用户"""
+    async with AsyncSessionLocal() as session:
+        # 直接插入表：ORM 事件写入的 search_vector 依赖 PostgreSQL 的 to_tsvector
+        await session.execute(insert(Note.__table__), [
+            {"id": f"n{i}", "user_id": user.id, "title": f"t{i}", "content": f"正文 {i}"}
+            for i in range(4)
+        ] + [{"id": "x0", "user_id": "someone-else", "title": "x", "content": "x"}])
+        session.add_all([
+            Tag(id="tag1", user_id=user.id, name="a"),
+            Tag(id="tag2", user_id=user.id, name="b"),
+        ])
+        await session.commit()
+
+
+async def _post(client, path: str, payload: dict) -> dict:
+    response = await client.post(f"/notes/bulk/{path}", json=payload)
+    return response.json()
+
+
+def _codes(body: dict) -> dict:
+    return {item["id"]: item["code"] for item in body["c"]["results"]}
+
+
+async def _note(note_id: str) -> Note:
+    async with AsyncSessionLocal() as session:
+        return await session.get(Note, note_id)
+
+
+async def test_update_reports_each_item(client, notes):
+    body = await _post(client, "update", {"items": [
+        {"id": "n0", "version": 1, "content": "新正文"},
+        {"id": "n1", "version": 5, "content": "旧版本"},
+        {"id": "x0", "version": 1, "content": "别人的"},
+        {"id": "missing", "version": 1, "is_pinned": True},
+    ]})
+    assert body["h"]["c"] == ResponseCode.SUCCESS
+    assert _codes(body) == {
+        "n0": ResponseCode.SUCCESS,
+        "n1": ResponseCode.VERSION_CONFLICT,
+        "x0": ResponseCode.FORBIDDEN,
+        "missing": ResponseCode.NOT_FOUND,
+    }
+    assert body["c"]["succeeded"] == 1 and body["c"]["failed"] == 3
+    assert body["c"]["results"][1]["version"] == 1
+
+    updated = await _note("n0")
+    assert (updated.content, updated.version) == ("新正文", 2)
+    assert (await _note("n1")).content == "正文 1"
+    assert (await _note("x0")).content == "x"
+
+
+async def test_update_groups_rows_into_executemany(client, notes):
+    updates = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE notes"):
+            updates.append((executemany, len(parameters) if executemany else 1))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        body = await _post(client, "update", {"items": [
+            {"id": "n0", "version": 1, "content": "a"},
+            {"id": "n1", "version": 1, "content": "b"},
+            {"id": "n2", "version": 1, "content": "c"},
+            {"id": "n3", "version": 1, "is_pinned": True},
+        ]})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert body["c"]["succeeded"] == 4
+    # 内容更新三条合为一组，置顶一条单独一组
+    assert sorted(updates) == [(False, 1), (True, 3)]
+    assert [(await _note(f"n{i}")).content for i in range(3)] == ["a", "b", "c"]
+    pinned = await _note("n3")
+    assert pinned.is_pinned and pinned.version == 2
+
+
+async def test_duplicate_ids_are_rejected(client, notes):
+    body = await _post(client, "delete", {"items": [{"id": "n0"}, {"id": "n1"}, {"id": "n0"}]})
+    assert body["h"]["c"] == ResponseCode.INVALID_PARAMS
+    assert "n0" in body["h"]["e"]
+    assert (await _note("n0")).deleted_at is None
+
+
+async def test_delete_skips_notes_of_other_users(client, notes):
+    body = await _post(client, "delete", {"items": [{"id": "n0"}, {"id": "x0"}]})
+    assert _codes(body) == {"n0": ResponseCode.SUCCESS, "x0": ResponseCode.FORBIDDEN}
+    assert (await _note("n0")).deleted_at is not None
+    assert (await _note("x0")).deleted_at is None
+
+
+async def _note_tags() -> list:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(NoteTag.note_id, NoteTag.tag_id).order_by(NoteTag.note_id, NoteTag.tag_id)
+        )
+        return result.all()
+
+
+async def test_tags_add_and_remove(client, notes):
+    body = await _post(client, "tags", {
+        "items": [{"id": "n0"}, {"id": "n1"}], "add_tag_ids": ["tag1", "tag2"],
+    })
+    assert body["c"]["succeeded"] == 2
+    # 已有的关联不重复插入
+    body = await _post(client, "tags", {
+        "items": [{"id": "n0"}, {"id": "n2"}], "add_tag_ids": ["tag1"], "remove_tag_ids": ["tag2"],
+    })
+    assert body["c"]["succeeded"] == 2
+    assert await _note_tags() == [
+        ("n0", "tag1"), ("n1", "tag1"), ("n1", "tag2"), ("n2", "tag1"),
+    ]
+
+
+async def test_tags_validation(client, notes):
+    body = await _post(client, "tags", {"items": [{"id": "n0"}], "add_tag_ids": ["unknown"]})
+    assert body["h"]["c"] == ResponseCode.NOT_FOUND
+    body = await _post(client, "tags", {
+        "items": [{"id": "n0"}], "add_tag_ids": ["tag1"], "remove_tag_ids": ["tag1"],
+    })
+    assert body["h"]["c"] == ResponseCode.INVALID_PARAMS
+    body = await _post(client, "tags", {"items": [{"id": "x0"}], "add_tag_ids": ["tag1"]})
+    assert _codes(body) == {"x0": ResponseCode.FORBIDDEN}
+    assert await _note_tags() == []
@@ -0,0 +1,64 @@
+"""版本增量编解码测试"""
+
+import random
+
+import pytest
+
+from app.core.delta import decode_field, diff_text, encode_field, patch_text
+
+
+@pytest.mark.parametrize(
+    "base, target",
+    [
+        ("", ""),
+        ("", "新内容"),
+        ("旧内容", ""),
+        ("第一句。第二句。第三句。", "第一句。第二句改了。第三句。"),
+        ("line 1\nline 2\nline 3\n", "line 0\nline 1\nline 3\nline 4"),
+        ("Hello! How are you? Fine.", "Hello! How are they? Fine."),
+    ],
+)
+def test_text_round_trip(base, target):
+    assert patch_text(base, diff_text(base, target)) == target
+
+
+def test_text_delta_copies_unchanged_segments():
+    base = "".join(f"第{i}句。" for i in range(100))
+    target = base.replace("第50句。", "第50句改。")
+    ops = diff_text(base, target)
+    inserted = "".join(op for op in ops if isinstance(op, str))
+    assert inserted == "第50句改。"
+
+
+def test_random_text_round_trip():
+    rng = random.Random(11)
+    pieces = ["一", "二。", "three", "!", "\n", "四？", "five "]
+    for _ in range(300):
+        base = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+        target = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+        assert patch_text(base, diff_text(base, target)) == target
+
+
+def test_json_field_round_trip():
+    doc = {
+        "type": "doc",
+        "content": [
+            {"type": "paragraph", "content": [{"type": "text", "text": f"段落 {i}。"}]}
+            for i in range(20)
+        ],
+    }
+    changed = {**doc, "content": list(doc["content"])}
+    changed["content"][7] = {"type": "heading", "attrs": {"level": 2}, "content": []}
+    del changed["content"][12]
+
+    delta = encode_field(doc, changed, is_json=True)
+    assert "ops" in delta
+    assert decode_field(doc, delta, is_json=True) == changed
+
+
+def test_field_without_base():
+    assert encode_field("相同", "相同", is_json=False) is None
+    assert decode_field("相同", None, is_json=False) == "相同"
+    delta = encode_field(None, {"type": "doc"}, is_json=True)
+    assert delta == {"value": {"type": "doc"}}
+    assert decode_field(None, delta, is_json=True) == {"type": "doc"}
@@ -0,0 +1,96 @@
+"""版本差异算法测试"""
+
+import difflib
+import random
+
+import pytest
+
+from app.services.diff import _myers, diff_text, unified_diff
+
+
+def _lcs_length(a: list, b: list) -> int:
+    row = [0] * (len(b) + 1)
+    for x in a:
+        prev = 0
+        for j, y in enumerate(b, 1):
+            prev, row[j] = row[j], prev + 1 if x == y else max(row[j], row[j - 1])
+    return row[-1]
+
+
+def _apply(a: list, b: list, opcodes: list) -> list:
+    """按操作码由 a 重建 b，同时检查操作码首尾相接"""
+    out = []
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        out.extend(a[i1:i2] if tag == "equal" else b[j1:j2])
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+    return out
+
+
+def _random_pair(rng: random.Random):
+    a = [rng.choice("abcde") for _ in range(rng.randint(0, 30))]
+    b = list(a)
+    for _ in range(rng.randint(0, 8)):
+        k = rng.randint(0, len(b))
+        if b and rng.random() < 0.5:
+            del b[min(k, len(b) - 1)]
+        else:
+            b.insert(k, rng.choice("abcdef"))
+    return a, b
+
+
+def test_myers_is_minimal():
+    rng = random.Random(7)
+    for _ in range(300):
+        a, b = _random_pair(rng)
+        opcodes = _myers(a, b, max_edits=1000)
+        assert _apply(a, b, opcodes) == b
+        edits = sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != "equal")
+        assert edits == len(a) + len(b) - 2 * _lcs_length(a, b)
+
+
+def test_myers_gives_up_beyond_max_edits():
+    assert _myers(list("abcdef"), list("uvwxyz"), max_edits=3) is None
+    assert _myers(list("abc"), list("abc"), max_edits=0) == [("equal", 0, 3, 0, 3)]
+
+
+@pytest.mark.parametrize(
+    "a, b",
+    [
+        ("", "a\nb"),
+        ("a\nb", ""),
+        ("a\nb\nc", "a\nb\nc"),
+        ("a\nb\nc\nd", "a\nB\nc\nd"),
+        ("a\nb\nc\nd\ne\nf\ng\nh\ni\nj", "a\nB\nc\nd\ne\nf\ng\nh\ni\nJ"),
+        ("\n".join(map(str, range(30))), "\n".join(map(str, range(30))).replace("12", "x")),
+        ("\n".join(map(str, range(20))), "\n".join(map(str, range(5, 20)))),
+        ("a\nb\nc", "a\nb\nc\nd\ne"),
+    ],
+)
+def test_unified_diff_matches_difflib(a, b):
+    expected = list(difflib.unified_diff(a.splitlines(), b.splitlines(), "v1", "v2", lineterm=""))
+    assert unified_diff(a, b, "v1", "v2") == expected
+
+
+def test_diff_text_reconstructs_both_sides():
+    rng = random.Random(3)
+    words = ["今天", "会议", "note", " ", "\n", "数据。", "abc"]
+    for _ in range(200):
+        a = "".join(rng.choice(words) for _ in range(rng.randint(0, 40)))
+        b = "".join(rng.choice(words) for _ in range(rng.randint(0, 40)))
+        for granularity in ("word", "char", "line"):
+            ops = diff_text(a, b, granularity)
+            assert "".join(op["text"] for op in ops if op["op"] != "insert") == a
+            assert "".join(op["text"] for op in ops if op["op"] != "delete") == b
+
+
+def test_diff_text_splits_cjk_by_character():
+    ops = diff_text("今天开会讨论项目进度。", "今天下午开会讨论进度。")
+    assert [op for op in ops if op["op"] != "equal"] == [
+        {"op": "insert", "text": "下午"},
+        {"op": "delete", "text": "项目"},
+    ]
@@ -0,0 +1,72 @@
+"""批量嵌入任务测试"""
+
+from sqlalchemy import insert, select
+
+from app.core.database import AsyncSessionLocal
+from app.models import EmbeddingJob, Note, NoteEmbedding
+from app.services import embed_jobs
+from app.services.embed_jobs import EmbeddingJobWorker
+
+
+async def _setup(user, count: int = 5) -> str:
+    async with AsyncSessionLocal() as session:
+        # 直接插入表：ORM 事件写入的 search_vector 依赖 PostgreSQL 的 to_tsvector
+        await session.execute(insert(Note.__table__), [
+            {"id": f"n{i}", "user_id": user.id, "title": "t", "content": f"第 {i} 篇笔记"}
+            for i in range(count)
+        ])
+        job = EmbeddingJob(user_id=user.id, total_notes=count)
+        session.add(job)
+        await session.commit()
+        return job.id
+
+
+async def _load(job_id: str) -> EmbeddingJob:
+    async with AsyncSessionLocal() as session:
+        return await session.get(EmbeddingJob, job_id)
+
+
+async def test_job_runs_to_completion(user, monkeypatch):
+    async def fake_embed(texts):
+        return [[0.0] for _ in texts]
+
+    monkeypatch.setattr(embed_jobs, "embed_texts", fake_embed)
+    job_id = await _setup(user)
+    worker = EmbeddingJobWorker()
+    claimed, token = await worker._claim()
+    assert claimed == job_id
+
+    await worker._execute(job_id, token)
+    job = await _load(job_id)
+    assert (job.status, job.processed_notes, job.checkpoint_note_id) == ("completed", 5, "n4")
+    assert job.locked_by is None
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(NoteEmbedding.note_id))).scalars().all()
+    assert sorted(rows) == [f"n{i}" for i in range(5)]
+
+
+async def test_lost_lease_discards_page(user, monkeypatch):
+    job_id = await _setup(user)
+    worker = EmbeddingJobWorker()
+    _, token = await worker._claim()
+
+    async def slow_embed(texts):
+        # 嵌入请求期间租约过期并被其他 worker 接手
+        async with AsyncSessionLocal() as session:
+            job = await session.get(EmbeddingJob, job_id)
+            job.locked_by = "other-worker"
+            await session.commit()
+        return [[0.0] for _ in texts]
+
+    monkeypatch.setattr(embed_jobs, "embed_texts", slow_embed)
+    assert await worker._process_page(job_id, token) is False
+    job = await _load(job_id)
+    assert (job.processed_notes, job.checkpoint_note_id, job.locked_by) == (0, None, "other-worker")
+
+    # 旧 worker 的失败与释放也不再改写任务
+    await worker._fail(job_id, token, RuntimeError("timeout"))
+    await worker._release(job_id, token)
+    job = await _load(job_id)
+    assert (job.status, job.attempts, job.locked_by) == ("running", 0, "other-worker")
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(NoteEmbedding.id))).first() is None
@@ -0,0 +1,43 @@
+"""查询向量缓存测试"""
+
+import pytest
+
+from app.core.config import settings
+from app.services import embedding
+from app.services.embedding import EmbeddingCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_REDIS_ENABLED", False)
+    cache = EmbeddingCache(max_size=10, ttl_seconds=60)
+    monkeypatch.setattr(embedding, "embedding_cache", cache)
+    return cache
+
+
+async def test_same_key_and_input_for_padded_text(cache, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    requested = []
+
+    async def fake_request(text):
+        requested.append(text)
+        return [1.0, 2.0]
+
+    monkeypatch.setattr(embedding, "_request_embedding", fake_request)
+
+    assert await embedding.get_embedding("  hello \n") == [1.0, 2.0]
+    assert await embedding.get_embedding("hello") == [1.0, 2.0]
+    assert requested == ["hello"]
+    assert cache.hits == 1
+
+
+async def test_mock_vectors_not_cached(cache, monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "")
+
+    assert await embedding.get_embedding("hello") is not None
+    assert cache.stats()["size"] == 0
+
+
+async def test_blank_text(cache):
+    assert await embedding.get_embedding("   ") is None
+    assert cache.misses == 0
@@ -0,0 +1,87 @@
+"""媒体任务租约测试（不启动处理进程，_render 以桩替代）"""
+
+from datetime import datetime
+
+import pytest
+
+from app.core.database import AsyncSessionLocal
+from app.models import Attachment, MediaJob
+from app.services.media import LeaseLost, MediaJobWorker, enqueue_media_job
+from app.services.storage import object_url
+
+INFO = {"width": 640, "height": 480, "duration": 0, "variants": []}
+
+
+async def _setup(user) -> str:
+    async with AsyncSessionLocal() as session:
+        attachment = Attachment(user_id=user.id, type="image", url=object_url("images/a.png"))
+        session.add(attachment)
+        await enqueue_media_job(session, attachment)
+        await session.commit()
+        return attachment.id
+
+
+async def _steal(job_id: str):
+    async with AsyncSessionLocal() as session:
+        job = await session.get(MediaJob, job_id)
+        job.locked_by = "other-worker"
+        await session.commit()
+
+
+async def test_process_renews_lease_between_stages(user, monkeypatch):
+    attachment_id = await _setup(user)
+    worker = MediaJobWorker()
+    job_id, _, token = await worker._claim()
+    renewals = []
+
+    async def render(key, kind, renew):
+        async with AsyncSessionLocal() as session:
+            job = await session.get(MediaJob, job_id)
+            job.locked_until = datetime(2000, 1, 1)
+            await session.commit()
+        await renew()
+        async with AsyncSessionLocal() as session:
+            renewals.append((await session.get(MediaJob, job_id)).locked_until)
+        return dict(INFO)
+
+    monkeypatch.setattr(worker, "_render", render)
+    await worker.process(attachment_id, job_id, token)
+    await worker._finish(job_id, token)
+
+    assert renewals[0] > datetime.utcnow()
+    async with AsyncSessionLocal() as session:
+        attachment = await session.get(Attachment, attachment_id)
+        job = await session.get(MediaJob, job_id)
+    assert (attachment.width, attachment.height) == (640, 480)
+    assert (job.status, job.locked_by) == ("completed", None)
+
+
+async def test_lost_lease_discards_results(user, monkeypatch):
+    attachment_id = await _setup(user)
+    worker = MediaJobWorker()
+    job_id, _, token = await worker._claim()
+
+    async def render(key, kind, renew):
+        # 处理超时，任务被其他 worker 接手
+        await _steal(job_id)
+        return dict(INFO)
+
+    monkeypatch.setattr(worker, "_render", render)
+    with pytest.raises(LeaseLost):
+        await worker.process(attachment_id, job_id, token)
+    await worker._finish(job_id, token)
+
+    async with AsyncSessionLocal() as session:
+        attachment = await session.get(Attachment, attachment_id)
+        job = await session.get(MediaJob, job_id)
+    assert attachment.width == 0
+    assert (job.status, job.locked_by) == ("running", "other-worker")
+
+
+async def test_renew_fails_after_takeover(user):
+    await _setup(user)
+    worker = MediaJobWorker()
+    job_id, _, token = await worker._claim()
+    await _steal(job_id)
+    with pytest.raises(LeaseLost):
+        await worker._renew(job_id, token)
@@ -0,0 +1,104 @@
+"""孤立附件清理测试（local 存储后端）"""
+
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Attachment, Note, User
+from app.services.media import derivative_key
+from app.services.storage import get_storage, object_url
+from app.services.storage_gc import collect_orphans
+
+
+async def _put(key: str, size: int) -> str:
+    await get_storage().put(key, b"x" * size, "image/png")
+    return object_url(key)
+
+
+def _exists(key: str) -> bool:
+    return os.path.exists(get_storage().path_for(key))
+
+
+async def _add_note(user_id: str, content: str = "", json_content=None, deleted=False) -> str:
+    # 直接插入表：ORM 事件写入的 search_vector 依赖 PostgreSQL 的 to_tsvector
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            insert(Note.__table__)
+            .values(
+                user_id=user_id,
+                title="t",
+                content=content,
+                json_content=json_content,
+                deleted_at=datetime.utcnow() if deleted else None,
+            )
+            .returning(Note.__table__.c.id)
+        )
+        await session.commit()
+        return result.scalar_one()
+
+
+async def test_collect_orphans(user, monkeypatch):
+    # 每页只读一条笔记，覆盖按用户分页扫描
+    monkeypatch.setattr(settings, "STORAGE_GC_BATCH_SIZE", 1)
+    old = datetime.utcnow() - timedelta(hours=settings.STORAGE_GC_GRACE_HOURS + 1)
+
+    async with AsyncSessionLocal() as session:
+        other = User(email="other@example.com", password="x")
+        session.add(other)
+        await session.commit()
+
+    names = ["linked", "html", "json", "trashed", "orphan", "recent", "other"]
+    urls = {name: await _put(f"images/{name}.png", len(name)) for name in names}
+    await get_storage().put(derivative_key("images/orphan.png", 256), b"thumb", "image/webp")
+
+    note_id = await _add_note(user.id, content=f'<img src="{urls["html"]}">')
+    await _add_note(user.id, json_content={
+        "type": "doc",
+        "content": [{"type": "image", "attrs": {"src": urls["json"]}}],
+    })
+    await _add_note(user.id, content=f"![]({urls['trashed']})", deleted=True)
+    # 其他用户的笔记引用不算
+    await _add_note(other.id, content=urls["other"])
+
+    async with AsyncSessionLocal() as session:
+        for name, url in urls.items():
+            session.add(Attachment(
+                id=name,
+                note_id=note_id if name == "linked" else None,
+                user_id=user.id,
+                type="image",
+                url=url,
+                file_size=len(name),
+                created_at=datetime.utcnow() if name == "recent" else old,
+            ))
+        session.add(Attachment(
+            id="foreign",
+            user_id=user.id,
+            type="image",
+            url="https://elsewhere.example.com/a.png",
+            created_at=old,
+        ))
+        await session.commit()
+
+    stats = await collect_orphans(batch_size=2)
+
+    assert stats["scanned"] == 6
+    assert stats["referenced"] == 3
+    assert stats["deleted"] == 3
+    assert stats["failed"] == 0
+    assert stats["bytes"] == len("orphan") + len("other")
+    async with AsyncSessionLocal() as session:
+        remaining = set((await session.execute(select(Attachment.id))).scalars().all())
+    assert remaining == {"linked", "html", "json", "trashed", "recent"}
+    for name in remaining:
+        assert _exists(f"images/{name}.png")
+    assert not _exists("images/orphan.png")
+    assert not _exists("images/other.png")
+    assert not _exists(derivative_key("images/orphan.png", 256))
+
+    # 再次执行没有可删除的附件
+    stats = await collect_orphans()
+    assert (stats["scanned"], stats["deleted"]) == (3, 0)
@@ -0,0 +1,30 @@
+"""全文检索分词测试"""
+
+from app.services.text_search import build_tsquery, segment_text
+
+
+def test_segment_text_latin_words_lowercased():
+    assert segment_text("Hello, World_2024!") == "hello world 2024"
+
+
+def test_segment_text_cjk_unigrams_and_bigrams():
+    assert segment_text("数据库") == "数 据 库 数据 据库"
+    assert segment_text("用 Redis 缓存") == "用 redis 缓 存 缓存"
+
+
+def test_segment_text_empty():
+    assert segment_text(None) == ""
+    assert segment_text("") == ""
+
+
+def test_build_tsquery_terms():
+    assert build_tsquery("Redis") == "'redis':*"
+    assert build_tsquery("数据库") == "'数据' & '据库'"
+    assert build_tsquery("字") == "'字'"
+    assert build_tsquery("redis redis 缓存") == "'redis':* & '缓存'"
+
+
+def test_build_tsquery_strips_operators():
+    assert build_tsquery("a & b | !c") == "'a':* & 'b':* & 'c':*"
+    assert build_tsquery("':* <-> ()") is None
+    assert build_tsquery("   ") is None
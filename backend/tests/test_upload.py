@@ -0,0 +1,163 @@
+"""对象存储直传测试：presign → 预签名 PUT（local 后端）→ /upload/complete"""
+
+import importlib.util
+import os
+from pathlib import Path
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy import select
+
+import app
+from app.core import get_current_user
+from app.core.database import AsyncSessionLocal
+from app.core.response import ResponseCode
+from app.models import Attachment, MediaJob, UploadSession
+from app.services.storage import get_storage, object_key_from_url
+
+DATA = os.urandom(2500)
+
+
+@pytest.fixture
+def upload_api():
+    """直接加载 upload 路由模块，不经过 app.api.v1 包（其 __init__ 会导入全部路由模块）"""
+    path = Path(app.__file__).parent / "api" / "v1" / "upload.py"
+    spec = importlib.util.spec_from_file_location("tests._upload_api", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest_asyncio.fixture
+async def client(user, upload_api):
+    api = FastAPI()
+    api.include_router(upload_api.router)
+    api.dependency_overrides[get_current_user] = lambda: user
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        yield client
+
+
+async def _presign(client, file_size: int, mime_type="image/png", type="image") -> dict:
+    response = await client.post("/upload/presign", json={
+        "type": type, "file_name": "a.png", "mime_type": mime_type, "file_size": file_size,
+    })
+    body = response.json()
+    assert body["h"]["c"] == ResponseCode.SUCCESS, body
+    return body["c"]
+
+
+async def _complete(client, session_id: str) -> dict:
+    response = await client.post("/upload/complete", json={"session_id": session_id})
+    return response.json()
+
+
+async def _session(session_id: str) -> UploadSession:
+    async with AsyncSessionLocal() as session:
+        return await session.get(UploadSession, session_id)
+
+
+async def test_presigned_put_and_complete(client):
+    presigned = await _presign(client, 900)
+    assert "parts" not in presigned
+    assert presigned["headers"] == {"Content-Type": "image/png"}
+
+    body = await _complete(client, presigned["id"])
+    assert body["h"]["e"] == "文件尚未上传"
+
+    response = await client.put(presigned["url"], content=DATA[:900], headers=presigned["headers"])
+    assert response.json()["c"]["size"] == 900
+
+    body = await _complete(client, presigned["id"])
+    assert body["h"]["c"] == ResponseCode.SUCCESS
+    attachment = body["c"]
+    key = object_key_from_url(attachment["url"])
+    with open(get_storage().path_for(key), "rb") as f:
+        assert f.read() == DATA[:900]
+
+    # 重复提交返回同一附件
+    again = await _complete(client, presigned["id"])
+    assert again["c"]["id"] == attachment["id"]
+    async with AsyncSessionLocal() as session:
+        row = await session.get(Attachment, attachment["id"])
+        assert (row.file_size, row.mime_type) == (900, "image/png")
+        jobs = (await session.execute(select(MediaJob.attachment_id))).scalars().all()
+        assert jobs == [attachment["id"]]
+
+
+async def test_presigned_multipart(client):
+    presigned = await _presign(client, 2500, mime_type="video/mp4", type="video")
+    parts = [(p["part_number"], p["size"]) for p in presigned["parts"]]
+    assert parts == [(1, 1000), (2, 1000), (3, 500)]
+
+    await client.put(presigned["parts"][0]["url"], content=DATA[:1000])
+    body = await _complete(client, presigned["id"])
+    assert body["h"]["c"] == ResponseCode.INVALID_PARAMS
+    assert "[2, 3]" in body["h"]["e"]
+
+    # 续传只返回未上传的分片
+    renewed = (await client.post(f"/upload/presign/{presigned['id']}")).json()["c"]
+    assert renewed["uploaded_parts"] == [1]
+    for part in renewed["parts"]:
+        start = (part["part_number"] - 1) * 1000
+        await client.put(part["url"], content=DATA[start:start + part["size"]])
+
+    body = await _complete(client, presigned["id"])
+    assert body["h"]["c"] == ResponseCode.SUCCESS
+    with open(get_storage().path_for(object_key_from_url(body["c"]["url"])), "rb") as f:
+        assert f.read() == DATA
+
+
+async def test_size_mismatch_is_rejected(client):
+    presigned = await _presign(client, 900)
+    await client.put(presigned["url"], content=DATA[:800], headers=presigned["headers"])
+
+    body = await _complete(client, presigned["id"])
+    assert body["h"]["c"] == ResponseCode.INVALID_PARAMS
+    assert body["h"]["e"] == "上传的文件与声明的大小或类型不一致"
+    upload = await _session(presigned["id"])
+    assert upload.status == "aborted"
+    assert not os.path.exists(get_storage().path_for(upload.object_key))
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(Attachment.id))).first() is None
+
+
+async def test_type_mismatch_is_rejected(client):
+    # Content-Type 参与签名，与声明的类型不一致时拒绝上传
+    presigned = await _presign(client, 900)
+    response = await client.put(
+        presigned["url"], content=DATA[:900], headers={"Content-Type": "image/gif"}
+    )
+    assert response.json()["h"]["c"] == ResponseCode.FORBIDDEN
+    upload = await _session(presigned["id"])
+    assert not os.path.exists(get_storage().path_for(upload.object_key))
+
+    # 篡改签名
+    tampered = presigned["url"].replace("signature=", "signature=0")
+    response = await client.put(tampered, content=DATA[:900], headers=presigned["headers"])
+    assert response.json()["h"]["c"] == ResponseCode.FORBIDDEN
+
+    # 不允许的类型不签发
+    response = await client.post("/upload/presign", json={
+        "type": "image", "file_name": "a.svg", "mime_type": "image/svg+xml", "file_size": 900,
+    })
+    assert response.json()["h"]["c"] == ResponseCode.INVALID_PARAMS
+
+
+async def test_stored_object_removed_when_register_fails(client, upload_api, monkeypatch):
+    async def broken_register(*args, **kwargs):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(upload_api, "register_blob", broken_register)
+    response = await client.post(
+        "/upload/image", files={"file": ("a.png", DATA, "image/png")}
+    )
+    body = response.json()
+    assert body["h"]["c"] != ResponseCode.SUCCESS
+
+    root = Path(os.environ["STORAGE_LOCAL_ROOT"])
+    assert not [p for p in root.rglob("*") if p.is_file()]
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(Attachment))).first() is None
@@ -0,0 +1,189 @@
+"""版本历史合并与压缩测试"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Note, NoteVersion
+from app.services.version_store import (
+    build_version_snapshot,
+    compact_note_versions,
+    select_versions_to_drop,
+    should_coalesce,
+    with_keyframe,
+)
+
+NOW = datetime(2026, 6, 15, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def version_settings(monkeypatch):
+    monkeypatch.setattr(settings, "VERSION_COMPACTION_HOURLY_AFTER_DAYS", 1)
+    monkeypatch.setattr(settings, "VERSION_COMPACTION_DAILY_AFTER_DAYS", 30)
+    monkeypatch.setattr(settings, "VERSION_COALESCE_WINDOW_SECONDS", 120)
+    monkeypatch.setattr(settings, "VERSION_COALESCE_MAX_SPAN_SECONDS", 1800)
+
+
+def _row(version_id, created_at, change_type="update", restore_point=False):
+    return SimpleNamespace(
+        id=version_id,
+        created_at=created_at,
+        change_type=change_type,
+        is_restore_point=restore_point,
+    )
+
+
+# ---------- 压缩策略 ----------
+
+def test_hourly_buckets_keep_last_version():
+    day = NOW - timedelta(days=3)
+    rows = [
+        _row("a", day.replace(hour=10, minute=10)),
+        _row("b", day.replace(hour=10, minute=50)),
+        _row("c", day.replace(hour=11, minute=5)),
+        _row("d", day.replace(hour=11, minute=59)),
+        _row("e", day.replace(hour=12, minute=0)),
+    ]
+    assert select_versions_to_drop(rows, NOW) == ["a", "c"]
+
+
+def test_daily_buckets_split_at_midnight():
+    day = NOW - timedelta(days=40)
+    rows = [
+        _row("a", day.replace(hour=1)),
+        _row("b", day.replace(hour=23, minute=59)),
+        _row("c", (day + timedelta(days=1)).replace(hour=0, minute=30)),
+    ]
+    assert select_versions_to_drop(rows, NOW) == ["a"]
+
+
+def test_daily_cutoff_boundary():
+    cutoff = NOW - timedelta(days=30)
+    rows = [
+        # 早于截止时间：同一天合并为一个桶
+        _row("a", cutoff.replace(hour=10, minute=10)),
+        _row("b", cutoff.replace(hour=11, minute=40)),
+        # 晚于截止时间：仍按小时分桶
+        _row("c", cutoff.replace(hour=12, minute=10)),
+        _row("d", cutoff.replace(hour=13, minute=40)),
+    ]
+    assert select_versions_to_drop(rows, NOW) == ["a"]
+
+
+def test_create_restore_and_restore_points_are_kept():
+    hour = (NOW - timedelta(days=40)).replace(hour=9)
+    rows = [
+        _row("create", hour, change_type="create"),
+        _row("a", hour.replace(minute=10)),
+        _row("restore", hour.replace(minute=20), change_type="restore"),
+        _row("point", hour.replace(minute=30), restore_point=True),
+        _row("b", hour.replace(minute=40)),
+        _row("restore-late", hour.replace(minute=50), change_type="restore"),
+    ]
+    assert select_versions_to_drop(rows, NOW) == ["a"]
+
+
+# ---------- 连续修改合并 ----------
+
+def _latest(age_seconds: int, change_type="update", session_id=None, restore_point=False):
+    return SimpleNamespace(
+        change_type=change_type,
+        is_restore_point=restore_point,
+        created_at=NOW - timedelta(seconds=age_seconds),
+        session_id=session_id,
+    )
+
+
+def _saved(seconds_ago: int) -> datetime:
+    return NOW - timedelta(seconds=seconds_ago)
+
+
+def test_coalesce_within_time_window():
+    assert should_coalesce(_latest(60), _saved(30), None, NOW)
+    assert should_coalesce(_latest(600), _saved(120), None, NOW)
+    assert not should_coalesce(_latest(600), _saved(121), None, NOW)
+    assert not should_coalesce(_latest(60), None, None, NOW)
+
+
+def test_coalesce_by_session():
+    # 同一会话不受时间窗口限制，不同会话不合并
+    assert should_coalesce(_latest(600, session_id="s1"), _saved(300), "s1", NOW)
+    assert not should_coalesce(_latest(60, session_id="s1"), _saved(10), "s2", NOW)
+    # 只有一方带会话时按时间窗口判断
+    assert should_coalesce(_latest(60), _saved(10), "s1", NOW)
+    assert not should_coalesce(_latest(600), _saved(300), "s1", NOW)
+
+
+def test_coalesce_window_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "VERSION_COALESCE_WINDOW_SECONDS", 0)
+    assert not should_coalesce(_latest(60), _saved(10), None, NOW)
+    assert should_coalesce(_latest(60, session_id="s1"), _saved(10), "s1", NOW)
+
+
+def test_no_coalesce_across_boundaries():
+    assert not should_coalesce(None, _saved(10), None, NOW)
+    assert not should_coalesce(_latest(60, change_type="create"), _saved(10), None, NOW)
+    assert not should_coalesce(_latest(60, change_type="restore"), _saved(10), None, NOW)
+    assert not should_coalesce(_latest(60, restore_point=True), _saved(10), None, NOW)
+    # 超过最长合并时长
+    assert not should_coalesce(_latest(1801, session_id="s1"), _saved(10), "s1", NOW)
+
+
+# ---------- 压缩执行 ----------
+
+async def test_compaction_promotes_dependent_deltas(user, monkeypatch):
+    # 每个关键帧后只保存一个增量：v1 关键帧、v2 增量、v3 关键帧、v4 增量
+    monkeypatch.setattr(settings, "VERSION_KEYFRAME_INTERVAL", 1)
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Note.__table__), [
+            {"id": "n1", "user_id": user.id, "title": "t", "content": ""}
+        ])
+        await session.commit()
+
+    hour = (NOW - timedelta(days=3)).replace(hour=9)
+    created = [
+        NOW - timedelta(days=40),
+        hour.replace(minute=5),
+        hour.replace(minute=10),
+        hour.replace(minute=50),
+    ]
+    content = "\n".join(f"第 {i} 行。" for i in range(40))
+    expected = {}
+    for version, created_at in enumerate(created, start=1):
+        note = SimpleNamespace(
+            id="n1", version=version, title="t", content=content, json_content=None
+        )
+        async with AsyncSessionLocal() as session:
+            row = await build_version_snapshot(
+                session, note, "create" if version == 1 else "update"
+            )
+            session.add(row)
+            await session.flush()
+            row.created_at = created_at
+            await session.commit()
+        expected[version] = content
+        content = content.replace(f"第 {version} 行。", f"第 {version} 行改。")
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(NoteVersion.version, NoteVersion.is_keyframe).order_by(NoteVersion.version)
+        )
+        assert result.all() == [(1, True), (2, False), (3, True), (4, False)]
+        # v2 ~ v4 在同一小时内，只保留 v4
+        assert await compact_note_versions(session, "n1", NOW) == 2
+        await session.commit()
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            with_keyframe(select(NoteVersion)).order_by(NoteVersion.version)
+        )
+        rows = result.scalars().all()
+    assert [row.version for row in rows] == [1, 4]
+    latest = rows[1]
+    # v4 原本依赖被删除的 v3 关键帧，改存完整内容
+    assert latest.is_keyframe and latest.keyframe_id is None and latest.delta is None
+    assert [row.snapshot()["content"] for row in rows] == [expected[1], expected[4]]